@@ -0,0 +1 @@
+"""Benchmarks of the Example rApp, run from the application directory."""
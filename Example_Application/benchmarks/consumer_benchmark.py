@@ -0,0 +1,212 @@
+"""
+This module benchmarks the Message Bus consumer's processing of PM messages, and compares the results to a baseline.
+
+Each scenario runs the real pipeline in-process for a number of cells and a batch size: messages are filtered by their
+headers, decoded and recorded for their cell by `MessageBusConsumer._process_messages`, exactly as when consuming from
+the Message Bus. Topology & Inventory and the Schema Registry are not queried: the consumer is given the cells directly,
+and the schema is put in the schema cache. The messages are generated by `pm_generator`, or read from a recording.
+
+Scenarios with few cells run for several ROPs, so that every scenario processes at least `min_messages` messages and
+its timings are not those of a single batch. For each scenario the benchmark records:
+- throughput: messages processed per second of processing,
+- p50 and p99 latency: seconds from the start of processing a message's batch until the whole batch is processed,
+- peak RSS: the peak resident memory of the process running the scenario, in bytes.
+
+Each scenario runs in a process of its own, so that its peak RSS is not that of an earlier, larger scenario. Messages
+are generated one batch at a time outside the timed sections, so the timings and memory are those of the consumer.
+
+Results are written to a JSON baseline, keeping the results of scenarios which were not run. When a baseline exists,
+the benchmark reports every result which is worse than the baseline by more than a threshold, and exits with status 1
+if there are any. Baselines are only comparable on the same machine, so they are not kept in the repository:
+
+    python -m benchmarks.consumer_benchmark --baseline consumer-benchmark.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Iterator, Optional
+
+import avro.schema
+import numpy as np
+
+from network_data_template_app.message_bus_consumer import MessageBusConsumer
+from network_data_template_app.pm_generator import (
+    PmMessageGenerator,
+    load_schema,
+    read_cell_fdns,
+    synthetic_cell_fdns,
+)
+from network_data_template_app.replay_consumer import ReplayConsumer, read_recording
+from network_data_template_app.schema_registry import schema_cache
+
+DEFAULT_CELL_COUNTS = (10, 1000, 100000)
+DEFAULT_BATCH_SIZES = (100, 1000)
+DEFAULT_SCHEMA = "tests/schema_registry_response.json"
+DEFAULT_SCHEMA_ID = "125"
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_MESSAGES = 10000
+FIRST_ROP_BEGIN_TIME = 1741031100000
+# Whether a larger value is better, for each result.
+RESULTS = {
+    "throughput": True,
+    "p50_latency_seconds": False,
+    "p99_latency_seconds": False,
+    "peak_rss_bytes": False,
+}
+
+
+def scenario_name(cell_count: int, batch_size: int) -> str:
+    """The name a scenario's results are kept under in a baseline."""
+    return f"cells={cell_count},batch_size={batch_size}"
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def run_scenario(
+    cell_count: int,
+    batch_size: int,
+    min_messages: int = DEFAULT_MIN_MESSAGES,
+    seed: int = 0,
+    schema_path: str = DEFAULT_SCHEMA,
+    recording: Optional[str] = None,
+    cells_path: Optional[str] = None,
+) -> dict[str, float]:
+    """
+    Process at least `min_messages` messages, over as many ROPs as it takes, for `cell_count` cells, in batches of
+    `batch_size` messages, returning the results.
+
+    With a recording, its messages are processed instead, for the cells of `cells_path`, or synthetic cells.
+    """
+    schema = load_schema(schema_path)
+    cell_fdns = read_cell_fdns(cells_path) if cells_path else synthetic_cell_fdns(cell_count)
+    if recording:
+        messages: Iterator = iter(read_recording(recording))
+    else:
+        generator = PmMessageGenerator(schema, DEFAULT_SCHEMA_ID, cell_fdns, seed=seed)
+        messages = generator.generate(FIRST_ROP_BEGIN_TIME, -(-min_messages // max(len(cell_fdns), 1)))
+    batches = iter(lambda: list(itertools.islice(messages, batch_size)), [])
+    return asyncio.run(_process_batches(cell_fdns, schema, batches, ReplayConsumer([])))
+
+
+async def _process_batches(
+    cell_fdns: list[str], schema: avro.schema.Schema, batches: Iterator[list], replay: ReplayConsumer
+) -> dict[str, float]:
+    """Process every batch with a consumer for the cells, timing each batch."""
+    consumer = MessageBusConsumer(None, None, replay)
+    consumer.prefixed_fdns = cell_fdns
+    consumer._allocate_cell_state()  # pylint: disable=protected-access
+    schema_cache.put(DEFAULT_SCHEMA_ID, schema)
+
+    batch_sizes, durations = [], []
+    for batch in batches:
+        start_time = time.perf_counter()
+        await consumer._process_messages(batch)  # pylint: disable=protected-access
+        durations.append(time.perf_counter() - start_time)
+        batch_sizes.append(len(batch))
+    # Every message of a batch waits until the whole batch is processed.
+    latencies = np.repeat(durations, batch_sizes)
+    return {
+        "messages": int(sum(batch_sizes)),
+        "throughput": sum(batch_sizes) / sum(durations) if durations else 0.0,
+        "p50_latency_seconds": float(np.percentile(latencies, 50)) if durations else 0.0,
+        "p99_latency_seconds": float(np.percentile(latencies, 99)) if durations else 0.0,
+        # ru_maxrss is in kilobytes on Linux, and in bytes on macOS.
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        * (1 if sys.platform == "darwin" else 1024),
+    }
+
+
+def find_regressions(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> list[str]:
+    """Describe every result which is worse than in the baseline by more than `threshold`, as a fraction."""
+    regressions = []
+    for name, scenario in results.items():
+        for result, larger_is_better in RESULTS.items():
+            baseline_value = baseline.get(name, {}).get(result)
+            if not baseline_value:
+                continue
+            change = scenario[result] / baseline_value - 1
+            if (-change if larger_is_better else change) > threshold:
+                regressions.append(
+                    f"{name}: {result} {scenario[result]:.6g} against {baseline_value:.6g} in the baseline "
+                    f"({change:+.1%})"
+                )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Benchmark the consumer, write the results to a baseline, and report regressions against an earlier one."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--baseline", default="consumer-benchmark.json", help="Path of the JSON baseline")
+    parser.add_argument("--cell-counts", type=int, nargs="+", default=DEFAULT_CELL_COUNTS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument(
+        "--min-messages", type=int, default=DEFAULT_MIN_MESSAGES, help="Messages processed by each scenario, at least"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--schema", default=DEFAULT_SCHEMA, help="Avro schema, or a saved Schema Registry response")
+    parser.add_argument("--recording", help="Process the messages of a recording instead of generated messages")
+    parser.add_argument("--cells", help="Saved Topology & Inventory response with the cells of the recording")
+    parser.add_argument(
+        "--threshold", type=float, default=DEFAULT_THRESHOLD, help="Fraction by which a result may be worse"
+    )
+    parser.add_argument(
+        "--update-baseline", action="store_true", help="Replace the baseline even if there are regressions"
+    )
+    args = parser.parse_args(argv)
+
+    results = {}
+    for cell_count, batch_size in itertools.product(args.cell_counts, args.batch_sizes):
+        name = scenario_name(cell_count, batch_size)
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            results[name] = executor.submit(
+                run_scenario,
+                cell_count,
+                batch_size,
+                args.min_messages,
+                args.seed,
+                args.schema,
+                args.recording,
+                args.cells,
+            ).result()
+        scenario = results[name]
+        print(
+            f"{name}: {scenario['throughput']:.0f} messages/s, p50 {scenario['p50_latency_seconds'] * 1000:.2f} ms, "
+            f"p99 {scenario['p99_latency_seconds'] * 1000:.2f} ms, peak RSS {scenario['peak_rss_bytes'] / 2**20:.0f} MiB"
+        )
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+    regressions = find_regressions(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if not regressions or args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "written_at": time.time(),
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "scenarios": {**baseline, **results},
+                },
+                f,
+                indent=2,
+            )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
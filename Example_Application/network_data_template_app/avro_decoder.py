@@ -0,0 +1,532 @@
+"""
+This module compiles Avro schemas into specialized decode functions.
+It has no dependencies on the rest of the application so that it can be imported cheaply by decode worker processes.
+
+The generic `avro.io.DatumReader` re-dispatches on the schema type of every value it reads. Here each schema is walked
+once up front and turned into a tree of small reader functions, each of which reads one value straight out of the
+message buffer. The output is identical to `DatumReader.read` for the same schema.
+
+More details:
+[Avro binary encoding](https://avro.apache.org/docs/1.12.0/specification/#binary-encoding)
+"""
+
+import io
+import struct
+from typing import Callable, Iterable, Optional
+
+import avro.constants
+import avro.errors
+import avro.io
+import avro.schema
+
+# A reader takes the message buffer and the offset to read from, and returns the value read and the offset after it.
+Reader = Callable[[bytes, int], tuple[object, int]]
+# A skipper takes the message buffer and the offset of a value, and returns the offset after it without decoding it.
+Skipper = Callable[[bytes, int], int]
+
+_FLOAT = struct.Struct("<f")
+_DOUBLE = struct.Struct("<d")
+
+# Logical types which `DatumReader` converts to Python objects. Schemas using these are decoded by `DatumReader` itself.
+_CONVERTED_LOGICAL_TYPES = frozenset(
+    {
+        avro.constants.DATE,
+        avro.constants.TIME_MILLIS,
+        avro.constants.TIME_MICROS,
+        avro.constants.TIMESTAMP_MILLIS,
+        avro.constants.TIMESTAMP_MICROS,
+        "decimal",
+    }
+)
+
+
+def _read_long(buf: bytes, pos: int) -> tuple[int, int]:
+    """int and long values are written using variable-length, zig-zag coding."""
+    b = buf[pos]
+    pos += 1
+    n = b & 0x7F
+    shift = 7
+    while b & 0x80:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        shift += 7
+    return (n >> 1) ^ -(n & 1), pos
+
+
+def _read_null(_: bytes, pos: int) -> tuple[None, int]:
+    return None, pos
+
+
+def _read_boolean(buf: bytes, pos: int) -> tuple[bool, int]:
+    return buf[pos] == 1, pos + 1
+
+
+def _read_float(buf: bytes, pos: int) -> tuple[float, int]:
+    return float(_FLOAT.unpack_from(buf, pos)[0]), pos + 4
+
+
+def _read_double(buf: bytes, pos: int) -> tuple[float, int]:
+    return float(_DOUBLE.unpack_from(buf, pos)[0]), pos + 8
+
+
+def _read_sized(buf: bytes, pos: int, size: int) -> tuple[bytes, int]:
+    end = pos + size
+    if size < 0 or end > len(buf):
+        raise avro.errors.InvalidAvroBinaryEncoding(
+            f"Requested {size} bytes at offset {pos}, buffer has {len(buf)} bytes"
+        )
+    return buf[pos:end], end
+
+
+def _read_bytes(buf: bytes, pos: int) -> tuple[bytes, int]:
+    size, pos = _read_long(buf, pos)
+    return _read_sized(buf, pos, size)
+
+
+def _read_string(buf: bytes, pos: int) -> tuple[str, int]:
+    size, pos = _read_long(buf, pos)
+    value, pos = _read_sized(buf, pos, size)
+    return value.decode("utf-8"), pos
+
+
+_PRIMITIVE_READERS: dict[str, Reader] = {
+    "null": _read_null,
+    "boolean": _read_boolean,
+    "int": _read_long,
+    "long": _read_long,
+    "float": _read_float,
+    "double": _read_double,
+    "bytes": _read_bytes,
+    "string": _read_string,
+}
+
+
+def _generic_reader(schema: avro.schema.Schema) -> Reader:
+    """Fall back to `DatumReader` for a schema, reading from the same buffer and offset."""
+    datum_reader = avro.io.DatumReader(schema)
+
+    def read_generic(buf: bytes, pos: int) -> tuple[object, int]:
+        stream = io.BytesIO(buf)
+        stream.seek(pos)
+        value = datum_reader.read_data(schema, schema, avro.io.BinaryDecoder(stream))
+        return value, stream.tell()
+
+    return read_generic
+
+
+def _compile_record(
+    schema: avro.schema.RecordSchema, named: dict[str, Reader]
+) -> Reader:
+    plan: list[tuple[str, Reader]] = []
+
+    def read_record(buf: bytes, pos: int) -> tuple[dict, int]:
+        record = {}
+        for name, read in plan:
+            record[name], pos = read(buf, pos)
+        return record, pos
+
+    # Register before compiling the fields so that recursive references resolve to this reader.
+    named[schema.fullname] = read_record
+    plan.extend((field.name, _compile(field.type, named)) for field in schema.fields)
+    return read_record
+
+
+def _compile_union(schema: avro.schema.UnionSchema, named: dict[str, Reader]) -> Reader:
+    branches = tuple(_compile(branch, named) for branch in schema.schemas)
+    branch_count = len(branches)
+
+    def read_union(buf: bytes, pos: int) -> tuple[object, int]:
+        index, pos = _read_long(buf, pos)
+        if index >= branch_count:
+            raise avro.errors.SchemaResolutionException(
+                f"Can't access branch index {index} for union with {branch_count} branches",
+                schema,
+            )
+        return branches[index](buf, pos)
+
+    return read_union
+
+
+def _read_long_array(buf: bytes, pos: int) -> tuple[list, int]:
+    """Arrays of int or long, e.g. PDF counter values, with the varint decoding inlined for each item."""
+    items = []
+    append = items.append
+    block_count, pos = _read_long(buf, pos)
+    while block_count != 0:
+        if block_count < 0:
+            block_count = -block_count
+            _, pos = _read_long(buf, pos)
+        for _ in range(block_count):
+            b = buf[pos]
+            pos += 1
+            n = b & 0x7F
+            shift = 7
+            while b & 0x80:
+                b = buf[pos]
+                pos += 1
+                n |= (b & 0x7F) << shift
+                shift += 7
+            append((n >> 1) ^ -(n & 1))
+        block_count, pos = _read_long(buf, pos)
+    return items, pos
+
+
+def _compile_array(schema: avro.schema.ArraySchema, named: dict[str, Reader]) -> Reader:
+    read_item = _compile(schema.items, named)
+    if read_item is _read_long:
+        return _read_long_array
+
+    def read_array(buf: bytes, pos: int) -> tuple[list, int]:
+        items = []
+        block_count, pos = _read_long(buf, pos)
+        while block_count != 0:
+            if block_count < 0:
+                block_count = -block_count
+                _, pos = _read_long(buf, pos)  # block size in bytes, not needed when reading every item
+            for _ in range(block_count):
+                item, pos = read_item(buf, pos)
+                items.append(item)
+            block_count, pos = _read_long(buf, pos)
+        return items, pos
+
+    return read_array
+
+
+def _compile_map(schema: avro.schema.MapSchema, named: dict[str, Reader]) -> Reader:
+    read_value = _compile(schema.values, named)
+
+    def read_map(buf: bytes, pos: int) -> tuple[dict, int]:
+        items = {}
+        block_count, pos = _read_long(buf, pos)
+        while block_count != 0:
+            if block_count < 0:
+                block_count = -block_count
+                _, pos = _read_long(buf, pos)
+            for _ in range(block_count):
+                key, pos = _read_string(buf, pos)
+                items[key], pos = read_value(buf, pos)
+            block_count, pos = _read_long(buf, pos)
+        return items, pos
+
+    return read_map
+
+
+def _compile_enum(schema: avro.schema.EnumSchema) -> Reader:
+    symbols = tuple(schema.symbols)
+
+    def read_enum(buf: bytes, pos: int) -> tuple[str, int]:
+        index, pos = _read_long(buf, pos)
+        if index >= len(symbols):
+            raise avro.errors.SchemaResolutionException(
+                f"Can't access enum index {index} for enum with {len(symbols)} symbols",
+                schema,
+            )
+        return symbols[index], pos
+
+    return read_enum
+
+
+def _compile_fixed(schema: avro.schema.FixedSchema) -> Reader:
+    size = schema.size
+
+    def read_fixed(buf: bytes, pos: int) -> tuple[bytes, int]:
+        return _read_sized(buf, pos, size)
+
+    return read_fixed
+
+
+def _skip_long(buf: bytes, pos: int) -> int:
+    while buf[pos] & 0x80:
+        pos += 1
+    return pos + 1
+
+
+def _skip_sized(buf: bytes, pos: int) -> int:
+    size, pos = _read_long(buf, pos)
+    if size < 0:
+        raise avro.errors.InvalidAvroBinaryEncoding(f"Negative size {size} at offset {pos}")
+    return pos + size
+
+
+def _fixed_size_skipper(size: int) -> Skipper:
+    def skip_fixed_size(_: bytes, pos: int) -> int:
+        return pos + size
+
+    return skip_fixed_size
+
+
+_PRIMITIVE_SKIPPERS: dict[str, Skipper] = {
+    "null": _fixed_size_skipper(0),
+    "boolean": _fixed_size_skipper(1),
+    "int": _skip_long,
+    "long": _skip_long,
+    "float": _fixed_size_skipper(4),
+    "double": _fixed_size_skipper(8),
+    "bytes": _skip_sized,
+    "string": _skip_sized,
+}
+
+
+def _blocks_skipper(skip_item: Skipper) -> Skipper:
+    """Arrays and maps are both a series of blocks. Blocks which carry their size in bytes are skipped in one step."""
+
+    def skip_blocks(buf: bytes, pos: int) -> int:
+        block_count, pos = _read_long(buf, pos)
+        while block_count != 0:
+            if block_count < 0:
+                block_size, pos = _read_long(buf, pos)
+                if block_size < 0:
+                    # A negative size would move back to the block count and loop forever.
+                    raise avro.errors.InvalidAvroBinaryEncoding(f"Negative block size {block_size} at offset {pos}")
+                pos += block_size
+            else:
+                for _ in range(block_count):
+                    pos = skip_item(buf, pos)
+            block_count, pos = _read_long(buf, pos)
+        return pos
+
+    return skip_blocks
+
+
+def _compile_skip(schema: avro.schema.Schema, named: dict[str, Skipper]) -> Skipper:
+    """Compile a schema into a skipper. `named` holds the skippers of the named types compiled so far."""
+    if isinstance(schema, avro.schema.NamedSchema) and schema.fullname in named:
+        return named[schema.fullname]
+
+    skipper: Skipper
+    match schema:
+        case avro.schema.RecordSchema():
+            field_skippers: list[Skipper] = []
+
+            def skip_record(buf: bytes, pos: int) -> int:
+                for skip_field in field_skippers:
+                    pos = skip_field(buf, pos)
+                return pos
+
+            named[schema.fullname] = skip_record
+            field_skippers.extend(_compile_skip(field.type, named) for field in schema.fields)
+            return skip_record
+        case avro.schema.UnionSchema():
+            branches = tuple(_compile_skip(branch, named) for branch in schema.schemas)
+
+            def skip_union(buf: bytes, pos: int) -> int:
+                index, pos = _read_long(buf, pos)
+                if index >= len(branches):
+                    raise avro.errors.SchemaResolutionException(
+                        f"Can't access branch index {index} for union with {len(branches)} branches",
+                        schema,
+                    )
+                return branches[index](buf, pos)
+
+            skipper = skip_union
+        case avro.schema.ArraySchema():
+            skipper = _blocks_skipper(_compile_skip(schema.items, named))
+        case avro.schema.MapSchema():
+            skip_value = _compile_skip(schema.values, named)
+
+            def skip_entry(buf: bytes, pos: int) -> int:
+                return skip_value(buf, _skip_sized(buf, pos))
+
+            skipper = _blocks_skipper(skip_entry)
+        case avro.schema.EnumSchema():
+            skipper = _skip_long
+        case avro.schema.FixedSchema():
+            skipper = _fixed_size_skipper(schema.size)
+        case avro.schema.PrimitiveSchema() if schema.type in _PRIMITIVE_SKIPPERS:
+            skipper = _PRIMITIVE_SKIPPERS[schema.type]
+        case _:
+            raise avro.errors.AvroException(
+                f"Cannot compile unknown schema type: {schema.type}"
+            )
+
+    if isinstance(schema, avro.schema.NamedSchema):
+        named[schema.fullname] = skipper
+    return skipper
+
+
+class LazyField:
+    """
+    Placeholder for a record field that was skipped by a projected decoder.
+
+    It keeps a reference to the message buffer and the field's offset, and only decodes the field when `value` is read.
+    """
+
+    __slots__ = ("_buf", "_pos", "_read", "_value", "_decoded")
+
+    def __init__(self, buf: bytes, pos: int, read: Reader):
+        self._buf = buf
+        self._pos = pos
+        self._read = read
+        self._value = None
+        self._decoded = False
+
+    @property
+    def value(self) -> object:
+        """The decoded field value. Decoded on first access."""
+        if not self._decoded:
+            self._value = self._read(self._buf, self._pos)[0]
+            self._decoded = True
+            self._buf = None
+        return self._value
+
+    def __repr__(self) -> str:
+        return f"LazyField(decoded={self._decoded})"
+
+
+def _null_branch_indexes(schema: avro.schema.Schema) -> frozenset[int]:
+    """The union branch indexes which hold `null`, as the single byte that encodes each of them."""
+    if not isinstance(schema, avro.schema.UnionSchema):
+        return frozenset()
+    return frozenset(
+        index * 2  # zig-zag encoding of a small non-negative index
+        for index, branch in enumerate(schema.schemas)
+        if branch.type == "null" and index < 64
+    )
+
+
+def _compile_projected_record(
+    schema: avro.schema.RecordSchema, fields: frozenset[str]
+) -> Reader:
+    """
+    Compile a record reader which decodes only `fields`.
+
+    Every other field is skipped without building Python objects and comes back as a `LazyField`, or as `None` if it
+    is a union whose `null` branch was written, so `record.get(name) is not None` still answers correctly.
+    """
+    named_readers: dict[str, Reader] = {}
+    named_skippers: dict[str, Skipper] = {}
+    plan = []
+    for field in schema.fields:
+        read = _compile(field.type, named_readers)
+        if field.name in fields:
+            plan.append((field.name, read, None, None))
+        else:
+            skip = _compile_skip(field.type, named_skippers)
+            plan.append((field.name, read, skip, _null_branch_indexes(field.type)))
+
+    def read_projected_record(buf: bytes, pos: int) -> tuple[dict, int]:
+        record = {}
+        for name, read, skip, null_branches in plan:
+            if skip is None:
+                record[name], pos = read(buf, pos)
+            elif buf[pos] in null_branches:
+                record[name] = None
+                pos += 1
+            else:
+                record[name] = LazyField(buf, pos, read)
+                pos = skip(buf, pos)
+        return record, pos
+
+    return read_projected_record
+
+
+def _compile(schema: avro.schema.Schema, named: dict[str, Reader]) -> Reader:
+    """Compile a schema into a reader. `named` holds the readers of the named types compiled so far."""
+    if getattr(schema, "logical_type", None) in _CONVERTED_LOGICAL_TYPES:
+        return _generic_reader(schema)
+    if isinstance(schema, avro.schema.NamedSchema) and schema.fullname in named:
+        return named[schema.fullname]
+
+    reader: Reader
+    match schema:
+        case avro.schema.RecordSchema():
+            return _compile_record(schema, named)
+        case avro.schema.UnionSchema():
+            reader = _compile_union(schema, named)
+        case avro.schema.ArraySchema():
+            reader = _compile_array(schema, named)
+        case avro.schema.MapSchema():
+            reader = _compile_map(schema, named)
+        case avro.schema.EnumSchema():
+            reader = _compile_enum(schema)
+        case avro.schema.FixedSchema():
+            reader = _compile_fixed(schema)
+        case avro.schema.PrimitiveSchema() if schema.type in _PRIMITIVE_READERS:
+            reader = _PRIMITIVE_READERS[schema.type]
+        case _:
+            raise avro.errors.AvroException(
+                f"Cannot compile unknown schema type: {schema.type}"
+            )
+
+    if isinstance(schema, avro.schema.NamedSchema):
+        named[schema.fullname] = reader
+    return reader
+
+
+class CompiledDecoder:
+    """
+    A decoder for a single Avro schema, compiled once and reused for every message written with that schema.
+
+    If `fields` is given and the schema is a record, only those top-level fields are decoded. The others are skipped
+    and returned as `LazyField` placeholders (or `None` for a written `null`), see `_compile_projected_record`.
+
+    Attributes:
+        schema: The schema the decoder was compiled from.
+        fields: The top-level fields decoded eagerly, or None if every field is decoded.
+    """
+
+    def __init__(
+        self, schema: avro.schema.Schema, fields: Optional[Iterable[str]] = None
+    ):
+        self.schema = schema
+        self.fields: Optional[frozenset[str]] = (
+            frozenset(fields) if fields is not None else None
+        )
+        if self.fields is not None and isinstance(schema, avro.schema.RecordSchema):
+            self._read = _compile_projected_record(schema, self.fields)
+        else:
+            self._read = _compile(schema, {})
+
+    def decode(self, avro_value: bytes) -> object:
+        """
+        Decode an Avro-encoded value (without the magic byte prefix).
+
+        Raises:
+            avro.errors.AvroException: If the value cannot be decoded with this decoder's schema.
+        """
+        try:
+            value, pos = self._read(avro_value, 0)
+        except (IndexError, struct.error) as err:
+            raise avro.errors.InvalidAvroBinaryEncoding(
+                f"Truncated Avro value of {len(avro_value)} bytes: {err}"
+            ) from err
+        if pos > len(avro_value):
+            # A skipped field ran past the end of the value.
+            raise avro.errors.InvalidAvroBinaryEncoding(
+                f"Truncated Avro value of {len(avro_value)} bytes, expected at least {pos} bytes"
+            )
+        return value
+
+
+class DecoderRegistry:
+    """
+    Compiled decoders keyed by schema ID.
+
+    A decoder is compiled the first time a schema ID (and projection) is seen and reused for every later message with
+    that schema ID. If the schema for an ID changes (e.g. it was re-fetched), the decoder is recompiled.
+    """
+
+    def __init__(self):
+        self._decoders: dict[tuple[str, Optional[frozenset[str]]], CompiledDecoder] = {}
+
+    def get_decoder(
+        self,
+        schema_id: str,
+        schema: avro.schema.Schema,
+        fields: Optional[Iterable[str]] = None,
+    ) -> CompiledDecoder:
+        """Return the compiled decoder for a schema ID and projection, compiling it from `schema` if necessary."""
+        key = (schema_id, frozenset(fields) if fields is not None else None)
+        decoder = self._decoders.get(key)
+        if decoder is None or decoder.schema is not schema:
+            decoder = CompiledDecoder(schema, key[1])
+            self._decoders[key] = decoder
+        return decoder
+
+    def clear(self):
+        """Drop all compiled decoders."""
+        self._decoders.clear()
+
+
+decoder_registry = DecoderRegistry()
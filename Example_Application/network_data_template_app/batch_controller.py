@@ -0,0 +1,128 @@
+"""
+This module tunes the consumer's batch size and poll timeout at runtime.
+
+The consumer already counts the complete, partial and empty batches it fetches. A complete batch means more messages
+were waiting on the partition, i.e. the consumer is lagging. A partial or empty batch means it has caught up. The
+controller reads those counters after every processed batch and, together with the time the batch took to process:
+- shrinks the batch size when processing is slower than the target latency, so each batch finishes in time;
+- grows the batch size and shortens the poll timeout while batches come back complete and within the target latency,
+  so the backlog is drained with fewer polls;
+- lengthens the poll timeout while batches come back empty, so an idle consumer polls less often.
+Both settings always stay within the configured bounds.
+"""
+
+from prometheus_client import Counter
+
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+DECREASE_LIMIT = 0.5  # never shrink the batch size by more than half in one step
+INCREASE_FACTOR = 1.25
+TIMEOUT_FACTOR = 2.0
+
+
+def _counter_value(counter: Counter) -> float:
+    """The current value of a Counter, read through the public collector interface."""
+    return next(
+        sample.value
+        for sample in counter.collect()[0].samples
+        if sample.name.endswith("_total")
+    )
+
+
+# pylint: disable=too-many-instance-attributes
+class AdaptiveBatchController:
+    """
+    Tune the consumer batch size and poll timeout towards a target per-batch processing latency.
+
+    With a target latency of zero the controller is disabled, and the configured batch size and timeout are used as is.
+    The batch counters are shared by every consumer worker, so with several workers each controller reacts to the
+    batches of all of them, which are all reading the same topic.
+
+    Attributes:
+        batch_size: The number of messages to fetch in the next batch.
+        timeout: Seconds to wait for the next batch to fill.
+        target_latency: Target seconds to process one batch, or 0 if the controller is disabled.
+        batch_size_gauge: Metric: The batch size currently used by the consumer
+        timeout_gauge: Metric: The poll timeout currently used by the consumer
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        timeout: float,
+        target_latency: float,
+        batch_size_bounds: tuple[int, int],
+        timeout_bounds: tuple[float, float],
+    ):
+        self.target_latency = target_latency
+        self.min_batch_size, self.max_batch_size = batch_size_bounds
+        self.min_timeout, self.max_timeout = timeout_bounds
+        if self.enabled:
+            batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+            timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+        self.complete_batches = metrics_registry.counters.get(
+            "complete_batch_of_messages_consumed"
+        )
+        self.partial_batches = metrics_registry.counters.get(
+            "partial_batch_of_messages_consumed"
+        )
+        self.empty_batches = metrics_registry.counters.get(
+            "empty_batch_of_messages_consumed"
+        )
+        self._last_counts = self.__batch_counts()
+
+        self.batch_size_gauge = metrics_registry.gauges.get("consumer_batch_size")
+        self.timeout_gauge = metrics_registry.gauges.get("consumer_timeout_seconds")
+        self.__export()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the batch size and timeout are tuned at runtime."""
+        return self.target_latency > 0
+
+    def update(self, processing_seconds: float):
+        """Adjust the batch size and timeout after a batch was processed in `processing_seconds`."""
+        counts = self.__batch_counts()
+        # Counters only go down when they are reset, in which case everything since the reset is new.
+        complete, partial, empty = (
+            count - last if count >= last else count
+            for count, last in zip(counts, self._last_counts)
+        )
+        self._last_counts = counts
+        if not self.enabled:
+            return
+
+        batch_size, timeout = self.batch_size, self.timeout
+        if processing_seconds > self.target_latency:
+            scale = max(self.target_latency / processing_seconds, DECREASE_LIMIT)
+            batch_size = int(batch_size * scale)
+        elif complete:
+            batch_size = int(batch_size * INCREASE_FACTOR) + 1
+            timeout /= TIMEOUT_FACTOR
+        elif empty and not partial:
+            timeout *= TIMEOUT_FACTOR
+
+        batch_size = min(max(batch_size, self.min_batch_size), self.max_batch_size)
+        timeout = min(max(timeout, self.min_timeout), self.max_timeout)
+        if (batch_size, timeout) != (self.batch_size, self.timeout):
+            logger.debug(
+                f"Adjusted consumer batch size to {batch_size} and timeout to {timeout:.3f}s "
+                f"after a batch took {processing_seconds:.4f}s"
+            )
+            self.batch_size, self.timeout = batch_size, timeout
+            self.__export()
+
+    def __batch_counts(self) -> tuple[float, float, float]:
+        return (
+            _counter_value(self.complete_batches),
+            _counter_value(self.partial_batches),
+            _counter_value(self.empty_batches),
+        )
+
+    def __export(self):
+        self.batch_size_gauge.set(self.batch_size)
+        self.timeout_gauge.set(self.timeout)
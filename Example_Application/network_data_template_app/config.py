@@ -24,10 +24,50 @@ def get_config() -> dict[str, str]:
     ) + get_os_env_string("KAFKA_CERT_FILE_NAME", "")
     max_retries = get_os_env_string("MAX_RETRIES", "5")
     retry_delay = get_os_env_string("RETRY_DELAY", "5")
+    retry_max_delay = validate_type("RETRY_MAX_DELAY", float, "60.0")
+    retry_deadline = validate_type("RETRY_DEADLINE", float, "120.0")
+    retry_budget_ratio = validate_type("RETRY_BUDGET_RATIO", float, "0.2")
+    circuit_breaker_threshold = validate_type("CIRCUIT_BREAKER_THRESHOLD", int, "5")
+    circuit_breaker_reset_timeout = validate_type("CIRCUIT_BREAKER_RESET_TIMEOUT", float, "30.0")
     consumer_message_batch_size = validate_type(
         "CONSUMER_MESSAGE_BATCH_SIZE", int, "1000"
     )
     consumer_timeout = validate_type("CONSUMER_TIMEOUT", float, "1.0")
+    consumer_target_batch_latency = validate_type(
+        "CONSUMER_TARGET_BATCH_LATENCY", float, "0"
+    )
+    consumer_min_batch_size = validate_type("CONSUMER_MIN_BATCH_SIZE", int, "100")
+    consumer_max_batch_size = validate_type("CONSUMER_MAX_BATCH_SIZE", int, "10000")
+    consumer_min_timeout = validate_type("CONSUMER_MIN_TIMEOUT", float, "0.1")
+    consumer_max_timeout = validate_type("CONSUMER_MAX_TIMEOUT", float, "30.0")
+    consumer_pipeline_depth = validate_type("CONSUMER_PIPELINE_DEPTH", int, "0")
+    consumer_workers = validate_type("CONSUMER_WORKERS", int, "1")
+    consumer_lag_interval = validate_type("CONSUMER_LAG_INTERVAL", float, "15.0")
+    consumer_commit_batches = validate_type("CONSUMER_COMMIT_BATCHES", int, "10")
+    consumer_commit_interval = validate_type("CONSUMER_COMMIT_INTERVAL", float, "5.0")
+    decode_workers = validate_type("DECODE_WORKERS", int, "0")
+    schema_cache_size = validate_type("SCHEMA_CACHE_SIZE", int, "128")
+    schema_cache_ttl = validate_type("SCHEMA_CACHE_TTL", float, "86400.0")
+    schema_cache_negative_ttl = validate_type("SCHEMA_CACHE_NEGATIVE_TTL", float, "30.0")
+    schema_cache_dir = get_os_env_string("SCHEMA_CACHE_DIR", "")
+    snapshot_dir = get_os_env_string("SNAPSHOT_DIR", "")
+    snapshot_interval = validate_type("SNAPSHOT_INTERVAL", float, "60.0")
+    replay_file = get_os_env_string("REPLAY_FILE", "")
+    replay_rate = validate_type("REPLAY_RATE", float, "0")
+    replay_passes = validate_type("REPLAY_PASSES", int, "1")
+    decode_chunk_size = validate_type("DECODE_CHUNK_SIZE", int, "100")
+    counter_store_rops = validate_type("COUNTER_STORE_ROPS", int, "0")
+    counter_store_max_counters = validate_type("COUNTER_STORE_MAX_COUNTERS", int, "300")
+    rop_windows = validate_type("ROP_WINDOWS", int, "0")
+    dedup_rops = validate_type("DEDUP_ROPS", int, "0")
+    topology_page_size = validate_type("TOPOLOGY_PAGE_SIZE", int, "0")
+    topology_page_concurrency = validate_type("TOPOLOGY_PAGE_CONCURRENCY", int, "4")
+    topology_cache_ttl = validate_type("TOPOLOGY_CACHE_TTL", float, "300.0")
+    topology_cache_stale_ttl = validate_type("TOPOLOGY_CACHE_STALE_TTL", float, "3600.0")
+    topology_sync_interval = validate_type("TOPOLOGY_SYNC_INTERVAL", float, "0")
+    rop_window_allowed_lateness = validate_type(
+        "ROP_WINDOW_ALLOWED_LATENESS", float, "300.0"
+    )
 
     config = {
         "container_name": container_name,
@@ -45,8 +85,44 @@ def get_config() -> dict[str, str]:
         "kafka_cert_file_path": kafka_cert_file_path,
         "max_retries": max_retries,
         "retry_delay": retry_delay,
+        "retry_max_delay": retry_max_delay,
+        "retry_deadline": retry_deadline,
+        "retry_budget_ratio": retry_budget_ratio,
+        "circuit_breaker_threshold": circuit_breaker_threshold,
+        "circuit_breaker_reset_timeout": circuit_breaker_reset_timeout,
         "consumer_message_batch_size": consumer_message_batch_size,
         "consumer_timeout": consumer_timeout,
+        "consumer_target_batch_latency": consumer_target_batch_latency,
+        "consumer_min_batch_size": consumer_min_batch_size,
+        "consumer_max_batch_size": consumer_max_batch_size,
+        "consumer_min_timeout": consumer_min_timeout,
+        "consumer_max_timeout": consumer_max_timeout,
+        "consumer_pipeline_depth": consumer_pipeline_depth,
+        "consumer_workers": consumer_workers,
+        "consumer_lag_interval": consumer_lag_interval,
+        "consumer_commit_batches": consumer_commit_batches,
+        "consumer_commit_interval": consumer_commit_interval,
+        "decode_workers": decode_workers,
+        "schema_cache_size": schema_cache_size,
+        "schema_cache_ttl": schema_cache_ttl,
+        "schema_cache_negative_ttl": schema_cache_negative_ttl,
+        "schema_cache_dir": schema_cache_dir,
+        "snapshot_dir": snapshot_dir,
+        "snapshot_interval": snapshot_interval,
+        "replay_file": replay_file,
+        "replay_rate": replay_rate,
+        "replay_passes": replay_passes,
+        "decode_chunk_size": decode_chunk_size,
+        "counter_store_rops": counter_store_rops,
+        "counter_store_max_counters": counter_store_max_counters,
+        "rop_windows": rop_windows,
+        "rop_window_allowed_lateness": rop_window_allowed_lateness,
+        "dedup_rops": dedup_rops,
+        "topology_page_size": topology_page_size,
+        "topology_page_concurrency": topology_page_concurrency,
+        "topology_cache_ttl": topology_cache_ttl,
+        "topology_cache_stale_ttl": topology_cache_stale_ttl,
+        "topology_sync_interval": topology_sync_interval,
     }
     return config
 
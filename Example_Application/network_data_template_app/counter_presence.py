@@ -0,0 +1,108 @@
+"""
+This module tracks which cells PM counters were received for, as a pair of bitsets indexed by cell ID.
+
+The consumer sets bits in the active bitset. When a report is built, the epoch is flipped so that the other bitset
+becomes active, and the bitset of the closed epoch is read and cleared while the consumer carries on writing to the new
+one. A counter received during the report therefore lands in the next report, instead of being overwritten when the
+status is reset, and reading or clearing a bitset takes one operation per 64 cells.
+"""
+
+import threading
+from typing import Optional
+
+import numpy as np
+
+from .fdn_index import reindex_rows
+
+WORD_BYTES = 8
+
+
+class CounterPresence:
+    """
+    Whether PM counters were received for each cell in the current epoch, at 2 bits per cell.
+
+    Setting a bit takes no lock, as every message is handled on the event loop. Flipping and merging take a lock, since
+    the shards of revoked partitions are merged in from the thread running `Consumer.consume`.
+
+    Attributes:
+        cell_fdns: The FDN of each cell, by cell ID.
+        epoch: The number of times the bitsets were flipped. The active bitset is `epoch % 2`.
+    """
+
+    def __init__(self, cell_fdns: Optional[list[str]] = None):
+        self._lock = threading.Lock()
+        self.allocate(cell_fdns or [])
+
+    def allocate(self, cell_fdns: list[str]):
+        """Size the bitsets for a set of cells, given by the FDN of each cell ID, clearing every bit."""
+        words = -(-len(cell_fdns) // 64)
+        with self._lock:
+            self.cell_fdns = list(cell_fdns)
+            self.epoch = 0
+            self._bitsets = (bytearray(words * WORD_BYTES), bytearray(words * WORD_BYTES))
+
+    def restore(self, cell_fdns: list[str], received: np.ndarray):
+        """Allocate the bitsets for a set of cells, then set the bit of each cell `received` in the current epoch."""
+        self.allocate(cell_fdns)
+        packed = np.packbits(received, bitorder="little")
+        with self._lock:
+            self._bitsets[0][: len(packed)] = packed.tobytes()
+
+    def reindex(self, cell_fdns: list[str], old_ids: np.ndarray):
+        """
+        Resize the bitsets for a new set of cells, keeping the bit of every cell which remains.
+
+        `old_ids` gives the previous cell ID of each new cell ID, or -1 for an added cell. The new bitsets replace the
+        old ones in one step, under the lock.
+        """
+        words = -(-len(cell_fdns) // 64)
+        with self._lock:
+            received = reindex_rows(self.__unpack(self._bitsets[self.epoch & 1]), old_ids, False)
+            packed = np.packbits(received, bitorder="little")
+            bitsets = (bytearray(words * WORD_BYTES), bytearray(words * WORD_BYTES))
+            bitsets[self.epoch & 1][: len(packed)] = packed.tobytes()
+            self.cell_fdns = list(cell_fdns)
+            self._bitsets = bitsets
+
+    def __len__(self) -> int:
+        return len(self.cell_fdns)
+
+    def set(self, cell_id: int):
+        """Record that PM counters were received for a cell in the current epoch."""
+        self._bitsets[self.epoch & 1][cell_id >> 3] |= 1 << (cell_id & 7)
+
+    def is_set(self, cell_id: int) -> bool:
+        """Whether PM counters were received for a cell in the current epoch."""
+        return bool(self._bitsets[self.epoch & 1][cell_id >> 3] & (1 << (cell_id & 7)))
+
+    def peek(self) -> np.ndarray:
+        """Whether PM counters were received for each cell in the current epoch, by cell ID, without flipping."""
+        return self.__unpack(self._bitsets[self.epoch & 1])
+
+    def flip(self) -> np.ndarray:
+        """
+        Close the current epoch, returning whether PM counters were received for each cell in it, by cell ID.
+
+        The other bitset becomes active before the closed one is read, so nothing set meanwhile is lost.
+        """
+        with self._lock:
+            closed = self._bitsets[self.epoch & 1]
+            self.epoch += 1
+            received = self.__unpack(closed)
+            self.__words(closed).fill(0)
+        return received
+
+    def update(self, other: "CounterPresence"):
+        """Set every bit which is set in the current epoch of `other`, which must cover the same cells."""
+        with self._lock:
+            active = self.__words(self._bitsets[self.epoch & 1])
+            np.bitwise_or(active, other.__words(other._bitsets[other.epoch & 1]), out=active)
+
+    def __unpack(self, bitset: bytearray) -> np.ndarray:
+        return np.unpackbits(
+            np.frombuffer(bitset, np.uint8), count=len(self.cell_fdns), bitorder="little"
+        ).astype(bool)
+
+    @staticmethod
+    def __words(bitset: bytearray) -> np.ndarray:
+        return np.frombuffer(bitset, np.uint64)
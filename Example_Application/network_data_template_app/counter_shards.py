@@ -0,0 +1,133 @@
+"""
+This module holds the PM counter presence collected by one of several consumer workers in the same consumer group.
+
+Each worker owns the Kafka partitions the group coordinator assigns to it, and records the cells it received counters
+for in a shard per partition. `ReportGenerator` merges the shards of every worker with `counter_presence` when it
+builds a report. When partitions are revoked in a rebalance, their shards are folded back into `counter_presence` so
+that counters received before the rebalance still appear in the next report.
+"""
+
+import threading
+from contextlib import ExitStack
+from typing import Iterable
+
+import numpy as np
+from confluent_kafka import Consumer, TopicPartition
+
+from .counter_presence import CounterPresence
+
+
+class CounterStatusShards:
+    """
+    Per-partition counter presence owned by one consumer worker.
+
+    Shards are written on the event loop, while `on_assign` and `on_revoke` are called by confluent_kafka from the
+    thread running `Consumer.consume`, so changes to the set of shards are made under a lock.
+
+    Attributes:
+        counter_presence: The presence revoked shards are folded into, normally the consumer's `counter_presence`.
+    """
+
+    def __init__(self, counter_presence: CounterPresence):
+        self.counter_presence = counter_presence
+        self._lock = threading.Lock()
+        self._shards: dict[int, CounterPresence] = {}
+
+    @property
+    def partitions(self) -> list[int]:
+        """The partitions this worker currently holds a shard for."""
+        with self._lock:
+            return sorted(self._shards)
+
+    def shard(self, partition: int) -> CounterPresence:
+        """The presence of a partition, created if the partition's assignment has not been seen yet."""
+        shard = self._shards.get(partition)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.get(partition)
+                if shard is None:
+                    shard = self._shards[partition] = self.__new_shard()
+        return shard
+
+    def collected(self, clear: bool = False) -> np.ndarray:
+        """
+        Whether any shard has counters for each cell, by cell ID.
+
+        If `clear` is set, the epoch of every shard is flipped, so counters received from now on go to the next report.
+        """
+        collected = np.zeros(len(self.counter_presence), bool)
+        with self._lock:
+            for shard in self._shards.values():
+                collected |= shard.flip() if clear else shard.peek()
+        return collected
+
+    def on_assign(self, _: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: start a shard for each newly assigned partition."""
+        self.assign(partition.partition for partition in partitions)
+
+    def on_revoke(self, _: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: fold the shards of revoked (or lost) partitions into `counter_presence`."""
+        self.revoke(partition.partition for partition in partitions)
+
+    def assign(self, partitions: Iterable[int]):
+        """Start a shard for each partition not already held."""
+        with self._lock:
+            for partition in partitions:
+                if partition not in self._shards:
+                    self._shards[partition] = self.__new_shard()
+
+    def revoke(self, partitions: Iterable[int]):
+        """Drop the shards of the given partitions, keeping their collected counters in `counter_presence`."""
+        with self._lock:
+            for partition in partitions:
+                shard = self._shards.pop(partition, None)
+                if shard is not None:
+                    self.counter_presence.update(shard)
+
+    def reset(self):
+        """Replace every shard with an empty one sized for the cells of `counter_presence`, after it was reallocated."""
+        with self._lock:
+            for partition in self._shards:
+                self._shards[partition] = self.__new_shard()
+
+    def __new_shard(self) -> CounterPresence:
+        return CounterPresence(self.counter_presence.cell_fdns)
+
+
+def merge_counter_status(
+    counter_presence: CounterPresence,
+    counter_shards: Iterable[CounterStatusShards],
+    clear: bool = False,
+) -> dict[str, bool]:
+    """
+    Merge the shards of every consumer worker with `counter_presence` into a status map by FDN, sorted by FDN.
+
+    If `clear` is set, every epoch is flipped, so counters received from now on go to the next report.
+    """
+    collected = counter_presence.flip() if clear else counter_presence.peek()
+    for shards in counter_shards:
+        collected |= shards.collected(clear=clear)
+    return dict(sorted(zip(counter_presence.cell_fdns, collected.tolist())))
+
+
+def reindex_counter_presence(
+    counter_presence: CounterPresence,
+    counter_shards: Iterable[CounterStatusShards],
+    cell_fdns: list[str],
+    old_ids: np.ndarray,
+):
+    """
+    Resize `counter_presence` and the shards of every consumer worker for a new set of cells, keeping the presence of
+    every cell which remains. `old_ids` gives the previous cell ID of each new cell ID, or -1 for an added cell.
+
+    The lock of every worker's shards is held throughout, so that no shard of the old size is folded into the resized
+    `counter_presence` by a rebalance meanwhile.
+    """
+    counter_shards = list(counter_shards)
+    with ExitStack() as stack:
+        for shards in counter_shards:
+            stack.enter_context(shards._lock)  # pylint: disable=protected-access
+        counter_presence.reindex(cell_fdns, old_ids)
+        for shards in counter_shards:
+            for shard in shards._shards.values():  # pylint: disable=protected-access
+                shard.reindex(cell_fdns, old_ids)
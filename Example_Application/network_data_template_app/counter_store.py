@@ -0,0 +1,238 @@
+"""
+This module keeps the values of the PM counters received for each cell over the last few ROPs.
+
+All values are held in one NumPy array of shape (cells, ROPs, counters), allocated once for the cells fetched from
+Topology & Inventory, so its size is known at startup and does not grow while messages are consumed:
+- Cells are indexed by the cell IDs of the consumer's `CellIdTable`, in the order Topology & Inventory returned them.
+- ROPs are a ring of `retention` slots, keyed by `ropBeginTimeInEpoch`. The first message of a new ROP takes over the
+  slot of the oldest ROP held, which is cleared. Messages for a ROP older than every ROP held are dropped.
+- Counters are given a column the first time they are seen, up to `max_counters`. Any further counters are dropped.
+
+Values are stored as int64, so every counter value is held exactly, however large. Which counters were received is kept
+apart in a bitmask of one bit per cell, ROP and counter, as no value can stand for a missing counter. With 100,000
+cells, 4 ROPs and 300 counters, the store holds 975 MB.
+"""
+
+from typing import Mapping, Optional
+
+import numpy as np
+
+from .config import get_config
+from .fdn_index import reindex_rows_in_place
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+VALUE_DTYPE = np.int64
+
+
+# pylint: disable=too-many-instance-attributes
+class PmCounterStore:
+    """
+    PM counter values by cell, ROP and counter name.
+
+    With a retention of zero the store is disabled, and no counter values are kept.
+
+    Attributes:
+        retention: Number of ROPs held for each cell.
+        max_counters: Number of distinct counters which can be held.
+        cell_fdns: The FDN of each cell, by cell ID.
+        counter_names: The name of each counter column, in the order they were first seen.
+        values: The counter values, indexed by cell ID, ROP slot and counter column. Zero if not received.
+        reported: Bitmask of the counters received, indexed by cell ID and ROP slot, with the bit of each counter
+            column packed 8 to a byte, least significant bit first.
+        size: Metric: Bytes allocated for the counter values and bitmask
+        dropped_messages: Metric: Number of messages whose counters were dropped because their ROP is no longer held
+    """
+
+    def __init__(self, retention: int, max_counters: int):
+        self.retention = max(retention, 0)
+        self.max_counters = max(max_counters, 0)
+        self.cell_fdns: list[str] = []
+        self.counter_names: list[str] = []
+        self.values = np.empty((0, self.retention, self.max_counters), VALUE_DTYPE)
+        self.reported = np.empty(self.__reported_shape(0), np.uint8)
+        self._counter_columns: dict[str, int] = {}
+        self._rop_slots: dict[int, int] = {}
+        self._full = False
+        self.size = metrics_registry.gauges.get("pm_counter_store_size_bytes")
+        self.dropped_messages = metrics_registry.counters.get(
+            "pm_counter_store_dropped_messages"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether counter values are kept."""
+        return self.retention > 0
+
+    def allocate(self, cell_fdns: list[str]):
+        """Allocate the store for a set of cells, given by the FDN of each cell ID, discarding anything recorded so far."""
+        self.cell_fdns = list(cell_fdns)
+        self.counter_names = []
+        self._counter_columns.clear()
+        self._rop_slots.clear()
+        self._full = False
+        self.values = np.zeros(
+            (len(self.cell_fdns), self.retention, self.max_counters), VALUE_DTYPE
+        )
+        self.reported = np.zeros(self.__reported_shape(len(self.cell_fdns)), np.uint8)
+        self.size.set(self.nbytes)
+        logger.info(
+            f"Allocated {self.nbytes} bytes to store {self.max_counters} PM counters of "
+            f"{len(self.cell_fdns)} cells for {self.retention} ROPs"
+        )
+
+    def restore(
+        self,
+        cell_fdns: list[str],
+        counter_names: list[str],
+        rop_slots: Mapping[int, int],
+        values: np.ndarray,
+        reported: np.ndarray,
+    ):
+        """
+        Take over counter values and their bitmask recorded by a previous run, which must have the shapes this store
+        would allocate.
+
+        The arrays are used as they are, so they may be backed by a memory-mapped file.
+        """
+        shape = (len(cell_fdns), self.retention, self.max_counters)
+        if values.shape != shape or values.dtype != VALUE_DTYPE:
+            raise ValueError(
+                f"Expected counter values of shape {shape}, but got {values.shape} of {values.dtype}"
+            )
+        reported_shape = self.__reported_shape(len(cell_fdns))
+        if reported.shape != reported_shape or reported.dtype != np.uint8:
+            raise ValueError(
+                f"Expected a counter bitmask of shape {reported_shape}, but got {reported.shape} of {reported.dtype}"
+            )
+        self.cell_fdns = list(cell_fdns)
+        self.counter_names = list(counter_names)
+        self._counter_columns = {name: column for column, name in enumerate(counter_names)}
+        self._rop_slots = dict(rop_slots)
+        self._full = len(self.counter_names) >= self.max_counters
+        self.values = values
+        self.reported = reported
+        self.size.set(self.nbytes)
+
+    def reindex(self, cell_fdns: list[str], old_ids: np.ndarray):
+        """
+        Resize the store for a new set of cells, keeping the values of every cell which remains. `old_ids` gives the
+        previous cell ID of each new cell ID, or -1 for an added cell, which starts with no counters received.
+
+        The rows are moved within the existing arrays, which are only reallocated if there are more cells, so a
+        reconcile does not hold a second copy of the store. With fewer cells, the rows no longer used stay allocated.
+        """
+        self.values = reindex_rows_in_place(self.values, old_ids, 0)
+        self.reported = reindex_rows_in_place(self.reported, old_ids, 0)
+        self.cell_fdns = list(cell_fdns)
+        self.size.set(self.nbytes)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the counter values and their bitmask."""
+        return self.values.nbytes + self.reported.nbytes
+
+    def record(
+        self, cell_id: int, rop_begin_time: int, counters: Mapping[str, int]
+    ) -> bool:
+        """Store the counter values of one message. Returns False if its ROP is older than every ROP held."""
+        slot = self.__slot(rop_begin_time)
+        if slot is None:
+            self.dropped_messages.inc()
+            return False
+        columns = []
+        values = []
+        for name, value in counters.items():
+            column = self._counter_columns.get(name)
+            if column is None:
+                column = self.__add_counter(name)
+                if column is None:
+                    continue
+            columns.append(column)
+            values.append(value)
+        self.values[cell_id, slot, columns] = values
+        reported = self.reported[cell_id, slot]
+        for column in columns:
+            reported[column >> 3] |= 1 << (column & 7)
+        return True
+
+    def rops(self) -> list[int]:
+        """The `ropBeginTimeInEpoch` of every ROP held, oldest first."""
+        return sorted(self._rop_slots)
+
+    def rop_slots(self) -> dict[int, int]:
+        """The slot of every ROP held, by `ropBeginTimeInEpoch`."""
+        return dict(self._rop_slots)
+
+    def latest_rop(self) -> Optional[int]:
+        """The `ropBeginTimeInEpoch` of the most recent ROP held, or None if nothing was recorded."""
+        return max(self._rop_slots, default=None)
+
+    def counter_values(self, counter: str, rop: Optional[int] = None) -> np.ndarray:
+        """
+        A copy of the values of one counter in a ROP, indexed by cell ID. Defaults to the latest ROP.
+
+        Cells which did not report the counter are zero, as are all cells if the counter or ROP is not held. Use
+        `counter_reported` to tell them apart from a reported zero.
+        """
+        column = self._counter_columns.get(counter)
+        slot = self._rop_slots.get(self.latest_rop() if rop is None else rop)
+        if column is None or slot is None:
+            return np.zeros(len(self.cell_fdns), VALUE_DTYPE)
+        return self.values[:, slot, column].copy()
+
+    def counter_reported(self, counter: str, rop: Optional[int] = None) -> np.ndarray:
+        """Whether each cell, by cell ID, reported one counter in a ROP. Defaults to the latest ROP."""
+        column = self._counter_columns.get(counter)
+        slot = self._rop_slots.get(self.latest_rop() if rop is None else rop)
+        if column is None or slot is None:
+            return np.zeros(len(self.cell_fdns), bool)
+        return (self.reported[:, slot, column >> 3] >> (column & 7) & 1).astype(bool)
+
+    def cells_reporting(self, rop: Optional[int] = None) -> np.ndarray:
+        """Whether each cell, by cell ID, reported any counter in a ROP. Defaults to the latest ROP."""
+        slot = self._rop_slots.get(self.latest_rop() if rop is None else rop)
+        if slot is None:
+            return np.zeros(len(self.cell_fdns), bool)
+        return self.reported[:, slot, :].any(axis=1)
+
+    def __slot(self, rop_begin_time: int) -> Optional[int]:
+        """The slot of a ROP, taking over the slot of the oldest ROP held if it is new."""
+        slot = self._rop_slots.get(rop_begin_time)
+        if slot is not None:
+            return slot
+        if len(self._rop_slots) < self.retention:
+            slot = len(self._rop_slots)
+        else:
+            oldest = min(self._rop_slots)
+            if rop_begin_time < oldest:
+                return None
+            slot = self._rop_slots.pop(oldest)
+            self.values[:, slot, :] = 0
+            self.reported[:, slot, :] = 0
+        self._rop_slots[rop_begin_time] = slot
+        return slot
+
+    def __reported_shape(self, cells: int) -> tuple[int, int, int]:
+        return cells, self.retention, -(-self.max_counters // 8)
+
+    def __add_counter(self, name: str) -> Optional[int]:
+        """Give a newly seen counter a column, or return None if every column is taken."""
+        if len(self.counter_names) >= self.max_counters:
+            if not self._full:
+                logger.warning(
+                    f"The PM counter store is full with {self.max_counters} counters, dropping counter {name} "
+                    "and any other new counters"
+                )
+                self._full = True
+            return None
+        column = len(self.counter_names)
+        self.counter_names.append(name)
+        self._counter_columns[name] = column
+        return column
+
+
+pm_counter_store = PmCounterStore(
+    int(get_config().get("counter_store_rops")),
+    int(get_config().get("counter_store_max_counters")),
+)
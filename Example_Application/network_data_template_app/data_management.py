@@ -3,16 +3,15 @@ Data Management
 https://developer.intelligentautomationplatform.ericsson.net/#capabilities/data-management
 """
 
-import time
 from typing import Tuple
 
 import httpx
 from authlib.integrations.base_client import MissingTokenError
 from authlib.integrations.httpx_client import OAuth2Client
-from httpx import HTTPStatusError
 
 from .mtls_logging import logger
 from .config import get_config
+from .retry_policy import retry_policies
 
 config = get_config()
 
@@ -33,33 +32,17 @@ def _get_data_jobs(client: OAuth2Client) -> list:
     """
     logger.debug(f"Accessing Data Management at {DATA_MANAGEMENT_URL}")
 
-    max_retries = int(config.get("max_retries"))
-    retry_delay = int(config.get("retry_delay"))
-    response = None
-    for attempt in range(max_retries):
-        try:
-            response = client.request("get", f"{DATA_MANAGEMENT_URL}")
-            response.raise_for_status()
-            break
-        except (HTTPStatusError, MissingTokenError) as e:
-            if attempt < max_retries - 1:
-                logger.error(
-                    (
-                        f"Could not retrieve connection details from Data Management to establish Message Bus connection:"
-                        f" {e} Retrying... ({attempt + 1}/{max_retries})"
-                    )
-                )
-                time.sleep(retry_delay * (2**attempt))
-            else:
-                match e:
-                    case MissingTokenError():
-                        raise DataManagementError(
-                            f"Unable to retrieve token after retrying. ({attempt + 1}/{max_retries})"
-                        ) from e
-                    case httpx.HTTPStatusError():
-                        raise DataManagementError(
-                            f"Elapsed retries ({attempt + 1}/{max_retries}) with HTTP error: {e}"
-                        ) from e
+    def request() -> httpx.Response:
+        response = client.request("get", f"{DATA_MANAGEMENT_URL}")
+        response.raise_for_status()
+        return response
+
+    try:
+        response = retry_policies["data_management"].call_sync(request)
+    except MissingTokenError as e:
+        raise DataManagementError("Unable to retrieve token after retrying.") from e
+    except httpx.HTTPError as e:
+        raise DataManagementError(f"Elapsed retries with HTTP error: {e}") from e
 
     logger.debug(f"Retrieved {len(response.json())} data job(s)")
 
@@ -106,14 +89,20 @@ def _parse_message_bus_connection(data_job: dict) -> Tuple[str, str, str]:
 def get_message_bus_details(client: OAuth2Client) -> dict:
     """
     Obtain Message Bus connection details from the data job in your rApp's packaged Data Access Configuration.
-    This function will return the Kafka server, port and topic name from Data Management.
+    This function will return the Kafka server, port and topic name from Data Management,
+    along with the `dataDeliverySchemaId` of the data job, if it declares one.
 
     Find your Data Access Configuration in:
         csar/OtherDefinitions/DataManagement/data-access-configuration.json
     """
     data_jobs = _get_data_jobs(client)
     message_bus = _parse_message_bus_connection(data_jobs[0])
-    return {"topic": message_bus[0], "hostname": message_bus[1], "port": message_bus[2]}
+    return {
+        "topic": message_bus[0],
+        "hostname": message_bus[1],
+        "port": message_bus[2],
+        "schema_subject": data_jobs[0].get("dataDeliverySchemaId"),
+    }
 
 
 class DataManagementError(Exception):
@@ -0,0 +1,113 @@
+"""
+This module provides an optional process pool for decoding PM messages off the event loop.
+
+Avro decoding is CPU-bound and synchronous, so decoding a large batch on the event loop blocks the API routes and the
+log sender until the whole batch is done. With the pool enabled, raw message values are sent in chunks to worker
+processes. Each worker keeps its own compiled decoders and sends back only the fields the consumer needs.
+
+If a worker process dies, for example when it is killed for running out of memory, the pool is broken. It is then
+replaced by a new pool, and the chunks which were in flight are decoded on the event loop instead.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable
+
+import avro.schema
+
+from .decode_worker import DecodedPmMessage, decode_chunk
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+
+class DecodePool:
+    """
+    Decode PM messages in chunks on a pool of worker processes.
+
+    Attributes:
+        chunk_size: Maximum number of messages sent to a worker at once.
+        fields: The top-level fields the workers decode. Every other field is skipped.
+        queue_depth: Metric: Number of chunks submitted to the pool and not yet decoded.
+        chunk_latency: Metric: Seconds taken to decode a chunk, including time spent waiting for a free worker.
+        restarts: Metric: Number of times the pool was recreated after a worker process died.
+    """
+
+    def __init__(self, workers: int, chunk_size: int, fields: Iterable[str]):
+        self.workers = workers
+        self._executor = self.__create_executor()
+        self.chunk_size = max(chunk_size, 1)
+        self.fields = frozenset(fields)
+        self.queue_depth = metrics_registry.gauges.get("decode_pool_queue_depth")
+        self.chunk_latency = metrics_registry.histograms.get(
+            "decode_pool_chunk_latency_seconds"
+        )
+        self.restarts = metrics_registry.counters.get("decode_pool_restarts")
+        logger.info(f"Decoding PM messages on {workers} worker processes")
+
+    async def decode(
+        self, schema_id: str, schema: avro.schema.Schema, avro_values: list[bytes]
+    ) -> list[DecodedPmMessage]:
+        """Decode Avro values (without the magic byte prefix) written with one schema. Results keep the input order."""
+        chunks = [
+            avro_values[start : start + self.chunk_size]
+            for start in range(0, len(avro_values), self.chunk_size)
+        ]
+        decoded_chunks = await asyncio.gather(
+            *(self.__decode_chunk(schema_id, schema, chunk) for chunk in chunks)
+        )
+        return [message for chunk in decoded_chunks for message in chunk]
+
+    def shutdown(self):
+        """Stop the worker processes, dropping any chunks which have not started decoding."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def __decode_chunk(
+        self, schema_id: str, schema: avro.schema.Schema, chunk: list[bytes]
+    ) -> list[DecodedPmMessage]:
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        self.queue_depth.inc()
+        start_time = time.perf_counter()
+        try:
+            decoded_chunk = await loop.run_in_executor(
+                executor, decode_chunk, schema_id, None, self.fields, chunk
+            )
+            if decoded_chunk is None:
+                logger.debug(f"Sending schema ID {schema_id} to a decode worker")
+                decoded_chunk = await loop.run_in_executor(
+                    executor,
+                    decode_chunk,
+                    schema_id,
+                    str(schema),
+                    self.fields,
+                    chunk,
+                )
+            return decoded_chunk
+        except BrokenProcessPool as e:
+            self.__restart(executor, e)
+            # Decoded here rather than resubmitted, in case the chunk itself is what killed the worker.
+            decoded_chunk = decode_chunk(schema_id, None, self.fields, chunk)
+            if decoded_chunk is None:
+                decoded_chunk = decode_chunk(schema_id, str(schema), self.fields, chunk)
+            return decoded_chunk
+        finally:
+            self.queue_depth.dec()
+            self.chunk_latency.observe(time.perf_counter() - start_time)
+
+    def __create_executor(self) -> ProcessPoolExecutor:
+        # Workers are spawned rather than forked, as the parent process runs Kafka and asyncio threads.
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def __restart(self, executor: ProcessPoolExecutor, error: BrokenProcessPool):
+        """Replace a broken executor, unless another chunk which was in flight on it already did."""
+        if self._executor is not executor:
+            return
+        logger.error(f"A decode worker process died, restarting the decode pool: {error}")
+        self.restarts.inc()
+        self._executor = self.__create_executor()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,95 @@
+"""
+This module runs inside the decode pool's worker processes.
+
+It deliberately imports nothing from the application except the Avro decoder, so that spawning a worker does not
+set up logging clients, metrics or configuration.
+"""
+
+from typing import NamedTuple, Optional
+
+import avro.errors
+import avro.schema
+
+from .avro_decoder import CompiledDecoder
+
+
+class DecodedPmMessage(NamedTuple):
+    """
+    The fields of a PM message which the consumer uses, as returned by a decode worker.
+
+    The ROP times and `counters` are only filled in if `ropBeginTimeInEpoch`, `ropEndTimeInEpoch` and `pmCounters`
+    respectively are decoded.
+    """
+
+    dn_prefix: Optional[str]
+    mo_fdn: Optional[str]
+    has_pm_counters: bool
+    error: Optional[str] = None
+    rop_begin_time: Optional[int] = None
+    rop_end_time: Optional[int] = None
+    counters: Optional[dict[str, int]] = None
+
+
+def extract_counter_values(pm_counters: dict) -> dict[str, int]:
+    """
+    The values of the counters present in a decoded `pmCounters` record, by counter name.
+
+    Only single-valued counters are returned. PDF counters, whose value is an array of bins, are left out.
+    """
+    return {
+        name: counter["counterValue"]
+        for name, counter in pm_counters.items()
+        if counter is not None
+        and counter.get("isValuePresent")
+        and isinstance(counter.get("counterValue"), int)
+    }
+
+
+# Compiled decoders of the current worker process, keyed by schema ID and projected fields.
+_worker_decoders: dict[tuple[str, frozenset[str]], CompiledDecoder] = {}
+
+
+def decode_chunk(
+    schema_id: str,
+    schema_json: Optional[str],
+    fields: frozenset[str],
+    avro_values: list[bytes],
+) -> Optional[list[DecodedPmMessage]]:
+    """
+    Decode a chunk of Avro values in a worker process, or in the consumer process if the decode pool broke.
+
+    Schemas are only sent to a worker when it asks for them: if `schema_json` is None and this worker has not yet
+    compiled a decoder for `schema_id`, None is returned and the chunk must be resubmitted with the schema.
+    """
+    key = (schema_id, fields)
+    if schema_json is not None:
+        _worker_decoders[key] = CompiledDecoder(avro.schema.parse(schema_json), fields)
+    decoder = _worker_decoders.get(key)
+    if decoder is None:
+        return None
+
+    with_rop_begin = "ropBeginTimeInEpoch" in fields
+    with_rop_end = "ropEndTimeInEpoch" in fields
+    with_counters = "pmCounters" in fields
+    decoded_messages = []
+    for avro_value in avro_values:
+        try:
+            message = decoder.decode(avro_value)
+            pm_counters = message.get("pmCounters")
+            decoded_messages.append(
+                DecodedPmMessage(
+                    message.get("dnPrefix"),
+                    message.get("moFdn"),
+                    pm_counters is not None,
+                    rop_begin_time=message.get("ropBeginTimeInEpoch") if with_rop_begin else None,
+                    rop_end_time=message.get("ropEndTimeInEpoch") if with_rop_end else None,
+                    counters=(
+                        extract_counter_values(pm_counters)
+                        if with_counters and pm_counters is not None
+                        else None
+                    ),
+                )
+            )
+        except avro.errors.AvroException as err:
+            decoded_messages.append(DecodedPmMessage(None, None, False, str(err)))
+    return decoded_messages
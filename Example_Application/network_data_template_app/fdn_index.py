@@ -0,0 +1,208 @@
+"""
+This module provides lookup structures over the FDNs of the cells the application monitors,
+so that PM messages can be filtered without scanning the whole cell list.
+"""
+
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+FDN_PREFIX = "urn:3gpp:dn:"
+RDN_SEPARATOR = ","
+MANAGED_ELEMENT_RDN = "ManagedElement="
+# Bytes of rows moved at once by `reindex_rows_in_place`.
+REINDEX_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def _rdn_prefixes(fdn: str) -> Iterable[str]:
+    """Yield every leading run of RDNs of an FDN, shortest first, e.g. `A=1`, `A=1,B=2`, `A=1,B=2,C=3`."""
+    end = fdn.find(RDN_SEPARATOR)
+    while end != -1:
+        yield fdn[:end]
+        end = fdn.find(RDN_SEPARATOR, end + 1)
+    yield fdn
+
+
+def split_cell_fdn(prefixed_fdn: str) -> tuple[str, str]:
+    """
+    Split a cell FDN into the `dnPrefix` and `moFdn` which PM messages carry for that cell.
+
+    The `dnPrefix` is every RDN before the ManagedElement, and the `moFdn` starts at the ManagedElement. An FDN with no
+    ManagedElement has an empty `dnPrefix`.
+    """
+    fdn = prefixed_fdn.removeprefix(FDN_PREFIX)
+    if fdn.startswith(MANAGED_ELEMENT_RDN):
+        return "", fdn
+    end = fdn.find(RDN_SEPARATOR + MANAGED_ELEMENT_RDN)
+    if end == -1:
+        return "", fdn
+    return fdn[:end], fdn[end + 1 :]
+
+
+class NodeFdnIndex:
+    """
+    A hash index of the DN prefixes of the monitored cells.
+
+    A message's `nodeFDN` header names the ManagedElement that produced it, which is a leading run of RDNs of every
+    cell FDN it hosts. Indexing each leading run of RDNs of each cell (with and without the `urn:3gpp:dn:` prefix)
+    turns the "is this node one of ours" check into a single set lookup instead of a substring scan over every cell.
+    An empty header value matches as long as any cell is indexed, as the substring check did.
+    """
+
+    def __init__(self, prefixed_fdns: Iterable[str] = ()):
+        prefixes = set()
+        for prefixed_fdn in prefixed_fdns:
+            fdn = prefixed_fdn.removeprefix(FDN_PREFIX)
+            prefixes.add("")
+            for prefix in _rdn_prefixes(fdn):
+                prefixes.add(prefix)
+                prefixes.add(FDN_PREFIX + prefix)
+        self._prefixes: frozenset[str] = frozenset(prefixes)
+
+    def __contains__(self, node_fdn: object) -> bool:
+        return node_fdn in self._prefixes
+
+    def __len__(self) -> int:
+        return len(self._prefixes)
+
+
+class CellIdTable:
+    """
+    Dense integer IDs for the monitored cells, numbered in the order of their FDNs.
+
+    PM messages identify their cell by `dnPrefix` and `moFdn`, which joined together give the cell's FDN. Looking the
+    pair up here gives the cell's ID, which then indexes any per-cell state. The table is nested by `dnPrefix`, which
+    is shared by every cell of a node, so when the `dnPrefix` ends just before the ManagedElement, as messages usually
+    have it, a lookup is two dict lookups and allocates nothing. A message split at any other RDN, or with an empty
+    `dnPrefix`, is looked up by its joined FDN instead.
+
+    Attributes:
+        fdns: The FDN of each cell, by cell ID.
+    """
+
+    def __init__(self, prefixed_fdns: Iterable[str] = ()):
+        self.fdns: list[str] = list(dict.fromkeys(prefixed_fdns))
+        self._ids: dict[str, dict[str, int]] = {}
+        self._ids_by_fdn: dict[str, int] = {}
+        for cell_id, prefixed_fdn in enumerate(self.fdns):
+            dn_prefix, mo_fdn = split_cell_fdn(prefixed_fdn)
+            self._ids.setdefault(dn_prefix, {})[mo_fdn] = cell_id
+            self._ids_by_fdn[prefixed_fdn] = cell_id
+
+    def lookup(self, dn_prefix: Optional[str], mo_fdn: Optional[str]) -> Optional[int]:
+        """The ID of the cell with this `dnPrefix` and `moFdn`, or None if it is not monitored."""
+        mo_fdns = self._ids.get(dn_prefix)
+        if mo_fdns is not None:
+            cell_id = mo_fdns.get(mo_fdn)
+            if cell_id is not None:
+                return cell_id
+        if dn_prefix is None or mo_fdn is None:
+            return None
+        if not dn_prefix:
+            return self._ids_by_fdn.get(FDN_PREFIX + mo_fdn)
+        return self._ids_by_fdn.get(FDN_PREFIX + dn_prefix + RDN_SEPARATOR + mo_fdn)
+
+    def __len__(self) -> int:
+        return len(self.fdns)
+
+
+class CellDelta(NamedTuple):
+    """
+    A change to the monitored cells, with the lookup structures for the new cells built in advance.
+
+    Attributes:
+        cell_ids: The IDs of the new cells.
+        node_fdn_index: The index of the new cells' DN prefixes.
+        old_ids: The previous cell ID of each new cell ID, or -1 for a cell which was added.
+        added: Number of cells added.
+        removed: Number of cells removed.
+    """
+
+    cell_ids: CellIdTable
+    node_fdn_index: NodeFdnIndex
+    old_ids: np.ndarray
+    added: int
+    removed: int
+
+
+def diff_cells(cell_fdns: list[str], prefixed_fdns: Iterable[str]) -> Optional[CellDelta]:
+    """Compare the FDNs of the current cells, by cell ID, with a new set of cells. Returns None if they are the same."""
+    cell_ids = CellIdTable(prefixed_fdns)
+    if cell_ids.fdns == cell_fdns:
+        return None
+    old_ids_by_fdn = {fdn: cell_id for cell_id, fdn in enumerate(cell_fdns)}
+    old_ids = np.fromiter(
+        (old_ids_by_fdn.get(fdn, -1) for fdn in cell_ids.fdns), np.int64, len(cell_ids)
+    )
+    added = int(np.count_nonzero(old_ids < 0))
+    return CellDelta(
+        cell_ids,
+        NodeFdnIndex(cell_ids.fdns),
+        old_ids,
+        added,
+        len(cell_fdns) - (len(cell_ids) - added),
+    )
+
+
+def reindex_rows(values: np.ndarray, old_ids: np.ndarray, fill: object) -> np.ndarray:
+    """A copy of per-cell `values` indexed by new cell ID, given the old ID of each, with `fill` for added cells."""
+    reindexed = np.full((len(old_ids), *values.shape[1:]), fill, values.dtype)
+    kept = old_ids >= 0
+    reindexed[kept] = values[old_ids[kept]]
+    return reindexed
+
+
+def reindex_rows_in_place(values: np.ndarray, old_ids: np.ndarray, fill: object) -> np.ndarray:
+    """
+    Per-cell `values` indexed by new cell ID, given the old ID of each, with `fill` for added cells.
+
+    Unlike `reindex_rows`, the rows are moved within `values`, which is only replaced by a larger array if there are
+    more new cells than rows. The result is a view of the first rows of `values` otherwise.
+    """
+    if len(old_ids) > len(values):
+        grown = np.empty((len(old_ids), *values.shape[1:]), values.dtype)
+        grown[: len(values)] = values
+        values = grown
+    new_ids = np.flatnonzero(old_ids >= 0)
+    moved = new_ids[old_ids[new_ids] != new_ids]
+    sources = old_ids[moved]
+    if np.all(sources[1:] > sources[:-1]):
+        # The remaining cells kept their order, so rows moving down can be moved first to last, and rows moving up
+        # last to first, without overwriting a row which is still to be moved.
+        down = sources > moved
+        _move_rows(values, moved[down], sources[down])
+        _move_rows(values, moved[~down][::-1], sources[~down][::-1])
+    else:
+        _move_rows_by_cycles(values, moved, sources)
+    values[np.flatnonzero(old_ids < 0)] = fill
+    return values[: len(old_ids)]
+
+
+def _move_rows(values: np.ndarray, new_ids: np.ndarray, old_ids: np.ndarray):
+    """Move rows in order, a chunk of at most `REINDEX_CHUNK_BYTES` at a time."""
+    chunk_rows = max(REINDEX_CHUNK_BYTES // max(values[0].nbytes, 1), 1) if len(values) else 1
+    for start in range(0, len(new_ids), chunk_rows):
+        end = start + chunk_rows
+        values[new_ids[start:end]] = values[old_ids[start:end]]
+
+
+def _move_rows_by_cycles(values: np.ndarray, new_ids: np.ndarray, old_ids: np.ndarray):
+    """
+    Move rows in any order, one at a time. Each chain of moves is followed from the row nothing is moved out of, and
+    each cycle of moves through a copy of one of its rows.
+    """
+    old_id_of = dict(zip(new_ids.tolist(), old_ids.tolist()))
+    sources = set(old_id_of.values())
+    for new_id in [new_id for new_id in old_id_of if new_id not in sources]:
+        while new_id in old_id_of:
+            old_id = old_id_of.pop(new_id)
+            values[new_id] = values[old_id]
+            new_id = old_id
+    while old_id_of:
+        start, old_id = old_id_of.popitem()
+        row = values[start].copy()
+        new_id = start
+        while old_id != start:
+            values[new_id] = values[old_id]
+            new_id, old_id = old_id, old_id_of.pop(old_id)
+        values[new_id] = row
@@ -0,0 +1,109 @@
+"""
+This module periodically reports how far the message bus consumer is behind on each of its assigned partitions.
+
+The committed offsets and high watermarks are read through the confluent_kafka API in a separate thread, as both are
+blocking broker requests, and published as gauges labelled by topic and partition.
+"""
+
+import asyncio
+import time
+
+from confluent_kafka import Consumer, KafkaException
+
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+
+class ConsumerLagCollector:
+    """
+    Publish per-partition lag, consumption rate and oldest unprocessed message age for a consumer.
+
+    The oldest unprocessed message was produced after the last message processed from its partition, so while a
+    partition has lag, the age of that last processed message is reported as an upper bound for it.
+
+    Attributes:
+        consumer: The confluent_kafka consumer whose assigned partitions are reported.
+        interval: Seconds between collections.
+        timeout: Seconds to wait for each broker request.
+        lag: Metric: Messages between the committed offset and the high watermark of a partition
+        consumption_rate: Metric: Messages per second committed on a partition since the previous collection
+        oldest_unprocessed_age: Metric: Upper bound on the age in seconds of the oldest unprocessed message of a partition
+    """
+
+    def __init__(self, consumer: Consumer, interval: float, timeout: float = 5.0):
+        self.consumer = consumer
+        self.interval = interval
+        self.timeout = timeout
+        self.lag = metrics_registry.gauges.get("consumer_partition_lag")
+        self.consumption_rate = metrics_registry.gauges.get(
+            "consumer_partition_consumption_rate"
+        )
+        self.oldest_unprocessed_age = metrics_registry.gauges.get(
+            "consumer_partition_oldest_unprocessed_message_age_seconds"
+        )
+        self._last_processed_ms: dict[int, float] = {}
+        self._previous_offsets: dict[tuple[str, int], tuple[int, float]] = {}
+
+    def record_processed(self, partition: int, timestamp_ms: float):
+        """Record the Message Bus timestamp of a message processed from a partition."""
+        if timestamp_ms > self._last_processed_ms.get(partition, 0):
+            self._last_processed_ms[partition] = timestamp_ms
+
+    async def run(self):
+        """Collect the partition metrics every `interval` seconds until cancelled."""
+        logger.debug(f"Collecting consumer lag every {self.interval} seconds")
+        while True:
+            try:
+                await asyncio.to_thread(self.collect)
+            except KafkaException as e:
+                logger.warning(f"Unable to collect consumer lag: {e}")
+            await asyncio.sleep(self.interval)
+
+    def collect(self):
+        """Read the committed offsets and watermarks of the assigned partitions, and update the gauges. Blocking."""
+        assignment = self.consumer.assignment()
+        committed = (
+            self.consumer.committed(assignment, timeout=self.timeout)
+            if assignment
+            else []
+        )
+        now = time.monotonic()
+        now_ms = time.time() * 1000
+
+        previous_offsets = self._previous_offsets
+        self._previous_offsets = {}
+        for partition in committed:
+            partition_key = (partition.topic, partition.partition)
+            labels = (partition.topic, str(partition.partition))
+            previous = previous_offsets.pop(partition_key, None)
+            watermarks = self.consumer.get_watermark_offsets(
+                partition, timeout=self.timeout, cached=False
+            )
+            if watermarks is None:
+                logger.warning(f"Timed out reading the watermarks of partition {labels}")
+                if previous is not None:
+                    self._previous_offsets[partition_key] = previous
+                continue
+            # Before anything is committed on a partition, consumption started from its low watermark.
+            offset = partition.offset if partition.offset >= 0 else watermarks[0]
+            lag = max(watermarks[1] - offset, 0)
+            self._previous_offsets[partition_key] = (offset, now)
+            self.lag.labels(*labels).set(lag)
+
+            if previous is not None and now > previous[1]:
+                self.consumption_rate.labels(*labels).set(
+                    max(offset - previous[0], 0) / (now - previous[1])
+                )
+
+            last_processed_ms = self._last_processed_ms.get(partition.partition)
+            age = (now_ms - last_processed_ms) / 1000 if lag and last_processed_ms else 0
+            self.oldest_unprocessed_age.labels(*labels).set(max(age, 0))
+
+        # Stop reporting partitions which were revoked since the previous collection.
+        for topic, partition in previous_offsets:
+            self._last_processed_ms.pop(partition, None)
+            for gauge in (self.lag, self.consumption_rate, self.oldest_unprocessed_age):
+                try:
+                    gauge.remove(topic, str(partition))
+                except KeyError:
+                    pass
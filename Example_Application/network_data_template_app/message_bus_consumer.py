@@ -15,21 +15,43 @@ from typing import Optional
 
 import avro.schema
 from authlib.integrations.httpx_client import OAuth2Client, AsyncOAuth2Client
-from confluent_kafka import Consumer, KafkaException, Message
+from confluent_kafka import Consumer, KafkaException, Message, TIMESTAMP_NOT_AVAILABLE, TopicPartition
+from httpx import HTTPError
 
+from .batch_controller import AdaptiveBatchController
 from .config import get_config
+from .counter_presence import CounterPresence
+from .counter_shards import CounterStatusShards, reindex_counter_presence
+from .counter_store import pm_counter_store
 from .data_management import get_message_bus_details, DataManagementError
+from .decode_pool import DecodePool
+from .decode_worker import extract_counter_values
+from .fdn_index import CellDelta, CellIdTable, NodeFdnIndex, diff_cells
+from .lag_collector import ConsumerLagCollector
 from .mtls_logging import logger
-from .metrics import metrics_registry
-from .schema_registry import get_schema, deserialize_message
-from .topology_and_inventory import get_nr_cell_dus, get_sourceids_from_cells
+from .metrics import CONSUMER_STAGES, metrics_registry
+from .offset_commits import OffsetCommitManager, on_commit
+from .replay_consumer import ReplayConsumer
+from .rop_dedup import rop_deduplicator
+from .rop_windows import rop_windows
+from .schema_registry import (
+    deserialize_message,
+    get_schema,
+    prefetch_schema,
+    schema_cache,
+)
+from .snapshot import consumer_snapshot
+from .topology_cache import cell_cache
 
-FDN_PREFIX = "urn:3gpp:dn:"
 AVRO_MAGIC_BYTE_COUNT = 5
 NODE_FDN_HEADER_KEY = "nodeFDN"
 MO_TYPE_HEADER_KEY = "moType"
+# The only PM message fields decoded eagerly. Every other field, including the bulky `pmCounters`, is skipped.
+DECODED_FIELDS = ("dnPrefix", "moFdn")
+# The fields also decoded when the counter store or ROP windowing is enabled, to use the counter values of each ROP.
+COUNTER_FIELDS = ("ropBeginTimeInEpoch", "ropEndTimeInEpoch", "pmCounters")
 
-fdn_to_pm_counter_status = {}
+counter_presence = CounterPresence()
 
 
 def _get_message_bus_connection_details(client: OAuth2Client) -> dict[str, str]:
@@ -83,7 +105,7 @@ def _is_relevant_motype(
 
 
 def _is_relevant_node_fdn(
-    parsed_headers: list[list[str | bytes | None]], prefixed_fdns: list[str]
+    parsed_headers: list[list[str | bytes | None]], node_fdn_index: NodeFdnIndex
 ) -> bool:
     """Check if the parsed headers contain the relevant nodeFdn."""
     logger.debug("Checking for relevant nodeFdn")
@@ -91,21 +113,57 @@ def _is_relevant_node_fdn(
     for header_message in parsed_headers:
         if header_message[0] == NODE_FDN_HEADER_KEY:
             node_fdn_value = header_message[1]
-            if any(node_fdn_value in fdn for fdn in prefixed_fdns):
+            if node_fdn_value in node_fdn_index:
                 logger.debug(f"nodeFDN matched: {node_fdn_value}")
                 return True
     return False
 
 
 def _set_counter_status(
-    deserialized_message: dict, prefixed_fdns: list[str], urn_dn_prefix_mo_fdn: str
+    has_pm_counters: bool,
+    cell_id: Optional[int],
+    presence: CounterPresence = counter_presence,
 ):
-    """If our message has counters for any of our FDNs, set `True` for that FDN in our status map."""
-    if urn_dn_prefix_mo_fdn in prefixed_fdns:
+    """If our message has counters for one of our cells, set that cell's bit in our counter presence."""
+    if cell_id is not None:
         metrics_registry.counters.get("filtered_messages_by_fdn").inc()
-        if deserialized_message.get("pmCounters") is not None:
-            fdn_to_pm_counter_status[urn_dn_prefix_mo_fdn] = True
-            logger.debug(f"PM kafka message counter status: {fdn_to_pm_counter_status}")
+        if has_pm_counters:
+            presence.set(cell_id)
+
+
+def _is_duplicate(cell_id: Optional[int], rop_begin_time: Optional[int]) -> bool:
+    """Whether our message is a repeat of one already handled for the same cell and ROP, if duplicates are suppressed."""
+    return (
+        rop_deduplicator.enabled
+        and cell_id is not None
+        and rop_begin_time is not None
+        and rop_deduplicator.is_duplicate(cell_id, rop_begin_time)
+    )
+
+
+def _record_counter_values(
+    cell_id: Optional[int],
+    rop_begin_time: Optional[int],
+    rop_end_time: Optional[int],
+    counters: Optional[dict[str, int]],
+):
+    """If our message is for one of our cells, keep its counter values in the counter store and its ROP's window."""
+    if cell_id is None or rop_begin_time is None:
+        return
+    if pm_counter_store.enabled and counters is not None:
+        pm_counter_store.record(cell_id, rop_begin_time, counters)
+    if rop_windows.enabled and rop_end_time is not None:
+        rop_windows.observe(cell_id, rop_begin_time, rop_end_time, counters)
+
+
+async def _get_prefixed_fdns(async_client: AsyncOAuth2Client) -> list[str]:
+    """
+    Get the FDNs of the cells to monitor from the topology cache, which queries Topology & Inventory if they expired.
+
+    With a topology page size, every cell of the inventory is fetched page by page. Otherwise, the first 10 cells are.
+    """
+    return await cell_cache.get(async_client)
+
 
 # pylint: disable=too-many-instance-attributes, disable=too-few-public-methods
 class MessageBusConsumer:
@@ -116,11 +174,22 @@ class MessageBusConsumer:
 
     Attributes:
         config: Configuration settings loaded from environment variables.
-        schema: Schema used for decoding messages.
         prefixed_fdns: The FDNs of the cells which the application will query attributes and filter PM counters for.
+        node_fdn_index: Index of the DN prefixes of `prefixed_fdns`, rebuilt whenever `prefixed_fdns` is assigned.
+        cell_ids: Integer IDs of the cells of `prefixed_fdns`, rebuilt whenever `prefixed_fdns` is assigned.
         client: The synchronous OAuth client which will be used for consumption.
         async_client: Asynchronous client used for retrieval of the message schema.
+        schema_subject: The `dataDeliverySchemaId` of the data job, whose schema is prefetched at startup, if known.
+        decoded_fields: The PM message fields decoded, which include `COUNTER_FIELDS` if the counter store or ROP
+            windowing is enabled, or the ROP begin time if only duplicate suppression is.
         consumer: A confluent_kafka consumer client.
+        counter_shards: Per-partition counter presence when this is one of several consumer workers, otherwise None
+            and counters are recorded straight into `counter_presence`.
+        batch_controller: Tunes the batch size and poll timeout, if `consumer_target_batch_latency` is set.
+        lag_collector: Publishes the lag of the consumer's assigned partitions every `consumer_lag_interval` seconds.
+        offset_commits: Commits the offsets of processed batches every `consumer_commit_batches` batches or
+            `consumer_commit_interval` seconds.
+        decode_pool: Process pool used to decode messages off the event loop, or None if `decode_workers` is 0.
         messages_consumed: Total number of messages consumed.
         filtered_messages: Total number of messages filtered for NRCellDU.
         filtered_messages_by_motype: Metric: Number of messages that have been filtered by MO Type
@@ -128,13 +197,26 @@ class MessageBusConsumer:
         complete_batches_consumed: Metric: Total number of complete batches consumed
         incomplete_batches_consumed: Metric: Total number of batches which have reached timeout that are partially filled
         empty_batches_consumed: Metric: Total number of batches which have reached timeout with zero messages
+        poll_duration: Metric: Seconds spent fetching a batch from the message bus
+        batch_wait_duration: Metric: Seconds the pipelined consumer waited for a fetched batch to process
+        backpressure_duration: Metric: Seconds the pipelined consumer waited for room to queue a fetched batch
+        batch_processing_duration: Metric: Seconds spent processing a batch
+        batch_end_to_end_duration: Metric: Seconds from starting to fetch a batch until it has been processed
+        stage_durations: Metric: Seconds spent in each stage of processing a message, by stage name
+        message_latency: Metric: Seconds from a message's Message Bus timestamp until it has been processed
+        pipeline_queue_depth: Metric: Number of fetched batches waiting to be processed by the pipelined consumer
 
     Methods:
         collect_counters: Begin PM counter collection infinitely.
         _consume_messages: Dispatch consumption to a separate thread and handle the resulting messages.
+        _consume_messages_pipelined: Fetch the next batches in a separate task while the current one is handled.
+        _poll_messages: Fetch a batch of messages in a separate thread.
+        _process_messages: Handle a batch of messages.
         _subscribe_to_topic: Fetch subscription details from Data Management and subscribe the consumer.
+        _prefetch_schemas: Warm the schema cache before the first messages are consumed.
         _fetch_prefixed_fdns: By default, get 10 cells from Topology & Inventory.
-            This populates the module variable `fdn_to_pm_counter_status` with their FDNs.
+            This sizes the module variable `counter_presence` for their cells.
+        _allocate_cell_state: Allocate the per-cell state for the cells of `cell_ids`.
         _get_token_consumer_client_callback: Callback for the consumer config to use the HTTPX client token.
     """
 
@@ -143,6 +225,7 @@ class MessageBusConsumer:
         client: OAuth2Client,
         async_client: AsyncOAuth2Client,
         consumer: Consumer = None,
+        counter_shards: Optional[CounterStatusShards] = None,
     ):
         """
         Initializes an instance of the class.
@@ -151,15 +234,55 @@ class MessageBusConsumer:
             client (OAuth2Client): The OAuth2 client used to interact with the IAM service.
             async_client (AsyncOAuth2Client): The AsyncOAuth2Client client used to fetch the avro schema.
             consumer (Consumer, optional): A Kafka consumer instance subscribed to the specified topic.
+            counter_shards (CounterStatusShards, optional): Shards to record counters in, for one of several workers.
         """
         self.config: dict[str, str] = get_config()
-        self.schema: avro.schema.Schema
         self.prefixed_fdns: list[str] = []
 
         self.client: OAuth2Client = client
         self.async_client: AsyncOAuth2Client = async_client
+        self.counter_shards: Optional[CounterStatusShards] = counter_shards
+        self.schema_subject: Optional[str] = None
         self.consumer: Consumer = consumer or self._initialize_consumer()
 
+        self.lag_collector = ConsumerLagCollector(
+            self.consumer, float(self.config.get("consumer_lag_interval"))
+        )
+        self.offset_commits = OffsetCommitManager(
+            self.consumer,
+            int(self.config.get("consumer_commit_batches")),
+            float(self.config.get("consumer_commit_interval")),
+        )
+        self.batch_controller = AdaptiveBatchController(
+            int(self.config.get("consumer_message_batch_size")),
+            float(self.config.get("consumer_timeout")),
+            float(self.config.get("consumer_target_batch_latency")),
+            (
+                int(self.config.get("consumer_min_batch_size")),
+                int(self.config.get("consumer_max_batch_size")),
+            ),
+            (
+                float(self.config.get("consumer_min_timeout")),
+                float(self.config.get("consumer_max_timeout")),
+            ),
+        )
+
+        self.decoded_fields: tuple[str, ...] = DECODED_FIELDS
+        if pm_counter_store.enabled or rop_windows.enabled:
+            self.decoded_fields += COUNTER_FIELDS
+        elif rop_deduplicator.enabled:
+            self.decoded_fields += ("ropBeginTimeInEpoch",)
+        decode_workers = int(self.config.get("decode_workers"))
+        self.decode_pool: Optional[DecodePool] = (
+            DecodePool(
+                decode_workers,
+                int(self.config.get("decode_chunk_size")),
+                self.decoded_fields,
+            )
+            if decode_workers > 0
+            else None
+        )
+
         self.messages_consumed = metrics_registry.counters.get("messages_consumed")
         self.filtered_messages_by_motype = metrics_registry.counters.get(
             "filtered_messages_by_motype"
@@ -176,26 +299,89 @@ class MessageBusConsumer:
         self.empty_batches_consumed = metrics_registry.counters.get(
             "empty_batch_of_messages_consumed"
         )
+        self.poll_duration = metrics_registry.histograms.get(
+            "consumer_poll_duration_seconds"
+        )
+        self.batch_wait_duration = metrics_registry.histograms.get(
+            "consumer_batch_wait_duration_seconds"
+        )
+        self.backpressure_duration = metrics_registry.histograms.get(
+            "consumer_backpressure_duration_seconds"
+        )
+        self.batch_processing_duration = metrics_registry.histograms.get(
+            "consumer_batch_processing_duration_seconds"
+        )
+        self.pipeline_queue_depth = metrics_registry.gauges.get(
+            "consumer_pipeline_queue_depth"
+        )
+        self.batch_end_to_end_duration = metrics_registry.histograms.get(
+            "consumer_batch_end_to_end_duration_seconds"
+        )
+        stage_duration = metrics_registry.histograms.get(
+            "consumer_stage_duration_seconds"
+        )
+        self.stage_durations = {
+            stage: stage_duration.labels(stage=stage) for stage in CONSUMER_STAGES
+        }
+        self.message_latency = metrics_registry.histograms.get(
+            "consumer_message_latency_seconds"
+        )
+
+    @property
+    def prefixed_fdns(self) -> list[str]:
+        """The FDNs of the cells which the application will filter PM counters for."""
+        return self._prefixed_fdns
+
+    @prefixed_fdns.setter
+    def prefixed_fdns(self, prefixed_fdns: list[str]):
+        self._prefixed_fdns = prefixed_fdns
+        self.node_fdn_index = NodeFdnIndex(prefixed_fdns)
+        self.cell_ids = CellIdTable(prefixed_fdns)
+
+    def _use_cells(self, cell_ids: CellIdTable, node_fdn_index: NodeFdnIndex):
+        """Switch to cells whose `cell_ids` and `node_fdn_index` were built in advance, off the event loop."""
+        self._prefixed_fdns = cell_ids.fdns
+        self.node_fdn_index = node_fdn_index
+        self.cell_ids = cell_ids
 
     async def collect_counters(self):
         """
         Continuously collect PM counters from the Message Bus.
         This method is meant to be used with asyncio.create_task, hence it catches CancelledError and handles cleanup as such.
 
-        - Calls an API to initialize Topology data. It then enters an infinite loop, where it:
-            - Consumes messages asynchronously from the message bus.
+        - Calls an API to initialize Topology data and warms the schema cache, unless this was already done for
+          this worker.
+          It then enters an infinite loop, where it:
+            - Consumes messages asynchronously from the message bus. If `consumer_pipeline_depth` is above zero,
+              the next batches are fetched while the current batch is processed.
             - Logs total messages consumed and filtered messages.
+            - Publishes the lag of the assigned partitions in a separate task, if `consumer_lag_interval` is set.
             - Updates PM counter status.
+        - On cancellation, commits the offsets of the processed messages synchronously before closing the consumer.
         """
+        lag_task = None
         try:
-            await self._fetch_prefixed_fdns()
+            if not self.prefixed_fdns:
+                await self._fetch_prefixed_fdns()
+                await self._prefetch_schemas()
+            if self.lag_collector.interval > 0:
+                lag_task = asyncio.create_task(self.lag_collector.run())
 
             logger.debug("Starting to collect PM counters from the message bus.")
-            while True:
-                await self._consume_messages()
+            pipeline_depth = int(self.config.get("consumer_pipeline_depth"))
+            if pipeline_depth > 0:
+                await self._consume_messages_pipelined(pipeline_depth)
+            else:
+                while True:
+                    await self._consume_messages()
         except asyncio.CancelledError:
             logger.info("Consumer is now closing.")
+            if lag_task is not None:
+                lag_task.cancel()
+            self.offset_commits.commit(asynchronous=False)
             self.consumer.close()
+            if self.decode_pool is not None:
+                self.decode_pool.shutdown()
 
     async def _consume_messages(self):
         """
@@ -203,14 +389,83 @@ class MessageBusConsumer:
 
         It performs the following steps:
         - Fetches messages from the Kafka consumer in batches.
-        - Calls handle_valid_message api for further processing
+        - Resolves the schemas of the batch and decodes its relevant messages, on the decode pool if enabled.
+        """
+        start_time = time.perf_counter()
+        messages = await self._poll_messages()
+        await self._process_messages(messages)
+        self.batch_end_to_end_duration.observe(time.perf_counter() - start_time)
+
+    async def _consume_messages_pipelined(self, pipeline_depth: int):
+        """
+        Consume messages from Kafka, fetching the next batches while the current one is processed.
+
+        A fetch task polls Kafka and puts batches on a queue holding at most `pipeline_depth` batches, while this task
+        processes them in order. When the queue is full the fetch task waits, which stops polling until processing
+        catches up, so at most `pipeline_depth` + 2 batches are held in memory at once. If the fetch task fails, its
+        error is raised once the batches it fetched are processed, as it would be by a sequential consumer.
+        """
+        batches: asyncio.Queue[tuple[float, list[Message]]] = asyncio.Queue(
+            maxsize=pipeline_depth
+        )
+
+        async def fetch_batches():
+            while True:
+                fetch_start_time = time.perf_counter()
+                messages = await self._poll_messages()
+                start_time = time.perf_counter()
+                await batches.put((fetch_start_time, messages))
+                self.backpressure_duration.observe(time.perf_counter() - start_time)
+                self.pipeline_queue_depth.set(batches.qsize())
+
+        fetch_task = asyncio.create_task(fetch_batches())
+        try:
+            while True:
+                start_time = time.perf_counter()
+                fetch_start_time, messages = await self.__next_batch(batches, fetch_task)
+                self.batch_wait_duration.observe(time.perf_counter() - start_time)
+                self.pipeline_queue_depth.set(batches.qsize())
+                await self._process_messages(messages)
+                self.batch_end_to_end_duration.observe(
+                    time.perf_counter() - fetch_start_time
+                )
+        finally:
+            fetch_task.cancel()
+
+    @staticmethod
+    async def __next_batch(
+        batches: asyncio.Queue, fetch_task: asyncio.Task
+    ) -> tuple[float, list[Message]]:
+        """Wait for the next fetched batch, raising the error of the fetch task if it fails first."""
+        if not batches.empty():
+            return batches.get_nowait()
+        get_task = asyncio.create_task(batches.get())
+        try:
+            await asyncio.wait(
+                (get_task, fetch_task), return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            if not get_task.done():
+                get_task.cancel()
+        if get_task.done() and not get_task.cancelled():
+            return get_task.result()
+        # The fetch task stopped without another batch, so fail with its error rather than wait forever.
+        return fetch_task.result()
+
+    async def _poll_messages(self) -> list[Message]:
+        """
+        Fetch a batch of messages from the Kafka consumer in a separate thread.
+
+        Returns the messages of the batch which do not carry an error.
         """
-        batch_size = int(self.config.get("consumer_message_batch_size"))
-        consumer_timeout = float(self.config.get("consumer_timeout"))
+        batch_size = self.batch_controller.batch_size
+        consumer_timeout = self.batch_controller.timeout
         try:
+            start_time = time.perf_counter()
             messages = await asyncio.to_thread(
                 self.consumer.consume, num_messages=batch_size, timeout=consumer_timeout
             )
+            self.poll_duration.observe(time.perf_counter() - start_time)
             messages_length = len(messages)
             if messages_length > 0:
                 self.messages_consumed.inc(messages_length)
@@ -220,23 +475,42 @@ class MessageBusConsumer:
                     self.complete_batches_consumed.inc()
             else:
                 self.empty_batches_consumed.inc()
-            messages = [
+            return [
                 message
                 for message in messages
                 if message and not self.__is_error(message)
             ]
-            logger.debug(f"Got {len(messages)} msgs in this batch.")
-            start_time = time.perf_counter()
-            await asyncio.gather(
-                *(self.__handle_valid_message(message) for message in messages)
-            )
-            elapsed_time = time.perf_counter() - start_time
-            logger.debug(f"Deserialized a batch in {elapsed_time:.4f} seconds")
         except KafkaException as e:
             self.__handle_kafka_error(e)
         except RuntimeError as e:
             logger.critical(f"Tried to consume after consumer was closed: {e}")
             sys.exit(1)
+        return []
+
+    async def _process_messages(self, messages: list[Message]):
+        """
+        Handle a batch of valid messages.
+
+        The relevant messages are grouped by schema ID and their schemas are resolved once for the whole batch. The
+        messages are then decoded in a synchronous loop on the event loop, or on the decode pool if enabled. Once the
+        whole batch is processed, the offsets of its messages are stored for the next commit.
+        """
+        logger.debug(f"Got {len(messages)} msgs in this batch.")
+        start_time = time.perf_counter()
+        messages_by_schema_id = self.__group_relevant_messages(messages)
+        schemas = await self.__resolve_schemas(messages_by_schema_id)
+        if self.decode_pool is None:
+            for schema_id, schema in schemas.items():
+                for message in messages_by_schema_id[schema_id]:
+                    self.__process_message(message, schema_id, schema)
+        else:
+            await self.__process_messages_in_pool(messages_by_schema_id, schemas)
+        elapsed_time = time.perf_counter() - start_time
+        self.batch_processing_duration.observe(elapsed_time)
+        self.__observe_message_latency(messages)
+        self.offset_commits.store(messages)
+        self.batch_controller.update(elapsed_time)
+        logger.debug(f"Deserialized a batch in {elapsed_time:.4f} seconds")
 
     def _initialize_consumer(self) -> Consumer:
         """Subscribe to the message bus."""
@@ -248,31 +522,89 @@ class MessageBusConsumer:
         )
         consumer = Consumer(consumer_config)
         topic = message_bus_connection_details.get("topic")
+        self.schema_subject = message_bus_connection_details.get("schema_subject")
         try:
-            consumer.subscribe([topic])
+            consumer.subscribe(
+                [topic],
+                on_assign=self._on_assign,
+                on_revoke=self._on_revoke,
+                on_lost=self._on_lost,
+            )
             logger.debug(f"Subscribed to Kafka topic: {topic}")
             return consumer
         except KafkaException as e:
             self.__handle_kafka_error(e)
             return None
 
+    def _on_assign(self, consumer: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: start storing offsets, and shards if this is a worker, for the assigned partitions."""
+        self.offset_commits.on_assign(consumer, partitions)
+        if self.counter_shards is not None:
+            self.counter_shards.on_assign(consumer, partitions)
+
+    def _on_revoke(self, consumer: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: commit the offsets of revoked partitions, and fold their shards if this is a worker."""
+        self.offset_commits.on_revoke(consumer, partitions)
+        if self.counter_shards is not None:
+            self.counter_shards.on_revoke(consumer, partitions)
+
+    def _on_lost(self, consumer: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: drop the offsets of lost partitions, and fold their shards if this is a worker."""
+        self.offset_commits.on_lost(consumer, partitions)
+        if self.counter_shards is not None:
+            self.counter_shards.on_revoke(consumer, partitions)
+
     async def _fetch_prefixed_fdns(self):
         """
         Query Topology & Inventory for cell information. By default, this will receive 10 cells.
 
         This method:
-        - Fetches cells from the topology API.
+        - Fetches cells from the topology API, every page of them if a topology page size is configured.
         - Extracts `sourceIds` for NRCellDU.
-        - Initializes `fdn_to_pm_counter_status` with `False` for each extracted source ID.
+        - Allocates the per-cell state for those cells.
         """
         logger.debug("Querying Topology & Inventory for cell data.")
-        cells = await get_nr_cell_dus(self.async_client)
-        self.prefixed_fdns = get_sourceids_from_cells(cells)
-        fdn_to_pm_counter_status.update({fdn: False for fdn in self.prefixed_fdns})
+        self.prefixed_fdns = await _get_prefixed_fdns(self.async_client)
+        self._allocate_cell_state()
         logger.debug(
-            f"Topology cell data from Topology API: {fdn_to_pm_counter_status}"
+            f"Topology cell data from Topology API: {len(self.prefixed_fdns)} cells"
         )
 
+    def _allocate_cell_state(self, restored: bool = False):
+        """
+        Allocate the per-cell state for the cells of `cell_ids`.
+
+        This method:
+        - Allocates `counter_presence` with a cleared bit for each cell, and the counter store if it is enabled,
+          unless both were `restored` from a snapshot.
+        - Allocates the ROP windows and duplicate suppression, if they are enabled.
+        - Empties the shards of this consumer worker, if it has any.
+        """
+        if not restored:
+            counter_presence.allocate(self.cell_ids.fdns)
+            if pm_counter_store.enabled:
+                pm_counter_store.allocate(self.cell_ids.fdns)
+        if rop_windows.enabled:
+            rop_windows.allocate(self.cell_ids.fdns)
+        if rop_deduplicator.enabled:
+            rop_deduplicator.allocate(len(self.cell_ids))
+        if self.counter_shards is not None:
+            self.counter_shards.reset()
+
+    async def _prefetch_schemas(self):
+        """
+        Warm the schema cache, so that the first batches consumed do not wait on the schema registry.
+
+        This method:
+        - Loads the schemas cached on disk by a previous run, if a schema cache directory is configured.
+        - Fetches the latest schema of the data job's `dataDeliverySchemaId`, if it declares one.
+        """
+        await schema_cache.load_from_disk()
+        if self.schema_subject:
+            await prefetch_schema(
+                self.config.get("iam_base_url"), self.async_client, self.schema_subject
+            )
+
     def _get_token_consumer_client_callback(self, _):
         """
         Provide the confluent_kafka client access to our HTTPX client's token.
@@ -285,23 +617,23 @@ class MessageBusConsumer:
         expiry_time = time.time() + token["expires_in"] - token_expiry_leeway_seconds
         return access_token, expiry_time
 
-    async def __handle_valid_message(self, message: Message):
+    def __get_relevant_schema_id(self, message: Message) -> Optional[str]:
         """
-        Asynchronously process a valid Kafka message.
-
-        This method will:
-        - Decode header
-        - Extract schema ID
-        - If MO type is relevant, pass the message on for further processing
+        Filter a valid Kafka message by its headers.
 
-        Args:
-            message: A Kafka message object that has been validated.
+        Returns the message's schema ID if its MO type and nodeFDN are relevant, otherwise None.
         """
+        start_time = time.perf_counter()
         parsed_headers = _parse_message_headers(message.headers())
+        start_time = self.__observe_stage("header_parse", start_time)
         mo_type_matched = _is_relevant_motype(parsed_headers)
+        start_time = self.__observe_stage("motype_filter", start_time)
 
         if mo_type_matched:
-            node_fdn_matched = _is_relevant_node_fdn(parsed_headers, self.prefixed_fdns)
+            node_fdn_matched = _is_relevant_node_fdn(
+                parsed_headers, self.node_fdn_index
+            )
+            self.__observe_stage("node_fdn_filter", start_time)
 
             if node_fdn_matched:
                 schema_id = _extract_schema_id(parsed_headers)
@@ -310,38 +642,153 @@ class MessageBusConsumer:
                     logger.warning(
                         "Received a message without a schema ID in its headers"
                     )
-                    return
+                return schema_id
+        return None
+
+    def __group_relevant_messages(
+        self, messages: list[Message]
+    ) -> dict[str, list[Message]]:
+        """Filter a batch of valid Kafka messages by their headers, and group the relevant ones by schema ID."""
+        messages_by_schema_id: dict[str, list[Message]] = {}
+        for message in messages:
+            schema_id = self.__get_relevant_schema_id(message)
+            if schema_id:
+                messages_by_schema_id.setdefault(schema_id, []).append(message)
+        return messages_by_schema_id
+
+    async def __resolve_schemas(
+        self, messages_by_schema_id: dict[str, list[Message]]
+    ) -> dict[str, avro.schema.Schema]:
+        """
+        Look up the schemas of every schema ID in a batch together, so that messages are then decoded without awaiting.
+
+        Returns the schemas which are available. Messages with an unavailable schema are dropped.
+        """
+        if not messages_by_schema_id:
+            return {}
+        start_time = time.perf_counter()
+        schema_ids = list(messages_by_schema_id)
+        resolved_schemas = await asyncio.gather(
+            *(
+                get_schema(self.config.get("iam_base_url"), self.async_client, schema_id)
+                for schema_id in schema_ids
+            )
+        )
+        self.__observe_stage("schema_lookup", start_time)
 
-                self.schema = await get_schema(
-                    self.config.get("iam_base_url"), self.async_client, schema_id
+        schemas = {}
+        for schema_id, schema in zip(schema_ids, resolved_schemas):
+            if schema is None:
+                logger.error(
+                    f"Dropping {len(messages_by_schema_id[schema_id])} messages, schema ID {schema_id} is unavailable"
                 )
+            else:
+                schemas[schema_id] = schema
+        return schemas
 
-                await self.__process_message(message, schema_id)
+    async def __process_messages_in_pool(
+        self,
+        messages_by_schema_id: dict[str, list[Message]],
+        schemas: dict[str, avro.schema.Schema],
+    ):
+        """Decode the relevant messages of a batch in chunks on the decode pool's worker processes."""
+        for schema_id, schema in schemas.items():
+            schema_messages = messages_by_schema_id[schema_id]
+            avro_values = [
+                message.value()[AVRO_MAGIC_BYTE_COUNT:] for message in schema_messages
+            ]
+            start_time = time.perf_counter()
+            decoded_messages = await self.decode_pool.decode(
+                schema_id, schema, avro_values
+            )
+            start_time = self.__observe_stage("decode", start_time)
+            for message, decoded_message in zip(schema_messages, decoded_messages):
+                if decoded_message.error:
+                    logger.error(
+                        f"Avro error for schema ID {schema_id}: {decoded_message.error}"
+                    )
+                    continue
+                cell_id = self.cell_ids.lookup(
+                    decoded_message.dn_prefix, decoded_message.mo_fdn
+                )
+                if _is_duplicate(cell_id, decoded_message.rop_begin_time):
+                    continue
+                _set_counter_status(
+                    decoded_message.has_pm_counters,
+                    cell_id,
+                    self.__counter_presence_for(message),
+                )
+                _record_counter_values(
+                    cell_id,
+                    decoded_message.rop_begin_time,
+                    decoded_message.rop_end_time,
+                    decoded_message.counters,
+                )
+            self.__observe_stage("status_update", start_time)
 
-    async def __process_message(self, message: Message, schema_id: str):
+    def __process_message(
+        self, message: Message, schema_id: str, schema: avro.schema.Schema
+    ):
         """
-        Process a Kafka message end-to-end.
+        Process a Kafka message end-to-end, with the schema resolved for its batch.
 
         This method extracts and processes a message's contents by:
         - Deserializing the message
-        - Retrieving the full prefixed_fdn from a received message
+        - Looking up the ID of the message's cell by its dnPrefix and moFdn
+        - Suppressing the message if it repeats one already handled for the same cell and ROP
         - Storing the latest ROP time
         - Flags any matching prefixed_fdn if PM counters for it were received
+        - Keeps the received counter values, if the counter store or ROP windowing is enabled
         """
+        start_time = time.perf_counter()
         avro_value = message.value()[AVRO_MAGIC_BYTE_COUNT:]
-        deserialized_message = deserialize_message(avro_value, self.schema, schema_id)
-
-        urn_dn_prefix_mo_fdn = (
-            FDN_PREFIX
-            + deserialized_message.get("dnPrefix")
-            + ","
-            + deserialized_message.get("moFdn")
+        deserialized_message = deserialize_message(
+            avro_value, schema, schema_id, self.decoded_fields
         )
-        logger.debug(f"urn_dnPrefix_moFdn from message: {urn_dn_prefix_mo_fdn}")
+        start_time = self.__observe_stage("decode", start_time)
+        if deserialized_message is None:
+            return
 
+        cell_id = self.cell_ids.lookup(
+            deserialized_message.get("dnPrefix"), deserialized_message.get("moFdn")
+        )
+        if _is_duplicate(cell_id, deserialized_message.get("ropBeginTimeInEpoch")):
+            return
+        pm_counters = deserialized_message.get("pmCounters")
         _set_counter_status(
-            deserialized_message, self.prefixed_fdns, urn_dn_prefix_mo_fdn
+            pm_counters is not None,
+            cell_id,
+            self.__counter_presence_for(message),
         )
+        if cell_id is not None and (pm_counter_store.enabled or rop_windows.enabled):
+            _record_counter_values(
+                cell_id,
+                deserialized_message.get("ropBeginTimeInEpoch"),
+                deserialized_message.get("ropEndTimeInEpoch"),
+                extract_counter_values(pm_counters) if pm_counters is not None else None,
+            )
+        self.__observe_stage("status_update", start_time)
+
+    def __observe_stage(self, stage: str, start_time: float) -> float:
+        """Record the time spent in a processing stage which began at `start_time`, and return the current time."""
+        now = time.perf_counter()
+        self.stage_durations[stage].observe(now - start_time)
+        return now
+
+    def __observe_message_latency(self, messages: list[Message]):
+        """Record how long after its Message Bus timestamp each message of a batch finished processing, for the lag collector too."""
+        now_ms = time.time() * 1000
+        for message in messages:
+            timestamp_type, timestamp_ms = message.timestamp()
+            if timestamp_type != TIMESTAMP_NOT_AVAILABLE:
+                self.message_latency.observe(max(now_ms - timestamp_ms, 0) / 1000)
+                self.lag_collector.record_processed(message.partition(), timestamp_ms)
+
+    def __counter_presence_for(self, message: Message) -> CounterPresence:
+        """The presence to record a message's counters in: its partition's shard, if this is one of several workers."""
+        if self.counter_shards is None:
+            return counter_presence
+        return self.counter_shards.shard(message.partition())
 
     def __build_consumer_config(
         self, conn_details: dict[str, str], config: dict[str, str]
@@ -358,6 +805,8 @@ class MessageBusConsumer:
             + str(conn_details["port"]),
             "isolation.level": "read_committed",
             "auto.offset.reset": "latest",
+            "enable.auto.commit": False,
+            "on_commit": on_commit,
             "error_cb": self.__handle_kafka_error,
             "sasl.mechanisms": "OAUTHBEARER",
             "oauth_cb": partial(self._get_token_consumer_client_callback),
@@ -399,8 +848,183 @@ class MessageBusConsumer:
         return False
 
 
+def create_message_bus_consumers(
+    client: OAuth2Client, async_client: AsyncOAuth2Client
+) -> list[MessageBusConsumer]:
+    """
+    Create the message bus consumers for this instance.
+
+    With `consumer_workers` above one, each worker has its own Kafka consumer in the same consumer group and records
+    counters in its own per-partition shards, so the topic's partitions are spread over the workers.
+
+    With `replay_file` set, a single consumer replays the recorded messages of that file instead of consuming from the
+    Message Bus. Only the Message Bus is replaced: the cells and schemas are still fetched with the OAuth clients.
+    """
+    config = get_config()
+    if config.get("replay_file"):
+        replay_consumer = ReplayConsumer.from_file(
+            config.get("replay_file"),
+            float(config.get("replay_rate")),
+            int(config.get("replay_passes")),
+        )
+        return [MessageBusConsumer(client, async_client, replay_consumer)]
+    consumer_workers = int(config.get("consumer_workers"))
+    if consumer_workers <= 1:
+        return [MessageBusConsumer(client, async_client)]
+    logger.info(f"Starting {consumer_workers} message bus consumer workers")
+    return [
+        MessageBusConsumer(
+            client,
+            async_client,
+            counter_shards=CounterStatusShards(counter_presence),
+        )
+        for _ in range(consumer_workers)
+    ]
+
+
 async def start_message_bus_consumer(
     message_bus_consumer: MessageBusConsumer,
 ) -> asyncio.Task:
     """Starts the message bus consumer task."""
     return asyncio.create_task(message_bus_consumer.collect_counters())
+
+
+async def start_message_bus_consumers(
+    message_bus_consumers: list[MessageBusConsumer],
+) -> list[asyncio.Task]:
+    """
+    Starts a task for each message bus consumer, querying Topology & Inventory and warming the schema cache once for all of them.
+
+    If the consumer state is restored from a snapshot, the consumers start straight away with the cells of the snapshot,
+    and an extra task revalidates those cells against Topology & Inventory.
+    """
+    tasks = []
+    topology_sync_interval = float(get_config().get("topology_sync_interval"))
+    if topology_sync_interval > 0:
+        tasks.append(
+            asyncio.create_task(
+                sync_prefixed_fdns(message_bus_consumers, topology_sync_interval)
+            )
+        )
+    cell_fdns = consumer_snapshot.restore(counter_presence, pm_counter_store)
+    if cell_fdns:
+        for message_bus_consumer in message_bus_consumers:
+            message_bus_consumer.prefixed_fdns = cell_fdns
+            # pylint: disable=protected-access
+            message_bus_consumer._allocate_cell_state(restored=True)
+        await schema_cache.load_from_disk()
+        tasks.append(
+            asyncio.create_task(revalidate_prefixed_fdns(message_bus_consumers))
+        )
+    elif len(message_bus_consumers) > 1:
+        # pylint: disable=protected-access
+        await message_bus_consumers[0]._fetch_prefixed_fdns()
+        await message_bus_consumers[0]._prefetch_schemas()
+        for message_bus_consumer in message_bus_consumers[1:]:
+            message_bus_consumer.prefixed_fdns = message_bus_consumers[0].prefixed_fdns
+    return [
+        await start_message_bus_consumer(message_bus_consumer)
+        for message_bus_consumer in message_bus_consumers
+    ] + tasks
+
+
+async def revalidate_prefixed_fdns(message_bus_consumers: list[MessageBusConsumer]):
+    """
+    Query Topology & Inventory for the cells restored from a snapshot, then warm the schema cache.
+
+    If the cells changed since the snapshot was taken, the consumers switch to the new cells, and the restored state is
+    discarded as its cell IDs no longer apply.
+    """
+    # pylint: disable=protected-access
+    try:
+        prefixed_fdns = await _get_prefixed_fdns(message_bus_consumers[0].async_client)
+    except HTTPError as e:
+        logger.warning(
+            f"Unable to revalidate the cells restored from the snapshot, carrying on with them: {e}"
+        )
+        return
+    if CellIdTable(prefixed_fdns).fdns == message_bus_consumers[0].cell_ids.fdns:
+        logger.info("Topology & Inventory confirmed the cells restored from the snapshot")
+    else:
+        logger.warning(
+            "The cells in Topology & Inventory changed since the snapshot was taken, discarding the restored state"
+        )
+        for message_bus_consumer in message_bus_consumers:
+            message_bus_consumer.prefixed_fdns = prefixed_fdns
+            message_bus_consumer._allocate_cell_state()
+    await message_bus_consumers[0]._prefetch_schemas()
+
+
+async def sync_prefixed_fdns(
+    message_bus_consumers: list[MessageBusConsumer], interval: float
+):
+    """Reconcile the cells of the consumers with Topology & Inventory every `interval` seconds, until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_prefixed_fdns(message_bus_consumers)
+        except HTTPError as e:
+            logger.warning(
+                f"Unable to reconcile the cells with Topology & Inventory, carrying on with them: {e}"
+            )
+
+
+async def reconcile_prefixed_fdns(
+    message_bus_consumers: list[MessageBusConsumer],
+) -> Optional[CellDelta]:
+    """
+    Bring the cells of the consumers up to date with Topology & Inventory, keeping the state of every cell which remains.
+
+    The cells are compared, and the lookup structures for the new cells built, in a thread. The consumers then switch
+    to the new cells in one step on the event loop, together with `counter_presence`, the counter store, the ROP windows
+    and duplicate suppression, so no message is processed against part of the new state. Consumption carries on
+    throughout. Returns the change, or None if the cells did not change.
+
+    Raises:
+        HTTPError: If the cells cannot be fetched from Topology & Inventory.
+    """
+    start_time = time.perf_counter()
+    cell_ids = message_bus_consumers[0].cell_ids
+    if not message_bus_consumers[0].prefixed_fdns:
+        # The consumers have not fetched their cells yet.
+        return None
+    prefixed_fdns = await _get_prefixed_fdns(message_bus_consumers[0].async_client)
+    delta = await asyncio.to_thread(diff_cells, cell_ids.fdns, prefixed_fdns)
+    if delta is not None and message_bus_consumers[0].cell_ids is cell_ids:
+        _swap_cells(message_bus_consumers, delta)
+        metrics_registry.counters.get("topology_cells_added").inc(delta.added)
+        metrics_registry.counters.get("topology_cells_removed").inc(delta.removed)
+        logger.info(
+            f"Reconciled the cells with Topology & Inventory: {delta.added} added, {delta.removed} removed, "
+            f"now {len(delta.cell_ids)} cells"
+        )
+    else:
+        delta = None
+    metrics_registry.histograms.get("topology_reconcile_duration_seconds").observe(
+        time.perf_counter() - start_time
+    )
+    return delta
+
+
+def _swap_cells(message_bus_consumers: list[MessageBusConsumer], delta: CellDelta):
+    """Switch the consumers and the per-cell state to the cells of `delta`. Must not await, so that it is atomic."""
+    cell_fdns = delta.cell_ids.fdns
+    reindex_counter_presence(
+        counter_presence,
+        (
+            message_bus_consumer.counter_shards
+            for message_bus_consumer in message_bus_consumers
+            if message_bus_consumer.counter_shards is not None
+        ),
+        cell_fdns,
+        delta.old_ids,
+    )
+    if pm_counter_store.enabled:
+        pm_counter_store.reindex(cell_fdns, delta.old_ids)
+    if rop_windows.enabled:
+        rop_windows.reindex(cell_fdns, delta.old_ids)
+    if rop_deduplicator.enabled:
+        rop_deduplicator.reindex(delta.old_ids)
+    for message_bus_consumer in message_bus_consumers:
+        # pylint: disable=protected-access
+        message_bus_consumer._use_cells(delta.cell_ids, delta.node_fdn_index)
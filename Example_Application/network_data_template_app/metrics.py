@@ -1,10 +1,12 @@
 """
-This module provides a Prometheus Metrics Registry with counters.
+This module provides a Prometheus Metrics Registry with counters, gauges and histograms.
 """
 
 from prometheus_client import (
     CollectorRegistry,
     Counter,
+    Gauge,
+    Histogram,
     disable_created_metrics,
     generate_latest,
 )
@@ -12,6 +14,19 @@ from .config import get_config
 from .mtls_logging import logger
 
 SERVICE_PREFIX = get_config()["container_name"].replace("-", "_")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Per-message stages take microseconds to milliseconds.
+STAGE_LATENCY_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0)
+# PM messages are produced once per ROP, so they can be minutes old before they are consumed.
+MESSAGE_AGE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 900.0, 1800.0, 3600.0)
+CONSUMER_STAGES = (
+    "header_parse",
+    "motype_filter",
+    "node_fdn_filter",
+    "schema_lookup",
+    "decode",
+    "status_update",
+)
 
 
 def _create_metrics() -> dict[str, Counter]:
@@ -76,6 +91,246 @@ def _create_metrics() -> dict[str, Counter]:
             name="schema_registry_failed_requests",
             documentation="Total number of failed requests made to Schema Registry",
         ),
+        "schema_cache_hits": Counter(
+            namespace=SERVICE_PREFIX,
+            name="schema_cache_hits",
+            documentation="Total number of schema lookups answered from the schema cache",
+        ),
+        "schema_cache_misses": Counter(
+            namespace=SERVICE_PREFIX,
+            name="schema_cache_misses",
+            documentation="Total number of schema lookups not answered from the schema cache",
+        ),
+        "decode_pool_restarts": Counter(
+            namespace=SERVICE_PREFIX,
+            name="decode_pool_restarts",
+            documentation="Total number of times the decode process pool was recreated after a worker process died",
+        ),
+        "topology_cache_hits": Counter(
+            namespace=SERVICE_PREFIX,
+            name="topology_cache_hits",
+            documentation="Total number of topology lookups answered from the topology cache, including stale answers",
+        ),
+        "topology_cache_misses": Counter(
+            namespace=SERVICE_PREFIX,
+            name="topology_cache_misses",
+            documentation="Total number of topology lookups which waited for Topology & Inventory",
+        ),
+        "topology_cache_refresh_failures": Counter(
+            namespace=SERVICE_PREFIX,
+            name="topology_cache_refresh_failures",
+            documentation="Total number of refreshes of the topology cache which failed",
+        ),
+        "topology_cells_added": Counter(
+            namespace=SERVICE_PREFIX,
+            name="topology_cells_added",
+            documentation="Total number of cells added to the consumer by topology reconciliation",
+        ),
+        "topology_cells_removed": Counter(
+            namespace=SERVICE_PREFIX,
+            name="topology_cells_removed",
+            documentation="Total number of cells removed from the consumer by topology reconciliation",
+        ),
+        "pm_counter_store_dropped_messages": Counter(
+            namespace=SERVICE_PREFIX,
+            name="pm_counter_store_dropped_messages",
+            documentation="Total number of messages whose counter values were not stored, as their ROP is older than every ROP held",
+        ),
+        "consumer_offset_commits": Counter(
+            namespace=SERVICE_PREFIX,
+            name="consumer_offset_commits",
+            documentation="Total number of commits of the offsets of processed messages",
+        ),
+        "consumer_offset_commit_failures": Counter(
+            namespace=SERVICE_PREFIX,
+            name="consumer_offset_commit_failures",
+            documentation="Total number of commits of the offsets of processed messages which failed",
+        ),
+        "duplicate_messages_suppressed": Counter(
+            namespace=SERVICE_PREFIX,
+            name="duplicate_messages_suppressed",
+            documentation="Total number of PM messages suppressed because their cell was already seen for their ROP",
+        ),
+        "rop_window_late_messages": Counter(
+            namespace=SERVICE_PREFIX,
+            name="rop_window_late_messages",
+            documentation="Total number of messages dropped from ROP windowing, as the window of their ROP had already closed",
+        ),
+        "rop_windows_closed_complete": Counter(
+            namespace=SERVICE_PREFIX,
+            name="rop_windows_closed_complete",
+            documentation="Total number of ROP windows closed because every cell reported",
+        ),
+        "rop_windows_closed_incomplete": Counter(
+            namespace=SERVICE_PREFIX,
+            name="rop_windows_closed_incomplete",
+            documentation="Total number of ROP windows closed with cells missing, as the watermark passed them or too many windows were open",
+        ),
+        "upstream_circuit_rejected_requests": Counter(
+            namespace=SERVICE_PREFIX,
+            name="upstream_circuit_rejected_requests",
+            documentation="Total number of requests to platform services not made, as the service's circuit breaker was open",
+        ),
+        "upstream_retry_budget_exhausted": Counter(
+            namespace=SERVICE_PREFIX,
+            name="upstream_retry_budget_exhausted",
+            documentation="Total number of failed requests to platform services not retried, as the service's retry budget was spent",
+        ),
+        "upstream_deadline_exceeded": Counter(
+            namespace=SERVICE_PREFIX,
+            name="upstream_deadline_exceeded",
+            documentation="Total number of requests to platform services given up on, as their deadline was reached",
+        ),
+    }
+
+
+def _create_gauges() -> dict[str, Gauge]:
+    return {
+        "decode_pool_queue_depth": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="decode_pool_queue_depth",
+            documentation="Number of message chunks submitted to the decode process pool and not yet decoded",
+        ),
+        "consumer_pipeline_queue_depth": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_pipeline_queue_depth",
+            documentation="Number of fetched batches waiting to be processed by the pipelined consumer",
+        ),
+        "consumer_batch_size": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_batch_size",
+            documentation="Maximum number of messages the consumer currently fetches in one batch",
+        ),
+        "consumer_timeout_seconds": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_timeout_seconds",
+            documentation="Seconds the consumer currently waits for a batch to fill",
+        ),
+        "consumer_partition_lag": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_partition_lag",
+            documentation="Messages between the committed offset and the high watermark of an assigned partition",
+            labelnames=("topic", "partition"),
+        ),
+        "consumer_partition_consumption_rate": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_partition_consumption_rate",
+            documentation="Messages per second committed on an assigned partition since the previous lag collection",
+            labelnames=("topic", "partition"),
+        ),
+        "consumer_partition_oldest_unprocessed_message_age_seconds": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_partition_oldest_unprocessed_message_age_seconds",
+            documentation=(
+                "Upper bound on the age of the oldest unprocessed message of an assigned partition, "
+                "or 0 if the partition has no lag"
+            ),
+            labelnames=("topic", "partition"),
+        ),
+        "pm_counter_store_size_bytes": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="pm_counter_store_size_bytes",
+            documentation="Bytes allocated to store PM counter values",
+        ),
+        "consumer_snapshot_size_bytes": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="consumer_snapshot_size_bytes",
+            documentation="Bytes written to the latest snapshot of the consumer state",
+        ),
+        "rop_window_open_windows": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="rop_window_open_windows",
+            documentation="Number of ROP windows waiting for cells to report",
+        ),
+        "upstream_circuit_state": Gauge(
+            namespace=SERVICE_PREFIX,
+            name="upstream_circuit_state",
+            documentation="State of the circuit breaker of a platform service: 0 closed, 1 half-open, 2 open",
+            labelnames=("upstream",),
+        ),
+    }
+
+
+def _create_histograms() -> dict[str, Histogram]:
+    return {
+        "decode_pool_chunk_latency_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="decode_pool_chunk_latency_seconds",
+            documentation="Seconds taken to decode one chunk of messages in the decode process pool, including queueing",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "consumer_poll_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_poll_duration_seconds",
+            documentation="Seconds spent fetching a batch from the Message Bus",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "consumer_batch_wait_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_batch_wait_duration_seconds",
+            documentation="Seconds the pipelined consumer waited for a fetched batch to process",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "consumer_backpressure_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_backpressure_duration_seconds",
+            documentation="Seconds the pipelined consumer waited for room to queue a fetched batch",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "consumer_batch_processing_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_batch_processing_duration_seconds",
+            documentation="Seconds spent processing a batch of messages",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "consumer_batch_end_to_end_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_batch_end_to_end_duration_seconds",
+            documentation="Seconds from starting to fetch a batch until it has been processed, including any queueing",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "consumer_stage_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_stage_duration_seconds",
+            documentation=(
+                "Seconds spent in one stage of processing a message. The schema_lookup stage is timed once per "
+                "batch, and on the decode pool the decode and status_update stages are timed once for all "
+                "messages of a schema in a batch"
+            ),
+            labelnames=("stage",),
+            buckets=STAGE_LATENCY_BUCKETS,
+        ),
+        "consumer_message_latency_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_message_latency_seconds",
+            documentation="Seconds from a message's Message Bus timestamp until the consumer finished processing it",
+            buckets=MESSAGE_AGE_BUCKETS,
+        ),
+        "consumer_snapshot_write_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="consumer_snapshot_write_duration_seconds",
+            documentation="Seconds taken to capture the consumer state and write it to a snapshot",
+            buckets=LATENCY_BUCKETS,
+        ),
+        "rop_window_close_delay_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="rop_window_close_delay_seconds",
+            documentation="Seconds from the end of a ROP until its window closed",
+            buckets=MESSAGE_AGE_BUCKETS,
+        ),
+        "upstream_retry_delay_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="upstream_retry_delay_seconds",
+            documentation="Seconds waited before retrying a failed request to a platform service",
+            labelnames=("upstream",),
+            buckets=LATENCY_BUCKETS,
+        ),
+        "topology_reconcile_duration_seconds": Histogram(
+            namespace=SERVICE_PREFIX,
+            name="topology_reconcile_duration_seconds",
+            documentation="Seconds taken to reconcile the consumer's cells with Topology & Inventory",
+            buckets=LATENCY_BUCKETS,
+        ),
     }
 
 
@@ -88,19 +343,30 @@ class MetricsRegistry(CollectorRegistry):
         super().__init__()
         disable_created_metrics()
         self.counters = _create_metrics()
-        self._register_counters()
+        self.gauges = _create_gauges()
+        self.histograms = _create_histograms()
+        self._register_metrics()
+
+    def _collectors(self) -> list[Counter | Gauge | Histogram]:
+        return [
+            *self.counters.values(),
+            *self.gauges.values(),
+            *self.histograms.values(),
+        ]
 
-    def _register_counters(self) -> None:
-        for counter in self.counters.values():
-            self.register(counter)
+    def _register_metrics(self) -> None:
+        for collector in self._collectors():
+            self.register(collector)
         logger.debug(
             f"Created metrics registry in format:\n{generate_latest(self).decode('utf-8')}"
         )
 
-    def _unregister_counters(self) -> None:
-        for counter in self.counters.values():
-            self.unregister(counter)
+    def _unregister_metrics(self) -> None:
+        for collector in self._collectors():
+            self.unregister(collector)
         self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
 
 
 metrics_registry = MetricsRegistry()
@@ -23,11 +23,12 @@ from urllib.parse import urlencode, unquote
 from authlib.integrations.httpx_client import AsyncOAuth2Client
 from eiid_access_id import network_configuration_url_helper
 from eiid_access_id.network_configuration_url_helper import DataStoreType
-from httpx import HTTPStatusError
+from httpx import HTTPStatusError, RequestError, Response
 
 from .config import get_config
 from .mtls_logging import logger
 from .metrics import metrics_registry
+from .retry_policy import retry_policies
 
 
 async def get_attributes_for_source_ids(
@@ -102,6 +103,9 @@ async def get_attribute_for_source_id(
         logger.error(
             f"Failed to get '{attribute}' for '{source_id}': {e.response.status_code} {e.response.text}"
         )
+    except RequestError as e:
+        metrics_registry.counters.get("network_configuration_failed_requests").inc()
+        logger.error(f"Failed to get '{attribute}' for '{source_id}': {e}")
     finally:
         response = {"id": source_id, attribute: current_attribute}
     return response
@@ -131,11 +135,15 @@ async def read_attribute_through_network_configuration(
     # URL encode the parameters
     encoded_params = urlencode(params, safe="[]()")
 
-    # Perform the GET request to fetch the attribute
-    response = await client.request("GET", url=url, params=encoded_params, timeout=5000)
+    async def request() -> Response:
+        # Perform the GET request to fetch the attribute
+        response = await client.request("GET", url=url, params=encoded_params, timeout=5000)
+
+        # Raise an exception for bad responses
+        response.raise_for_status()
+        return response
 
-    # Raise an exception for bad responses
-    response.raise_for_status()
+    response = await retry_policies["network_configuration"].call(request)
 
     if response.is_success:
         # Extract the attribute value from the response JSON
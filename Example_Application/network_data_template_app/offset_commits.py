@@ -0,0 +1,129 @@
+"""
+This module commits the offsets of the message bus consumer only for messages which have been processed.
+
+Auto-commit is disabled in the consumer config, as librdkafka would otherwise commit the offsets of messages as soon as
+they are consumed, before their batch is processed, and a crash would lose them. Instead, the next offset of each
+partition is stored once a batch has been processed, and the stored offsets are committed asynchronously every
+`commit_batches` batches or `commit_interval` seconds, whichever comes first. Delivery is at least once: after a crash,
+the messages processed since the last commit are consumed again.
+
+On a rebalance, the stored offsets of revoked partitions are committed synchronously before another member takes them
+over, and those of lost partitions, which another member may already own, are dropped. Offsets of messages from either
+that are processed afterwards are not stored, so a later commit never moves another member's position.
+"""
+
+import threading
+import time
+
+from confluent_kafka import Consumer, KafkaError, KafkaException, Message, TopicPartition
+
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+
+class OffsetCommitManager:
+    """
+    Store and periodically commit the offsets of processed messages for a consumer.
+
+    Attributes:
+        consumer: The confluent_kafka consumer whose offsets are committed.
+        commit_batches: Number of processed batches after which the stored offsets are committed.
+        commit_interval: Seconds after which the stored offsets are committed, even if fewer batches were processed.
+        commits: Metric: Number of offset commits requested
+        commit_failures: Metric: Number of offset commits which failed
+    """
+
+    def __init__(self, consumer: Consumer, commit_batches: int, commit_interval: float):
+        self.consumer = consumer
+        self.commit_batches = max(commit_batches, 1)
+        self.commit_interval = commit_interval
+        self._offsets: dict[tuple[str, int], int] = {}
+        # Rebalance callbacks run in the thread polling the consumer, while offsets are stored on the event loop.
+        self._lock = threading.Lock()
+        self._revoked: set[tuple[str, int]] = set()
+        self._batches = 0
+        self._last_commit = time.monotonic()
+        self.commits = metrics_registry.counters.get("consumer_offset_commits")
+        self.commit_failures = metrics_registry.counters.get(
+            "consumer_offset_commit_failures"
+        )
+
+    def store(self, messages: list[Message]):
+        """
+        Store the next offset of each partition of a processed batch, and commit if a commit is due.
+
+        Messages are consumed in offset order within a partition, so the last message of each partition is the latest.
+        """
+        with self._lock:
+            for message in messages:
+                key = (message.topic(), message.partition())
+                if key not in self._revoked:
+                    self._offsets[key] = message.offset() + 1
+        self._batches += 1
+        if (
+            self._batches >= self.commit_batches
+            or time.monotonic() - self._last_commit >= self.commit_interval > 0
+        ):
+            self.commit(asynchronous=True)
+
+    def commit(self, asynchronous: bool = True):
+        """
+        Commit the stored offsets, if any were stored since the last commit.
+
+        The results of asynchronous commits are reported to `on_commit`, which the consumer config registers.
+        """
+        self._batches = 0
+        self._last_commit = time.monotonic()
+        with self._lock:
+            offsets, self._offsets = self._offsets, {}
+        self.__commit(offsets, asynchronous)
+
+    def on_assign(self, _: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: store offsets again for partitions assigned to this consumer."""
+        with self._lock:
+            self._revoked.difference_update(
+                (partition.topic, partition.partition) for partition in partitions
+            )
+
+    def on_revoke(self, _: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: commit the offsets stored for revoked partitions synchronously, while still owned."""
+        revoked = {(partition.topic, partition.partition) for partition in partitions}
+        with self._lock:
+            self._revoked |= revoked
+            offsets = {key: self._offsets.pop(key) for key in revoked if key in self._offsets}
+        self.__commit(offsets, asynchronous=False)
+
+    def on_lost(self, _: Consumer, partitions: list[TopicPartition]):
+        """Rebalance callback: drop the stored offsets of lost partitions, as another member may already own them."""
+        lost = {(partition.topic, partition.partition) for partition in partitions}
+        with self._lock:
+            self._revoked |= lost
+            for key in lost:
+                self._offsets.pop(key, None)
+        logger.warning(f"Lost {len(lost)} partitions, dropping the offsets stored for them")
+
+    def __commit(self, stored: dict[tuple[str, int], int], asynchronous: bool):
+        if not stored:
+            return
+        offsets = [
+            TopicPartition(topic, partition, offset)
+            for (topic, partition), offset in stored.items()
+        ]
+        self.commits.inc()
+        try:
+            self.consumer.commit(offsets=offsets, asynchronous=asynchronous)
+        except KafkaException as e:
+            self.commit_failures.inc()
+            logger.warning(f"Unable to commit the offsets of processed messages: {e}")
+
+
+def on_commit(err: KafkaError, partitions: list[TopicPartition]):
+    """Consumer callback for the result of an offset commit, which counts and logs failures."""
+    failed = [partition for partition in partitions if partition.error is not None]
+    if err is None and not failed:
+        logger.debug(f"Committed the offsets of {len(partitions)} partitions")
+        return
+    metrics_registry.counters.get("consumer_offset_commit_failures").inc()
+    logger.warning(
+        f"Unable to commit the offsets of processed messages: {err or failed[0].error}"
+    )
@@ -0,0 +1,330 @@
+"""
+This module generates synthetic PM messages for a list of cells, from the Avro schema of the PM counters, to load-test
+the consumer at production scale.
+
+Each message is a Kafka-style message, with the headers the consumer filters on and a value made of the magic byte,
+the schema ID and the Avro encoding of one cell's PM counters for one ROP. Every counter is populated with a random
+value. Messages are deterministic for a given seed.
+
+Encoding every message with the Avro library would take milliseconds, so the encoding is assembled from pieces instead.
+An Avro record is the concatenation of the encodings of its fields, so each field is encoded on its own:
+- Fields describing the cell or the ROP are encoded once for each value, and reused.
+- The PM counters are split into groups of `counters_per_variant` consecutive counters, and each group is encoded
+  `variants` times with random values. Each message picks one of those variants for every group, so that a message is
+  joined from a few dozen pieces rather than one per counter, while its counter values still vary from message to
+  message.
+
+The module can also be run as a tool, writing generated messages to a recording for `ReplayConsumer`:
+
+    python -m network_data_template_app.pm_generator --schema tests/schema_registry_response.json \\
+        --cell-count 100000 --rops 4 --output recording.jsonl
+"""
+
+import argparse
+import io
+import json
+import struct
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+import avro.io
+import avro.schema
+import numpy as np
+
+from .fdn_index import RDN_SEPARATOR, split_cell_fdn
+from .replay_consumer import RecordedMessage, write_recording
+from .topology_and_inventory import get_sourceids_from_cells
+
+ROP_MS = 15 * 60 * 1000
+AVRO_MAGIC_BYTE = b"\x00"
+DEFAULT_SUBNETWORK = "SubNetwork=Europe,SubNetwork=Ireland"
+ROP_FIELDS = ("ropBeginTime", "ropEndTime", "ropBeginTimeInEpoch", "ropEndTimeInEpoch", "suspect")
+
+
+def synthetic_cell_fdns(count: int, cells_per_node: int = 3) -> list[str]:
+    """FDNs for `count` cells, named like the cells of the test topology, with `cells_per_node` cells on each node."""
+    fdns = []
+    for index in range(count):
+        node, cell = divmod(index, cells_per_node)
+        name = f"NR01gNodeBRadio{node + 1:05d}"
+        fdns.append(
+            f"urn:3gpp:dn:{DEFAULT_SUBNETWORK},MeContext={name},ManagedElement={name},"
+            f"GNBDUFunction=1,NRCellDU={name}-{cell + 1}"
+        )
+    return fdns
+
+
+def load_schema(path: str) -> avro.schema.RecordSchema:
+    """Read an Avro schema from a `.avsc` file, or from a saved Schema Registry response holding it under `schema`."""
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    if isinstance(document, dict) and isinstance(document.get("schema"), str):
+        document = json.loads(document["schema"])
+    return avro.schema.parse(json.dumps(document))
+
+
+def read_cell_fdns(path: str) -> list[str]:
+    """The cell FDNs of a saved Topology & Inventory response, or of a JSON list of FDNs."""
+    with open(path, "r", encoding="utf-8") as f:
+        document = json.load(f)
+    if isinstance(document, dict):
+        document = document.get("items", [])
+    if all(isinstance(cell, str) for cell in document):
+        return document
+    return get_sourceids_from_cells(document)
+
+
+def _encode(schema: avro.schema.Schema, datum: object) -> bytes:
+    """The Avro binary encoding of a datum. Strings, such as the FDNs of every cell, are encoded without the library."""
+    if isinstance(datum, str):
+        if schema.type == "string":
+            encoded = datum.encode("utf-8")
+            return _zigzag(len(encoded)) + encoded
+        if isinstance(schema, avro.schema.UnionSchema):
+            for index, branch in enumerate(schema.schemas):
+                if branch.type == "string":
+                    return _zigzag(index) + _encode(branch, datum)
+    buffer = io.BytesIO()
+    avro.io.DatumWriter(schema).write(datum, avro.io.BinaryEncoder(buffer))
+    return buffer.getvalue()
+
+
+def _zigzag(value: int) -> bytes:
+    """The Avro encoding of a long: zig-zag, then a variable-length integer."""
+    value = (value << 1) ^ (value >> 63)
+    encoded = bytearray()
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+# pylint: disable=too-many-instance-attributes
+class PmMessageGenerator:
+    """
+    Generate PM messages for a list of cells, one message per cell and ROP.
+
+    Attributes:
+        schema: The Avro record schema of a PM message.
+        schema_id: The Schema Registry ID of `schema`, carried in the headers and value of each message.
+        cell_fdns: The FDN of each cell, which messages are generated for in order.
+        mo_type: The `moType` header of each message.
+        element_type: The `elementType` of each message.
+        partitions: Number of partitions the messages are spread over, by cell.
+        variants: Number of random encodings of each group of counters.
+        counters_per_variant: Number of consecutive counters encoded together in each variant.
+        max_counter_value: Counter values are drawn uniformly from zero up to this value.
+        max_array_length: Counters holding an array of values hold between one and this many values.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        schema: avro.schema.RecordSchema,
+        schema_id: str,
+        cell_fdns: list[str],
+        seed: int = 0,
+        mo_type: Optional[str] = None,
+        element_type: str = "RadioNode",
+        partitions: int = 1,
+        variants: int = 64,
+        counters_per_variant: int = 8,
+        max_counter_value: int = 1000,
+        max_array_length: int = 20,
+    ):
+        self.schema = schema
+        self.schema_id = schema_id
+        self.cell_fdns = list(cell_fdns)
+        self.mo_type = mo_type or schema.name.rsplit("_", 1)[0]
+        self.element_type = element_type
+        self.partitions = max(partitions, 1)
+        self.variants = max(variants, 1)
+        self.counters_per_variant = max(counters_per_variant, 1)
+        self.max_counter_value = max_counter_value
+        self.max_array_length = max(max_array_length, 1)
+        self._rng = np.random.default_rng(seed)
+        self._offsets = [0] * self.partitions
+        self._prefix = AVRO_MAGIC_BYTE + struct.pack(">I", int(schema_id))
+        self._encoded: dict[tuple[str, object], bytes] = {}
+        # For each top-level field: its name, and the variants of each group of its fields if it is a record of counters.
+        self._fields: list[tuple[str, Optional[list[list[bytes]]]]] = []
+        for field in schema.fields:
+            variants = None
+            if isinstance(field.type, avro.schema.RecordSchema):
+                counters = field.type.fields
+                variants = [
+                    self.__variants(counters[start : start + self.counters_per_variant])
+                    for start in range(0, len(counters), self.counters_per_variant)
+                ]
+            self._fields.append((field.name, variants))
+        self._cells = [self.__cell(prefixed_fdn) for prefixed_fdn in self.cell_fdns]
+
+    def generate_rop(self, rop_begin_time: int) -> Iterator[RecordedMessage]:
+        """Generate the message of every cell for the ROP beginning at `rop_begin_time`, in epoch milliseconds."""
+        rop_values = {
+            "ropBeginTime": _iso_time(rop_begin_time),
+            "ropEndTime": _iso_time(rop_begin_time + ROP_MS),
+            "ropBeginTimeInEpoch": rop_begin_time,
+            "ropEndTimeInEpoch": rop_begin_time + ROP_MS,
+            "suspect": False,
+        }
+        # The variants of every cell are drawn at once, which is far quicker than drawing them for each message.
+        picks = {
+            name: self._rng.integers(0, self.variants, (len(self._cells), len(variants))).tolist()
+            for name, variants in self._fields
+            if variants is not None
+        }
+        encoded_rop = {
+            name: self.__encoded(name, rop_values[name])
+            for name, variants in self._fields
+            if variants is None and name in rop_values
+        }
+        for cell_id, (encoded_cell, headers) in enumerate(self._cells):
+            pieces = [self._prefix]
+            for name, variants in self._fields:
+                if variants is not None:
+                    pieces += map(list.__getitem__, variants, picks[name][cell_id])
+                elif name in encoded_rop:
+                    pieces.append(encoded_rop[name])
+                else:
+                    pieces.append(encoded_cell[name])
+            partition = cell_id % self.partitions
+            offset = self._offsets[partition]
+            self._offsets[partition] += 1
+            yield RecordedMessage(
+                "pm", partition, offset, rop_begin_time + ROP_MS, headers, b"".join(pieces)
+            )
+
+    def generate(self, first_rop_begin_time: int, rops: int = 1) -> Iterator[RecordedMessage]:
+        """Generate the messages of every cell for `rops` consecutive ROPs."""
+        for rop in range(rops):
+            yield from self.generate_rop(first_rop_begin_time + rop * ROP_MS)
+
+    def __cell(self, prefixed_fdn: str) -> tuple[dict[str, bytes], list[tuple[str, bytes]]]:
+        """The encoded fields which are not about the ROP, and the headers, of the messages of a cell."""
+        dn_prefix, mo_fdn = split_cell_fdn(prefixed_fdn)
+        managed_element = mo_fdn.split(RDN_SEPARATOR, 1)[0]
+        node_fdn = f"{dn_prefix}{RDN_SEPARATOR}{managed_element}" if dn_prefix else managed_element
+        values = {
+            "nodeFDN": node_fdn,
+            "elementType": self.element_type,
+            "dnPrefix": dn_prefix or None,
+            "moFdn": mo_fdn,
+        }
+        headers = [
+            ("schemaSubject", self.schema.fullname.encode("utf-8")),
+            ("schemaID", str(self.schema_id).encode("utf-8")),
+            ("moType", self.mo_type.encode("utf-8")),
+            ("nodeFDN", node_fdn.encode("utf-8")),
+            ("elementType", self.element_type.encode("utf-8")),
+        ]
+        encoded = {
+            name: self.__encode_field(name, values.get(name))
+            for name, variants in self._fields
+            if variants is None and name not in ROP_FIELDS
+        }
+        return encoded, headers
+
+    def __encoded(self, name: str, value: object) -> bytes:
+        """The encoding of a top-level field's value, which is encoded once and then reused."""
+        key = (name, value)
+        encoded = self._encoded.get(key)
+        if encoded is None:
+            encoded = self._encoded[key] = self.__encode_field(name, value)
+        return encoded
+
+    def __encode_field(self, name: str, value: object) -> bytes:
+        """The encoding of a top-level field's value. A field with no value which cannot be null takes a random one."""
+        field_schema = self.schema.fields_dict[name].type
+        if value is None and not _accepts_null(field_schema):
+            value = self.__random_datum(field_schema)
+        return _encode(field_schema, value)
+
+    def __variants(self, fields: list[avro.schema.Field]) -> list[bytes]:
+        """`variants` encodings of a group of consecutive fields with random values."""
+        return [
+            b"".join(
+                _encode(field.type, self.__random_datum(field.type, field)) for field in fields
+            )
+            for _ in range(self.variants)
+        ]
+
+    def __random_datum(
+        self, schema: avro.schema.Schema, field: Optional[avro.schema.Field] = None
+    ) -> object:
+        """A random value for a schema. Strings take their field's default, and booleans are true."""
+        if isinstance(schema, avro.schema.UnionSchema):
+            branch = next(
+                (branch for branch in schema.schemas if branch.type != "null"), schema.schemas[0]
+            )
+            return self.__random_datum(branch, field)
+        if isinstance(schema, avro.schema.RecordSchema):
+            return {
+                subfield.name: self.__random_datum(subfield.type, subfield)
+                for subfield in schema.fields
+            }
+        if isinstance(schema, avro.schema.ArraySchema):
+            length = int(self._rng.integers(1, self.max_array_length + 1))
+            return [self.__random_datum(schema.items) for _ in range(length)]
+        if isinstance(schema, avro.schema.MapSchema):
+            return {}
+        if isinstance(schema, avro.schema.EnumSchema):
+            return schema.symbols[0]
+        if isinstance(schema, avro.schema.FixedSchema):
+            return bytes(schema.size)
+        if schema.type in ("int", "long"):
+            return int(self._rng.integers(0, self.max_counter_value + 1))
+        if schema.type in ("float", "double"):
+            return float(self._rng.random() * self.max_counter_value)
+        if schema.type == "boolean":
+            return True
+        if schema.type == "string":
+            if field is not None and field.has_default and isinstance(field.default, str):
+                return field.default
+            return field.name if field is not None else ""
+        if schema.type == "bytes":
+            return b""
+        return None
+
+
+def _accepts_null(schema: avro.schema.Schema) -> bool:
+    if isinstance(schema, avro.schema.UnionSchema):
+        return any(branch.type == "null" for branch in schema.schemas)
+    return schema.type == "null"
+
+
+def _iso_time(epoch_ms: int) -> str:
+    return datetime.fromtimestamp(epoch_ms / 1000, timezone.utc).isoformat()
+
+
+def main(argv: Optional[list[str]] = None):
+    """Write generated PM messages to a recording."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--schema", required=True, help="Avro schema, or a saved Schema Registry response")
+    parser.add_argument("--schema-id", default="125", help="Schema Registry ID of the schema")
+    cells = parser.add_mutually_exclusive_group(required=True)
+    cells.add_argument("--cells", help="Saved Topology & Inventory response, or a JSON list of cell FDNs")
+    cells.add_argument("--cell-count", type=int, help="Number of synthetic cells to generate messages for")
+    parser.add_argument("--rops", type=int, default=1, help="Number of consecutive ROPs")
+    parser.add_argument("--first-rop", type=int, default=1741031100000, help="Epoch milliseconds of the first ROP")
+    parser.add_argument("--partitions", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True, help="Path of the recording to write")
+    args = parser.parse_args(argv)
+
+    cell_fdns = (
+        read_cell_fdns(args.cells) if args.cells else synthetic_cell_fdns(args.cell_count)
+    )
+    generator = PmMessageGenerator(
+        load_schema(args.schema),
+        args.schema_id,
+        cell_fdns,
+        seed=args.seed,
+        partitions=args.partitions,
+    )
+    write_recording(args.output, generator.generate(args.first_rop, args.rops))
+
+
+if __name__ == "__main__":
+    main()
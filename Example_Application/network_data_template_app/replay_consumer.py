@@ -0,0 +1,279 @@
+"""
+This module replays recorded Message Bus messages in place of a Kafka consumer, so that the consumer pipeline can be
+run and benchmarked without a Message Bus.
+
+A recording is a JSON Lines file with one message per line, holding its topic, partition, offset, timestamp in epoch
+milliseconds, headers as a list of `[key, value]` pairs, and value encoded as Base64. `ReplayConsumer` implements the
+parts of the confluent_kafka `Consumer` interface which `MessageBusConsumer` uses, so the rest of the pipeline runs
+unchanged. Topology & Inventory and the Schema Registry are still queried as usual. Schemas can be served offline from
+the schema cache directory.
+"""
+
+import base64
+import bisect
+import json
+import sys
+import threading
+import time
+from typing import Iterable, Optional
+
+from confluent_kafka import (
+    OFFSET_INVALID,
+    TIMESTAMP_CREATE_TIME,
+    TIMESTAMP_NOT_AVAILABLE,
+    Message,
+    TopicPartition,
+)
+
+from .mtls_logging import logger
+
+
+class RecordedMessage:
+    """A recorded message, with the accessors of a confluent_kafka `Message`."""
+
+    __slots__ = ("_topic", "_partition", "_offset", "_timestamp", "_headers", "_value")
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+    def __init__(
+        self,
+        topic: str,
+        partition: int,
+        offset: int,
+        timestamp: Optional[int],
+        headers: list[tuple[str, bytes]],
+        value: bytes,
+    ):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._timestamp = timestamp
+        self._headers = headers
+        self._value = value
+
+    def topic(self) -> str:
+        return self._topic
+
+    def partition(self) -> int:
+        return self._partition
+
+    def offset(self) -> int:
+        return self._offset
+
+    def timestamp(self) -> tuple[int, int]:
+        if self._timestamp is None:
+            return TIMESTAMP_NOT_AVAILABLE, 0
+        return TIMESTAMP_CREATE_TIME, self._timestamp
+
+    def headers(self) -> list[tuple[str, bytes]]:
+        return self._headers
+
+    def value(self) -> bytes:
+        return self._value
+
+    def error(self) -> None:
+        return None
+
+    def with_offset(self, offset: int, timestamp: Optional[int]) -> "RecordedMessage":
+        """A copy of this message at another offset and timestamp, for a later pass over a recording."""
+        return RecordedMessage(
+            self._topic, self._partition, offset, timestamp, self._headers, self._value
+        )
+
+
+def read_recording(path: str) -> list[RecordedMessage]:
+    """Read the messages of a recording, in the order they were recorded."""
+    messages = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            messages.append(
+                RecordedMessage(
+                    record.get("topic", "replay"),
+                    record.get("partition", 0),
+                    record.get("offset", len(messages)),
+                    record.get("timestamp"),
+                    [(key, value.encode("utf-8")) for key, value in record["headers"]],
+                    base64.b64decode(record["value"]),
+                )
+            )
+    return messages
+
+
+def write_recording(path: str, messages: Iterable[Message]):
+    """Write messages to a recording, such as messages consumed from the Message Bus or generated ones."""
+    with open(path, "w", encoding="utf-8") as f:
+        for message in messages:
+            timestamp_type, timestamp = message.timestamp()
+            record = {
+                "topic": message.topic(),
+                "partition": message.partition(),
+                "offset": message.offset(),
+                "timestamp": timestamp if timestamp_type != TIMESTAMP_NOT_AVAILABLE else None,
+                "headers": [
+                    [key, value.decode("utf-8")] for key, value in message.headers() or []
+                ],
+                "value": base64.b64encode(message.value()).decode("ascii"),
+            }
+            f.write(json.dumps(record) + "\n")
+
+
+class ReplayConsumer:
+    """
+    A stand-in for a confluent_kafka `Consumer` which replays a recording.
+
+    Messages are released at `rate` messages per second from the first call to `consume`, or all at once if `rate` is
+    zero. Each pass over the recording continues the offsets of the previous pass, and moves the timestamps forward by
+    the span of the recording. Once every pass has been replayed, `consume` waits for its timeout and returns no
+    messages, as an idle Message Bus would.
+
+    Attributes:
+        messages: The recorded messages.
+        rate: Messages released per second, or zero for no limit.
+        passes: Number of passes over the recording, or zero to replay it forever.
+        consumed: Number of messages returned so far, counted over every pass.
+    """
+
+    def __init__(self, messages: list[RecordedMessage], rate: float = 0, passes: int = 1):
+        self.messages = messages
+        self.rate = rate
+        self.passes = passes
+        self.consumed = 0
+        self._started_at: Optional[float] = None
+        self._closed = False
+        self._committed: dict[tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        timestamps = [
+            message.timestamp()[1]
+            for message in messages
+            if message.timestamp()[0] != TIMESTAMP_NOT_AVAILABLE
+        ]
+        self._span_ms = max(timestamps) - min(timestamps) + 1 if timestamps else 0
+        self._positions: dict[tuple[str, int], list[int]] = {}
+        for position, message in enumerate(messages):
+            self._positions.setdefault((message.topic(), message.partition()), []).append(position)
+
+    @classmethod
+    def from_file(cls, path: str, rate: float = 0, passes: int = 1) -> "ReplayConsumer":
+        """Replay the recording at `path`."""
+        messages = read_recording(path)
+        logger.info(f"Replaying {len(messages)} recorded messages from {path}")
+        return cls(messages, rate, passes)
+
+    @property
+    def total(self) -> Optional[int]:
+        """The number of messages the replay releases, or None if it repeats forever."""
+        if not self.messages:
+            return 0
+        return len(self.messages) * self.passes if self.passes > 0 else None
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether every message of every pass has been consumed."""
+        return self.total is not None and self.consumed >= self.total
+
+    def consume(self, num_messages: int = 1, timeout: float = -1) -> list[RecordedMessage]:
+        """
+        Return up to `num_messages` messages, waiting at most `timeout` seconds, or forever if negative, for them.
+
+        The last messages of the replay are returned straight away, rather than after waiting for more which will never
+        be released, and once the replay is over, no messages are returned straight away if `timeout` is negative.
+        Raises RuntimeError once closed, like `Consumer.consume`.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Consumer closed")
+            now = time.monotonic()
+            if self._started_at is None:
+                self._started_at = now
+            deadline = now + timeout if timeout >= 0 else float("inf")
+            while True:
+                released = self.__released()
+                available = released - self.consumed
+                final = self.total is not None and released >= self.total
+                if available >= num_messages or (available and final):
+                    break
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if final:
+                    if deadline != float("inf"):
+                        time.sleep(deadline - now)
+                    break
+                next_release = self._started_at + (self.consumed + num_messages) / self.rate
+                time.sleep(max(min(next_release, deadline) - now, 0))
+            batch = [
+                self.__message(index)
+                for index in range(self.consumed, self.consumed + min(available, num_messages))
+            ]
+            self.consumed += len(batch)
+            return batch
+
+    def commit(self, offsets: Optional[list[TopicPartition]] = None, asynchronous: bool = True):
+        """Record committed offsets, which `committed` then reports."""
+        # pylint: disable=unused-argument
+        for partition in offsets or []:
+            self._committed[(partition.topic, partition.partition)] = partition.offset
+
+    def committed(self, partitions: list[TopicPartition], timeout: float = -1) -> list[TopicPartition]:
+        """The committed offset of each partition, or OFFSET_INVALID if nothing was committed on it."""
+        # pylint: disable=unused-argument
+        return [
+            TopicPartition(
+                partition.topic,
+                partition.partition,
+                self._committed.get((partition.topic, partition.partition), OFFSET_INVALID),
+            )
+            for partition in partitions
+        ]
+
+    def assignment(self) -> list[TopicPartition]:
+        """Every partition of the recording."""
+        return [TopicPartition(topic, partition) for topic, partition in sorted(self._positions)]
+
+    def get_watermark_offsets(
+        self, partition: TopicPartition, timeout: float = -1, cached: bool = False
+    ) -> tuple[int, int]:
+        """The low and high watermark of a partition, where the high watermark follows the messages released so far."""
+        # pylint: disable=unused-argument
+        positions = self._positions.get((partition.topic, partition.partition))
+        if not positions:
+            return 0, 0
+        lap, position = divmod(self.__released(), len(self.messages))
+        count = bisect.bisect_left(positions, position)
+        if count:
+            index = lap * len(self.messages) + positions[count - 1]
+        elif lap:
+            index = (lap - 1) * len(self.messages) + positions[-1]
+        else:
+            return 0, 0
+        return 0, self.__message(index).offset() + 1
+
+    def subscribe(self, topics: list[str], **kwargs):
+        """Subscriptions are ignored, as every message of the recording is replayed."""
+
+    def close(self):
+        """Stop replaying. Any later call to `consume` raises RuntimeError."""
+        self._closed = True
+
+    def __released(self) -> int:
+        """The number of messages released so far, counted over every pass."""
+        if self.rate <= 0:
+            return sys.maxsize if self.total is None else self.total
+        if self._started_at is None:
+            return 0
+        released = int((time.monotonic() - self._started_at) * self.rate)
+        return released if self.total is None else min(released, self.total)
+
+    def __message(self, index: int) -> RecordedMessage:
+        """The message at an index counted over every pass."""
+        lap, position = divmod(index, len(self.messages))
+        message = self.messages[position]
+        if lap == 0:
+            return message
+        timestamp_type, timestamp = message.timestamp()
+        return message.with_offset(
+            message.offset() + lap * len(self.messages),
+            timestamp + lap * self._span_ms if timestamp_type != TIMESTAMP_NOT_AVAILABLE else None,
+        )
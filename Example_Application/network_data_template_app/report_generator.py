@@ -5,10 +5,13 @@ The generated report is logged at a regular interval.
 
 from datetime import datetime, timezone
 from operator import countOf
+from typing import Iterable
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from .message_bus_consumer import fdn_to_pm_counter_status
+from .counter_shards import CounterStatusShards, merge_counter_status
+from .counter_store import pm_counter_store
+from .message_bus_consumer import counter_presence
 from .mtls_logging import logger
 from .network_configuration import get_attributes_for_source_ids
 
@@ -17,6 +20,7 @@ class ReportGenerator:
     """
     Collect FDNs, attributes and counters and provide a readable tabular representation of what was collected.
     `clear_data_upon_usage` can be disabled for testing.
+    `counter_shards` holds the per-partition counter presence of each consumer worker, which is merged into the report.
     """
 
     MISFIRE_GRACE_TIME_SECONDS = 60  # This allows extra time for the logging job to complete in case of any network delays
@@ -26,24 +30,22 @@ class ReportGenerator:
         async_oauth_client,
         attribute="operationalState",
         clear_data_upon_usage=True,
+        counter_shards: Iterable[CounterStatusShards] = (),
     ):
         self.async_oauth_client = async_oauth_client
         self.attribute = attribute
         self.clear_data_upon_usage: bool = clear_data_upon_usage
+        self.counter_shards: list[CounterStatusShards] = list(counter_shards)
         self.period_start: datetime = datetime.fromtimestamp(0)
         self.period_end: datetime = datetime.fromtimestamp(0)
         self.scheduler = AsyncIOScheduler()
         self.log_job = None
 
-    async def __get_report_data(self) -> list[str]:
+    async def __get_report_data(self, cached_dict: dict[str, bool]) -> list[str]:
         """
-        Parse the `fdn_to_pm_counter_status` dict for the FDN and counter status, then make a call to Network Configuration to retrieve
+        Parse the merged counter status for the FDN and counter status, then make a call to Network Configuration to retrieve
         the `attribute` value to populate the report.
         """
-        cached_dict = dict(sorted(fdn_to_pm_counter_status.items()))
-        if self.clear_data_upon_usage:
-            for key in fdn_to_pm_counter_status:
-                fdn_to_pm_counter_status[key] = False
         report_data = []
         source_id_attribute_map = await get_attributes_for_source_ids(
             self.async_oauth_client, list(cached_dict.keys()), self.attribute
@@ -60,8 +62,13 @@ class ReportGenerator:
 
     async def __log_message(self):
         """Log a message with FDNs, attribute value and counter collection status."""
-        counters_collected = countOf(fdn_to_pm_counter_status.values(), True)
-        report_data = await self.__get_report_data()
+        cached_dict = merge_counter_status(
+            counter_presence,
+            self.counter_shards,
+            clear=self.clear_data_upon_usage,
+        )
+        counters_collected = countOf(cached_dict.values(), True)
+        report_data = await self.__get_report_data(cached_dict)
         log_string = "\n".join(str(row) for row in report_data) + "\n"
 
         logger.info(
@@ -69,10 +76,25 @@ class ReportGenerator:
                 f"Collected PM counters for {counters_collected} out of {len(report_data)} NRCellDUs between {self.period_start.strftime('%H:%M')} and {self.period_end.strftime('%H:%M')} (UTC):\n{log_string}"
             )
         )
+        if pm_counter_store.enabled:
+            self.__log_counter_store()
         self.period_start = self.period_end
         self.period_end = self.log_job.next_run_time.astimezone(timezone.utc)
         logger.info(f"Next report at {self.period_end.strftime('%H:%M')} (UTC)")
 
+    def __log_counter_store(self):
+        """Log how many cells reported counter values in the latest ROP held by the counter store."""
+        latest_rop = pm_counter_store.latest_rop()
+        if latest_rop is None:
+            logger.info("No PM counter values have been stored yet")
+            return
+        cells_reporting = int(pm_counter_store.cells_reporting(latest_rop).sum())
+        rop_begin = datetime.fromtimestamp(latest_rop / 1000, timezone.utc)
+        logger.info(
+            f"Stored values of {len(pm_counter_store.counter_names)} PM counters for {cells_reporting} out of "
+            f"{len(pm_counter_store.cell_fdns)} NRCellDUs in the ROP starting at {rop_begin.strftime('%H:%M')} (UTC)"
+        )
+
     def start_schedule(self, trigger, *args, **kwargs):
         """Log the report at a regular interval. Any args given are passed directly into APScheduler's `add_job`."""
         logger.debug("Starting report logging schedule.")
@@ -0,0 +1,271 @@
+"""
+This module provides the retry policy for requests to the platform services: Topology & Inventory, Network
+Configuration, the Schema Registry and Data Management. Each service has its own `RetryPolicy` in `retry_policies`.
+
+A request is attempted up to `MAX_RETRIES` times. Before each retry the policy waits an exponential backoff with full
+jitter, a random delay of up to `RETRY_DELAY * 2**attempt` seconds, capped at `RETRY_MAX_DELAY`, so that requests which
+failed together do not retry together. The wait uses `asyncio.sleep`, so other tasks carry on in the meantime.
+
+Retries are limited three ways:
+- Deadline: the attempts and waits of a call must complete within `RETRY_DEADLINE` seconds.
+- Retry budget: every call earns `RETRY_BUDGET_RATIO` retries for its service, up to `RETRY_BUDGET_RESERVE` saved
+  retries, so that retries add at most that fraction of load to a service which keeps failing.
+- Circuit breaker: after `CIRCUIT_BREAKER_THRESHOLD` consecutive failed requests to a service, its requests are
+  rejected for `CIRCUIT_BREAKER_RESET_TIMEOUT` seconds. A single request is then let through, and the circuit closes
+  again if it succeeds.
+
+Only errors which may pass are retried: connection errors and timeouts, a missing token, and responses with a status of
+408, 429 or 5xx. Any other error is raised at once, and shows the service is up as far as the circuit breaker goes.
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, NamedTuple, Optional, TypeVar
+
+from authlib.integrations.base_client import MissingTokenError
+from httpx import HTTPStatusError, RequestError, TimeoutException, TransportError
+
+from .config import get_config
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+UPSTREAMS = ("topology", "network_configuration", "schema_registry", "data_management")
+RETRYABLE_STATUS_CODES = frozenset({408, 429})
+# Retries a service may use before its budget has to be earned back by calls.
+RETRY_BUDGET_RESERVE = 10.0
+# States of a circuit breaker, as exported by the upstream_circuit_state metric.
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RequestError):
+    """Raised instead of making a request while the circuit breaker of its service is open."""
+
+
+class DeadlineExceededError(TimeoutException):
+    """Raised when a request is still in progress at the deadline of its call."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a request which failed with `error` may succeed if it is made again."""
+    if isinstance(error, HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code >= 500 or status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (TransportError, MissingTokenError))
+
+
+class _Settings(NamedTuple):
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+    deadline: float
+    budget_ratio: float
+    breaker_threshold: int
+    breaker_reset_timeout: float
+
+
+def _get_settings() -> _Settings:
+    # Read on every call, like the retry loops this replaces, so that configuration changes apply straight away.
+    config = get_config()
+    return _Settings(
+        max_attempts=max(int(config.get("max_retries")), 1),
+        base_delay=float(config.get("retry_delay")),
+        max_delay=float(config.get("retry_max_delay")),
+        deadline=float(config.get("retry_deadline")),
+        budget_ratio=float(config.get("retry_budget_ratio")),
+        breaker_threshold=int(config.get("circuit_breaker_threshold")),
+        breaker_reset_timeout=float(config.get("circuit_breaker_reset_timeout")),
+    )
+
+
+class CircuitBreaker:
+    """
+    Tracks consecutive failed requests to a service.
+
+    The circuit opens after `threshold` of them, and rejects requests until `reset_timeout` seconds have passed. It is
+    then half-open: one request is allowed through, closing the circuit if it succeeds and opening it again if not.
+    If that request never completes, another is allowed through after a further `reset_timeout` seconds.
+    """
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self, reset_timeout: float) -> bool:
+        """Whether a request may be made now."""
+        if self.state == CLOSED:
+            return True
+        if time.monotonic() - self.opened_at >= reset_timeout:
+            self.state = HALF_OPEN
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self) -> None:
+        """Close the circuit, as the service answered."""
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self, threshold: int) -> None:
+        """Count a failed request, opening the circuit after `threshold` in a row or if it was half-open."""
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """A balance of retries: each call deposits a fraction of a retry, and each retry withdraws one."""
+
+    def __init__(self, reserve: float = RETRY_BUDGET_RESERVE):
+        self.reserve = reserve
+        self.balance = reserve
+
+    def deposit(self, ratio: float) -> None:
+        """Earn `ratio` retries for a call, up to the reserve."""
+        self.balance = min(self.balance + ratio, self.reserve)
+
+    def withdraw(self) -> bool:
+        """Spend a retry, returning whether there was one to spend."""
+        if self.balance < 1:
+            return False
+        self.balance -= 1
+        return True
+
+
+class RetryPolicy:
+    """
+    Retries failed requests to one service, with backoff, a deadline, a retry budget and a circuit breaker.
+
+    Methods:
+        call: Make a request with `asyncio`, retrying it according to the policy.
+        call_sync: Make a blocking request, retrying it according to the policy.
+        reset: Forget the failures and retries of the service.
+    """
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+        self.breaker = CircuitBreaker()
+        self.budget = RetryBudget()
+
+    def reset(self) -> None:
+        """Close the circuit breaker and refill the retry budget."""
+        self.breaker = CircuitBreaker()
+        self.budget = RetryBudget()
+        self._export_circuit_state()
+
+    async def call(self, request: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """
+        Await `request()` until it succeeds, retrying it according to the policy, and return its result.
+
+        Args:
+            request (Callable): Makes the request once, raising an error if it failed.
+            deadline (float, optional): Seconds the call may take, instead of `RETRY_DEADLINE`. `0` means no deadline.
+
+        Raises:
+            CircuitOpenError: If the circuit breaker of the service is open.
+            DeadlineExceededError: If a request is still in progress at the deadline.
+            Exception: The error of the last request, if it cannot be retried.
+        """
+        settings = _get_settings()
+        deadline_at = self._start(settings, deadline)
+        attempt = 0
+        while True:
+            self._admit(settings)
+            try:
+                result = await asyncio.wait_for(request(), _remaining(deadline_at))
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                await asyncio.sleep(self._retry_delay(error, attempt, settings, deadline_at))
+                attempt += 1
+            else:
+                self._succeeded()
+                return result
+
+    def call_sync(self, request: Callable[[], T], deadline: Optional[float] = None) -> T:
+        """
+        Call `request()` until it succeeds, retrying it according to the policy, and return its result.
+
+        This is for the blocking clients used before the event loop starts serving. As a blocking request cannot be
+        interrupted, the deadline only stops further retries.
+        """
+        settings = _get_settings()
+        deadline_at = self._start(settings, deadline)
+        attempt = 0
+        while True:
+            self._admit(settings)
+            try:
+                result = request()
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                time.sleep(self._retry_delay(error, attempt, settings, deadline_at))
+                attempt += 1
+            else:
+                self._succeeded()
+                return result
+
+    def _start(self, settings: _Settings, deadline: Optional[float]) -> Optional[float]:
+        """Deposit the call's share of the retry budget, and return the monotonic time of its deadline, if any."""
+        self.budget.deposit(settings.budget_ratio)
+        deadline = settings.deadline if deadline is None else deadline
+        return time.monotonic() + deadline if deadline > 0 else None
+
+    def _admit(self, settings: _Settings) -> None:
+        """Raise `CircuitOpenError` if a request may not be made now."""
+        if settings.breaker_threshold <= 0 or self.breaker.allow(settings.breaker_reset_timeout):
+            self._export_circuit_state()
+            return
+        metrics_registry.counters.get("upstream_circuit_rejected_requests").inc()
+        raise CircuitOpenError(f"The circuit breaker for {self.upstream} is open, not making the request")
+
+    def _succeeded(self) -> None:
+        self.breaker.record_success()
+        self._export_circuit_state()
+
+    def _retry_delay(
+        self, error: Exception, attempt: int, settings: _Settings, deadline_at: Optional[float]
+    ) -> float:
+        """
+        Return the seconds to wait before retrying a request which failed with `error`, or raise if it may not be
+        retried. Must be called while handling `error`.
+        """
+        if isinstance(error, asyncio.TimeoutError):
+            self._failed(settings)
+            metrics_registry.counters.get("upstream_deadline_exceeded").inc()
+            raise DeadlineExceededError(f"Request to {self.upstream} did not complete within its deadline") from error
+        if not is_retryable(error):
+            self._succeeded()
+            raise error
+        self._failed(settings)
+        if attempt + 1 >= settings.max_attempts:
+            raise error
+        if settings.budget_ratio > 0 and not self.budget.withdraw():
+            metrics_registry.counters.get("upstream_retry_budget_exhausted").inc()
+            logger.error(f"Request to {self.upstream} failed, and its retry budget is spent: {error}")
+            raise error
+        delay = random.uniform(0, min(settings.max_delay, settings.base_delay * 2**attempt))
+        if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+            metrics_registry.counters.get("upstream_deadline_exceeded").inc()
+            logger.error(f"Request to {self.upstream} failed, with no time left to retry before its deadline: {error}")
+            raise error
+        metrics_registry.histograms.get("upstream_retry_delay_seconds").labels(self.upstream).observe(delay)
+        logger.error(
+            f"Request to {self.upstream} failed: {error} Retrying in {delay:.2f}s ({attempt + 1}/{settings.max_attempts})"
+        )
+        return delay
+
+    def _failed(self, settings: _Settings) -> None:
+        if settings.breaker_threshold > 0:
+            self.breaker.record_failure(settings.breaker_threshold)
+            self._export_circuit_state()
+
+    def _export_circuit_state(self) -> None:
+        metrics_registry.gauges.get("upstream_circuit_state").labels(self.upstream).set(self.breaker.state)
+
+
+def _remaining(deadline_at: Optional[float]) -> Optional[float]:
+    return None if deadline_at is None else max(deadline_at - time.monotonic(), 0.0)
+
+
+retry_policies = {upstream: RetryPolicy(upstream) for upstream in UPSTREAMS}
@@ -0,0 +1,95 @@
+"""
+This module suppresses PM messages delivered more than once.
+
+Kafka delivers at least once, so after a rebalance or a restart, messages whose offsets were not yet committed are
+consumed again. A cell sends one PM message per ROP, so a message is a duplicate if its cell was already seen for its
+`ropBeginTimeInEpoch`. Cells are identified by their dense cell ID, so the cells seen for a ROP are held exactly, in a
+bitset of one bit per cell, for the last `retention` ROPs only.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from .config import get_config
+from .fdn_index import reindex_rows
+from .metrics import metrics_registry
+
+
+class RopDeduplicator:
+    """
+    The cells seen for each of the last few ROPs.
+
+    With a retention of zero, duplicates are not suppressed.
+
+    Attributes:
+        retention: Number of ROPs remembered. A new ROP replaces the oldest.
+        cell_count: Number of cells, which is the size of each bitset in bits.
+        suppressed: Metric: Number of duplicate PM messages suppressed
+    """
+
+    def __init__(self, retention: int):
+        self.retention = max(retention, 0)
+        self.cell_count = 0
+        self._seen: dict[int, bytearray] = {}
+        self.suppressed = metrics_registry.counters.get(
+            "duplicate_messages_suppressed"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether duplicate messages are suppressed."""
+        return self.retention > 0
+
+    def allocate(self, cell_count: int):
+        """Size the bitsets for a number of cells, forgetting every cell seen."""
+        self.cell_count = cell_count
+        self._seen.clear()
+
+    def reindex(self, old_ids: np.ndarray):
+        """
+        Resize the bitsets for a new set of cells, remembering the ROPs seen by every cell which remains. `old_ids`
+        gives the previous cell ID of each new cell ID, or -1 for an added cell.
+        """
+        for rop_begin_time, seen in self._seen.items():
+            bits = np.unpackbits(
+                np.frombuffer(seen, np.uint8), count=self.cell_count, bitorder="little"
+            ).astype(bool)
+            self._seen[rop_begin_time] = bytearray(
+                np.packbits(reindex_rows(bits, old_ids, False), bitorder="little").tobytes()
+            )
+        self.cell_count = len(old_ids)
+
+    def is_duplicate(self, cell_id: int, rop_begin_time: int) -> bool:
+        """
+        Whether a cell was already seen for a ROP, recording it as seen if not.
+
+        A ROP older than every ROP remembered cannot be checked, so its messages are never reported as duplicates.
+        """
+        seen = self._seen.get(rop_begin_time)
+        if seen is None:
+            seen = self.__add_rop(rop_begin_time)
+            if seen is None:
+                return False
+        byte, bit = cell_id >> 3, 1 << (cell_id & 7)
+        if seen[byte] & bit:
+            self.suppressed.inc()
+            return True
+        seen[byte] |= bit
+        return False
+
+    def __add_rop(self, rop_begin_time: int) -> Optional[bytearray]:
+        """Start a bitset for a new ROP, reusing the bitset of the oldest ROP if `retention` ROPs are remembered."""
+        if len(self._seen) < self.retention:
+            seen = bytearray(-(-self.cell_count // 8))
+        else:
+            oldest = min(self._seen)
+            if rop_begin_time < oldest:
+                return None
+            seen = self._seen.pop(oldest)
+            seen[:] = bytes(len(seen))
+        self._seen[rop_begin_time] = seen
+        return seen
+
+
+rop_deduplicator = RopDeduplicator(int(get_config().get("dedup_rops")))
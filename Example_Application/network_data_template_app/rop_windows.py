@@ -0,0 +1,214 @@
+"""
+This module groups PM messages into windows by ROP, using the ROP times the messages carry rather than the time they
+are consumed.
+
+Each window collects which cells reported counters for one ROP, and the sum of each counter over those cells. A window
+closes as soon as every expected cell has reported. Otherwise it closes when the watermark passes its end, where the
+watermark trails the latest ROP end seen by the allowed lateness. Messages for a ROP whose window already closed are
+late, and are counted and dropped. Only `max_open` windows are kept open, so memory stays bounded when ROPs are skipped.
+"""
+
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Mapping, NamedTuple, Optional
+
+import numpy as np
+
+from .config import get_config
+from .fdn_index import reindex_rows
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+CLOSED_ON_COMPLETE = "complete"
+CLOSED_ON_WATERMARK = "watermark"
+CLOSED_ON_EVICTION = "eviction"
+
+
+class RopWindowResult(NamedTuple):
+    """The outcome of a closed ROP window, for the cells expected when it closed."""
+
+    rop_begin_time: int
+    rop_end_time: int
+    reported: np.ndarray
+    counters: dict[str, int]
+    closed_by: str
+    cell_fdns: list[str]
+
+    @property
+    def cells_reported(self) -> int:
+        """The number of cells which reported counters for the ROP."""
+        return int(self.reported.sum())
+
+    @property
+    def complete(self) -> bool:
+        """Whether every expected cell reported counters for the ROP."""
+        return bool(self.reported.all())
+
+
+class _OpenWindow:
+    __slots__ = ("rop_end_time", "reported", "cells_reported", "counters")
+
+    def __init__(self, rop_end_time: int, cells: int):
+        self.rop_end_time = rop_end_time
+        self.reported = np.zeros(cells, bool)
+        self.cells_reported = 0
+        self.counters: dict[str, int] = {}
+
+
+# pylint: disable=too-many-instance-attributes
+class RopWindows:
+    """
+    Event-time windows of PM messages keyed by `ropBeginTimeInEpoch`.
+
+    With `max_open` set to zero, windowing is disabled.
+
+    Attributes:
+        max_open: Maximum number of windows open at once. Opening another closes the oldest.
+        allowed_lateness: Seconds a window stays open after a later ROP ends, waiting for its missing cells.
+        cell_fdns: The FDN of each expected cell, by cell ID.
+        watermark: Epoch milliseconds before which a ROP end is considered closed.
+        closed: The most recently closed windows, oldest first, at most `max_open` of them.
+        late_messages: Metric: Number of messages dropped because the window of their ROP had already closed
+        windows_closed_complete: Metric: Number of windows closed because every cell reported
+        windows_closed_incomplete: Metric: Number of windows closed by the watermark or by eviction
+        open_windows: Metric: Number of windows currently open
+        close_delay: Metric: Seconds from the end of a ROP until its window closed
+    """
+
+    def __init__(self, max_open: int, allowed_lateness: float):
+        self.max_open = max(max_open, 0)
+        self.allowed_lateness = allowed_lateness
+        self.cell_fdns: list[str] = []
+        self.watermark = 0
+        self.closed: deque[RopWindowResult] = deque(maxlen=max(self.max_open, 1))
+        self._open: dict[int, _OpenWindow] = {}
+        self._completed: dict[int, int] = {}
+        self.late_messages = metrics_registry.counters.get("rop_window_late_messages")
+        self.windows_closed_complete = metrics_registry.counters.get(
+            "rop_windows_closed_complete"
+        )
+        self.windows_closed_incomplete = metrics_registry.counters.get(
+            "rop_windows_closed_incomplete"
+        )
+        self.open_windows = metrics_registry.gauges.get("rop_window_open_windows")
+        self.close_delay = metrics_registry.histograms.get(
+            "rop_window_close_delay_seconds"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether messages are grouped into ROP windows."""
+        return self.max_open > 0
+
+    def allocate(self, cell_fdns: list[str]):
+        """Set the expected cells, given by the FDN of each cell ID, discarding every window."""
+        self.cell_fdns = list(cell_fdns)
+        self.watermark = 0
+        self.closed.clear()
+        self._open.clear()
+        self._completed.clear()
+        self.open_windows.set(0)
+
+    def reindex(self, cell_fdns: list[str], old_ids: np.ndarray):
+        """
+        Change the expected cells, given by the FDN of each cell ID, keeping the open windows and which of the
+        remaining cells reported for them. `old_ids` gives the previous cell ID of each new cell ID, or -1 for an
+        added cell. The counter sums still include the counters of removed cells. Windows in which every remaining
+        cell has now reported are closed.
+        """
+        self.cell_fdns = list(cell_fdns)
+        for rop_begin_time, window in list(self._open.items()):
+            window.reported = reindex_rows(window.reported, old_ids, False)
+            window.cells_reported = int(np.count_nonzero(window.reported))
+            if self.cell_fdns and window.cells_reported == len(self.cell_fdns):
+                self.__close(rop_begin_time, CLOSED_ON_COMPLETE)
+
+    def observe(
+        self,
+        cell_id: int,
+        rop_begin_time: int,
+        rop_end_time: int,
+        counters: Optional[Mapping[str, int]],
+    ) -> bool:
+        """
+        Add a message for one of the expected cells to the window of its ROP. `counters` is None if it had none.
+
+        Returns False if the message is late, as the window of its ROP has closed. A cell is only counted once per ROP.
+        """
+        self.__advance_watermark(rop_end_time)
+        # Strictly before, so that with no allowed lateness a message is not late for the ROP it advanced the watermark to.
+        if rop_end_time < self.watermark or rop_begin_time in self._completed:
+            self.late_messages.inc()
+            return False
+
+        window = self._open.get(rop_begin_time)
+        if window is None:
+            if len(self._open) >= self.max_open and rop_begin_time < min(self._open):
+                self.late_messages.inc()
+                return False
+            window = self._open[rop_begin_time] = _OpenWindow(
+                rop_end_time, len(self.cell_fdns)
+            )
+            if len(self._open) > self.max_open:
+                self.__close(min(self._open), CLOSED_ON_EVICTION)
+            self.open_windows.set(len(self._open))
+
+        if counters is None or window.reported[cell_id]:
+            return True
+        window.reported[cell_id] = True
+        window.cells_reported += 1
+        totals = window.counters
+        for name, value in counters.items():
+            totals[name] = totals.get(name, 0) + value
+        if window.cells_reported == len(self.cell_fdns):
+            self.__close(rop_begin_time, CLOSED_ON_COMPLETE)
+        return True
+
+    def __advance_watermark(self, rop_end_time: int):
+        watermark = rop_end_time - int(self.allowed_lateness * 1000)
+        if watermark <= self.watermark:
+            return
+        self.watermark = watermark
+        for rop_begin_time in sorted(self._open):
+            if self._open[rop_begin_time].rop_end_time < watermark:
+                self.__close(rop_begin_time, CLOSED_ON_WATERMARK)
+        # Windows closed as complete only need remembering until the watermark passes them.
+        self._completed = {
+            rop_begin_time: rop_end_time
+            for rop_begin_time, rop_end_time in self._completed.items()
+            if rop_end_time >= watermark
+        }
+
+    def __close(self, rop_begin_time: int, closed_by: str):
+        window = self._open.pop(rop_begin_time)
+        if closed_by == CLOSED_ON_COMPLETE:
+            self._completed[rop_begin_time] = window.rop_end_time
+            self.windows_closed_complete.inc()
+        else:
+            self.windows_closed_incomplete.inc()
+        result = RopWindowResult(
+            rop_begin_time,
+            window.rop_end_time,
+            window.reported,
+            window.counters,
+            closed_by,
+            self.cell_fdns,
+        )
+        self.closed.append(result)
+        self.open_windows.set(len(self._open))
+        self.close_delay.observe(max(time.time() - window.rop_end_time / 1000, 0))
+
+        rop_begin = datetime.fromtimestamp(rop_begin_time / 1000, timezone.utc)
+        rop_end = datetime.fromtimestamp(window.rop_end_time / 1000, timezone.utc)
+        logger.info(
+            f"Closed the ROP window {rop_begin.strftime('%H:%M')} to {rop_end.strftime('%H:%M')} (UTC) on "
+            f"{closed_by}: {window.cells_reported} out of {len(self.cell_fdns)} NRCellDUs reported "
+            f"{len(window.counters)} PM counters"
+        )
+
+
+rop_windows = RopWindows(
+    int(get_config().get("rop_windows")),
+    float(get_config().get("rop_window_allowed_lateness")),
+)
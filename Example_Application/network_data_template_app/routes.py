@@ -4,7 +4,10 @@ The /topology and /network-configuration APIs defined here are not part of the c
 but may be used as the use case evolves.
 """
 
-from fastapi import APIRouter
+from typing import Optional
+
+import numpy as np
+from fastapi import APIRouter, Header
 from fastapi.responses import Response, JSONResponse
 from fastapi_healthchecks.api.router import HealthcheckRouter, Probe
 from httpx import TimeoutException, RequestError, HTTPStatusError
@@ -12,12 +15,14 @@ from httpx import TimeoutException, RequestError, HTTPStatusError
 from prometheus_client import generate_latest
 
 import network_data_template_app.network_configuration as ncmp
-from network_data_template_app import topology_and_inventory
 
+from .counter_store import pm_counter_store
 from .health import SimpleHealthCheck
 from .metrics import metrics_registry
 from .mtls_logging import logger
 from .oauth import oauth
+from .rop_windows import rop_windows
+from .topology_cache import topology_cache
 
 api_router = APIRouter(prefix="/network-data-template-app")
 
@@ -44,18 +49,25 @@ async def root():
 
 
 @api_router.get("/topology")
-async def topology():
+async def topology(if_none_match: Optional[str] = Header(None)):
     """
     This route returns simple topology information
     and increments the appropriate topology counter.
+    The cells are served from the topology cache, with an ETag. If the `If-None-Match` header matches it,
+    a 304 Not Modified response without a body is returned instead.
     """
     try:
 
         # Get NRCellDU entities
         client = await oauth.get_oauth_client()
-        cells = await topology_and_inventory.get_nr_cell_dus(client)
+        cached_topology = await topology_cache.get(client)
+        if _etag_matches(if_none_match, cached_topology.etag):
+            logger.info("304 Not Modified /topology")
+            return Response(status_code=304, headers={"ETag": cached_topology.etag})
         logger.info("200 OK /topology")
-        return JSONResponse(cells)
+        return Response(
+            cached_topology.body, media_type="application/json", headers={"ETag": cached_topology.etag}
+        )
     except TimeoutException as e:
         logger.error(f"Topology Timeout: {str(e)}")
         return JSONResponse({"Error": "Topology service timed out."}, 503)
@@ -82,9 +94,8 @@ async def network_configuration(attribute: str = "operationalState"):
                 f"Invalid attribute: {attribute}. Allowed attributes are {allowed_attributes}"
             )
 
-        # Get NRCellDU entities and extract their source IDs
-        cells = await topology_and_inventory.get_nr_cell_dus(oauth_client)
-        ids = topology_and_inventory.get_sourceids_from_cells(cells)
+        # Get the source IDs of the NRCellDU entities
+        ids = (await topology_cache.get(oauth_client)).source_ids
 
         # Get attributes for the extracted source IDs (throws on failure)
         results = await ncmp.get_attributes_for_source_ids(oauth_client, ids, attribute)
@@ -103,3 +114,90 @@ async def network_configuration(attribute: str = "operationalState"):
     except HTTPStatusError as e:
         logger.error(f"{str(e.response.status_code)} HTTP Status Error from Network Configuration service - {str(e)}")
         return JSONResponse({"Error": "Network Configuration endpoint returned an error: ", "Response": str(e)}, 500)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an `If-None-Match` header matches an ETag, comparing weakly as RFC 9110 requires."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(",")
+    )
+
+
+@api_router.get("/pm-counters")
+async def pm_counters():
+    """
+    This route returns the ROPs and counters held by the PM counter store.
+    """
+    if not pm_counter_store.enabled:
+        logger.warning("404 Not Found: The PM counter store is disabled")
+        return JSONResponse({"Error": "The PM counter store is disabled."}, 404)
+    logger.info("200 OK /pm-counters")
+    return JSONResponse(
+        {
+            "ropBeginTimesInEpoch": pm_counter_store.rops(),
+            "counters": pm_counter_store.counter_names,
+            "cells": len(pm_counter_store.cell_fdns),
+        }
+    )
+
+
+@api_router.get("/pm-counters/{counter}")
+async def pm_counter_values(counter: str, rop: Optional[int] = None):
+    """
+    This route returns the value of a PM counter for each cell which reported it in a ROP.
+    The ROP is given by its `ropBeginTimeInEpoch`, and defaults to the latest ROP held.
+    """
+    if not pm_counter_store.enabled:
+        logger.warning("404 Not Found: The PM counter store is disabled")
+        return JSONResponse({"Error": "The PM counter store is disabled."}, 404)
+    rop = pm_counter_store.latest_rop() if rop is None else rop
+    if counter not in pm_counter_store.counter_names or rop not in pm_counter_store.rops():
+        logger.warning(f"404 Not Found: No values of {counter} are held for ROP {rop}")
+        return JSONResponse({"Error": f"No values of {counter} are held for ROP {rop}."}, 404)
+
+    values = pm_counter_store.counter_values(counter, rop)
+    reported = np.flatnonzero(pm_counter_store.counter_reported(counter, rop))
+    logger.info(f"200 OK /pm-counters/{counter}")
+    return JSONResponse(
+        {
+            "counter": counter,
+            "ropBeginTimeInEpoch": rop,
+            "values": {
+                pm_counter_store.cell_fdns[cell_id]: value
+                for cell_id, value in zip(reported.tolist(), values[reported].tolist())
+            },
+        }
+    )
+
+
+@api_router.get("/rop-windows")
+async def closed_rop_windows():
+    """
+    This route returns the most recently closed ROP windows, oldest first, with the cells which did not report
+    counters for each ROP and the sum of each counter over the cells which did.
+    """
+    if not rop_windows.enabled:
+        logger.warning("404 Not Found: ROP windowing is disabled")
+        return JSONResponse({"Error": "ROP windowing is disabled."}, 404)
+    logger.info("200 OK /rop-windows")
+    return JSONResponse(
+        [
+            {
+                "ropBeginTimeInEpoch": window.rop_begin_time,
+                "ropEndTimeInEpoch": window.rop_end_time,
+                "closedBy": window.closed_by,
+                "cellsReported": window.cells_reported,
+                "cells": len(window.reported),
+                "missingCells": [
+                    window.cell_fdns[cell_id]
+                    for cell_id in np.flatnonzero(~window.reported).tolist()
+                ],
+                "counters": window.counters,
+            }
+            for window in rop_windows.closed
+        ]
+    )
@@ -0,0 +1,187 @@
+"""
+This module caches Avro schemas fetched from the schema registry.
+
+- Schemas are kept in a bounded LRU, and each entry expires after a TTL.
+- Failed lookups are cached for a much shorter TTL. This stops a burst of messages with an unavailable schema from
+  turning into a burst of requests, without keeping that schema ID unusable for the life of the process.
+- Concurrent misses for the same schema ID share one lookup.
+- If a cache directory is configured, fetched schemas are also written to disk and loaded again on start-up. A schema
+  ID always refers to the same schema, so a restarted consumer can decode straight away, and it can fall back to the
+  copy on disk if the registry is unavailable.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+import avro.errors
+import avro.schema
+
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+SCHEMA_FILE_SUFFIX = ".avsc"
+# Schema IDs come from message headers, so only IDs which are safe to use as a file name are cached on disk.
+_FILE_SAFE_SCHEMA_ID = re.compile(r"[A-Za-z0-9_-][A-Za-z0-9._-]*")
+
+
+class _CacheEntry(NamedTuple):
+    schema: Optional[avro.schema.Schema]
+    expires_at: float
+
+
+class SchemaCache:
+    """
+    A bounded, expiring cache of Avro schemas keyed by schema ID.
+
+    Attributes:
+        max_size: Maximum number of schema IDs held in memory, including failed lookups.
+        ttl: Seconds a fetched schema is used before it is fetched again.
+        negative_ttl: Seconds a failed lookup is remembered before it is retried.
+        cache_dir: Directory fetched schemas are written to, or an empty string to keep them in memory only.
+        hits: Metric: Number of schema lookups answered from the cache
+        misses: Metric: Number of schema lookups which had to go to the schema registry
+    """
+
+    def __init__(
+        self, max_size: int, ttl: float, negative_ttl: float, cache_dir: str = ""
+    ):
+        self.max_size = max(max_size, 1)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache_dir = cache_dir
+        self.hits = metrics_registry.counters.get("schema_cache_hits")
+        self.misses = metrics_registry.counters.get("schema_cache_misses")
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(
+        self,
+        schema_id: str,
+        fetch: Callable[[], Awaitable[Optional[avro.schema.Schema]]],
+    ) -> Optional[avro.schema.Schema]:
+        """
+        Return the schema for an ID, calling `fetch` to look it up on a miss.
+
+        `fetch` returns None if the lookup fails, in which case the copy on disk is used if there is one.
+        """
+        entry = self._entries.get(schema_id)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(schema_id)
+            self.hits.inc()
+            return entry.schema
+
+        self.misses.inc()
+        task = self._in_flight.get(schema_id)
+        if task is None:
+            task = asyncio.create_task(self.__fetch(schema_id, fetch))
+            self._in_flight[schema_id] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(schema_id, None))
+        # Shielded so that a cancelled caller does not cancel the lookup for everyone else waiting on it.
+        return await asyncio.shield(task)
+
+    def put(
+        self,
+        schema_id: str,
+        schema: Optional[avro.schema.Schema],
+        ttl: Optional[float] = None,
+    ):
+        """Cache a schema, or a failed lookup if `schema` is None, evicting the least recently used entry if full."""
+        if ttl is None:
+            ttl = self.ttl if schema is not None else self.negative_ttl
+        self._entries[schema_id] = _CacheEntry(schema, time.monotonic() + ttl)
+        self._entries.move_to_end(schema_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def store(self, schema_id: str, schema: avro.schema.Schema):
+        """Cache a fetched schema in memory and on disk."""
+        self.put(schema_id, schema)
+        if self.__on_disk(schema_id):
+            await asyncio.to_thread(self.__write_to_disk, schema_id, schema)
+
+    def clear(self):
+        """Forget every schema held in memory. Schemas on disk are kept."""
+        self._entries.clear()
+
+    async def load_from_disk(self) -> int:
+        """Load the schemas cached on disk by a previous run into memory, returning the number loaded."""
+        if not self.cache_dir:
+            return 0
+        schemas = await asyncio.to_thread(self.__read_all_from_disk)
+        for schema_id, schema in list(schemas.items())[-self.max_size :]:
+            self.put(schema_id, schema)
+        logger.info(f"Loaded {len(schemas)} cached schemas from {self.cache_dir}")
+        return len(schemas)
+
+    async def __fetch(
+        self,
+        schema_id: str,
+        fetch: Callable[[], Awaitable[Optional[avro.schema.Schema]]],
+    ) -> Optional[avro.schema.Schema]:
+        schema = await fetch()
+        if schema is not None:
+            await self.store(schema_id, schema)
+            return schema
+
+        if self.__on_disk(schema_id):
+            schema = await asyncio.to_thread(self.__read_from_disk, schema_id)
+        if schema is not None:
+            logger.warning(f"Using the schema cached on disk for schema ID {schema_id}")
+            # Retry the registry after the negative TTL rather than trusting the disk copy for a full TTL.
+            self.put(schema_id, schema, self.negative_ttl)
+        else:
+            self.put(schema_id, None)
+        return schema
+
+    def __on_disk(self, schema_id: str) -> bool:
+        return bool(self.cache_dir) and _FILE_SAFE_SCHEMA_ID.fullmatch(schema_id) is not None
+
+    def __path(self, schema_id: str) -> str:
+        return os.path.join(self.cache_dir, f"{schema_id}{SCHEMA_FILE_SUFFIX}")
+
+    def __write_to_disk(self, schema_id: str, schema: avro.schema.Schema):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temporary_path = self.__path(schema_id) + ".tmp"
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                f.write(str(schema))
+            os.replace(temporary_path, self.__path(schema_id))
+        except OSError as e:
+            logger.warning(f"Unable to write schema ID {schema_id} to {self.cache_dir}: {e}")
+
+    def __read_from_disk(self, schema_id: str) -> Optional[avro.schema.Schema]:
+        try:
+            with open(self.__path(schema_id), "r", encoding="utf-8") as f:
+                return avro.schema.parse(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, avro.errors.SchemaParseException) as e:
+            logger.warning(f"Ignoring unreadable cached schema ID {schema_id}: {e}")
+            return None
+
+    def __read_all_from_disk(self) -> dict[str, avro.schema.Schema]:
+        try:
+            entries = sorted(
+                (
+                    entry
+                    for entry in os.scandir(self.cache_dir)
+                    if entry.name.endswith(SCHEMA_FILE_SUFFIX)
+                ),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+        except FileNotFoundError:
+            return {}
+        schemas = {}
+        for entry in entries:
+            schema_id = entry.name.removesuffix(SCHEMA_FILE_SUFFIX)
+            schema = self.__read_from_disk(schema_id)
+            if schema is not None:
+                schemas[schema_id] = schema
+        return schemas
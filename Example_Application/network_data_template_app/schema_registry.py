@@ -6,26 +6,57 @@ More details:
 """
 
 # Standard library imports
-import io
-from typing import Optional
+from functools import partial
+from typing import Iterable, Optional
 
 # Third-party imports
-import avro.io
 import avro.errors
 import avro.schema
-from async_lru import alru_cache
 from authlib.integrations.base_client import MissingTokenError
 from authlib.integrations.httpx_client import AsyncOAuth2Client
-from httpx import HTTPStatusError
+from httpx import HTTPStatusError, RequestError, Response
 
 # Local application imports
+from .avro_decoder import decoder_registry
+from .config import get_config
 from .mtls_logging import logger
 from .metrics import metrics_registry
+from .retry_policy import retry_policies
+from .schema_cache import SchemaCache
+
+config = get_config()
+
+schema_cache = SchemaCache(
+    int(config.get("schema_cache_size")),
+    float(config.get("schema_cache_ttl")),
+    float(config.get("schema_cache_negative_ttl")),
+    config.get("schema_cache_dir"),
+)
 
 
-@alru_cache
 async def get_schema(
     iam_base_url: str, client: AsyncOAuth2Client, schema_id: str
+) -> Optional[avro.schema.Schema]:
+    """
+    Get the Avro schema associated with a given schema ID, from `schema_cache` or else from the schema registry.
+
+    Args:
+        iam_base_url (str): IAM base url.
+        client (AsyncOAuth2Client): The OAuth2 client used for authenticating and communicating
+        with the schema registry.
+        schema_id (str): A unique identifier for the schema to be retrieved.
+
+    Returns:
+        avro.schema.Schema | None: The Avro schema if cached or successfully fetched,
+        or None if it is unavailable.
+    """
+    return await schema_cache.get(
+        schema_id, partial(fetch_schema, iam_base_url, client, schema_id)
+    )
+
+
+async def fetch_schema(
+    iam_base_url: str, client: AsyncOAuth2Client, schema_id: str
 ) -> Optional[avro.schema.Schema]:
     """
     Fetches the Avro schema associated with a given schema ID from the schema registry.
@@ -43,21 +74,52 @@ async def get_schema(
         avro.schema.Schema | None: The Avro schema if successfully fetched,
         or None if an error occurs during retrieval.
     """
-    try:
-        schema_registry_url = iam_base_url + "/schema-registry-sr"
-        schema_response = await client.request(
-            "GET", f"{schema_registry_url}/view/schemas/ids/{schema_id}"
-        )
+    schema_response = await _request_schema(client, iam_base_url, f"schemas/ids/{schema_id}")
+    if schema_response is None:
+        return None
+    # Parse the retrieved JSON schema and return it
+    return avro.schema.parse(schema_response["schema"])
+
+
+async def prefetch_schema(
+    iam_base_url: str, client: AsyncOAuth2Client, subject: str
+) -> Optional[str]:
+    """
+    Fetch the latest schema registered under a subject, such as the `dataDeliverySchemaId` of a data job, into
+    `schema_cache`, so that the first messages consumed do not wait on the schema registry.
 
+    Returns:
+        str | None: The schema ID of the prefetched schema, or None if it could not be fetched.
+    """
+    schema_response = await _request_schema(
+        client, iam_base_url, f"subjects/{subject}/versions/latest"
+    )
+    if schema_response is None:
+        return None
+    schema_id = str(schema_response["id"])
+    await schema_cache.store(schema_id, avro.schema.parse(schema_response["schema"]))
+    logger.debug(f"Prefetched schema ID {schema_id} for subject {subject}")
+    return schema_id
+
+
+async def _request_schema(
+    client: AsyncOAuth2Client, iam_base_url: str, path: str
+) -> Optional[dict]:
+    """Make a request to the schema registry, returning the JSON response or None if the request failed."""
+    schema_registry_url = iam_base_url + "/schema-registry-sr"
+
+    async def request() -> Response:
+        response = await client.request("GET", f"{schema_registry_url}/view/{path}")
         # Check if the HTTP request was successful (status code 200)
-        if not schema_response.is_success:
+        if not response.is_success:
             metrics_registry.counters.get("schema_registry_failed_requests").inc()
-            schema_response.raise_for_status()
-        metrics_registry.counters.get("schema_registry_successful_requests").inc()
+            response.raise_for_status()
+        return response
 
-        # Parse the retrieved JSON schema and return it
-        schema = avro.schema.parse(schema_response.json()["schema"])
-        return schema
+    try:
+        schema_response = await retry_policies["schema_registry"].call(request)
+        metrics_registry.counters.get("schema_registry_successful_requests").inc()
+        return schema_response.json()
 
     except HTTPStatusError as http_err:
         # Log an error message for timeout issues
@@ -69,39 +131,46 @@ async def get_schema(
         logger.error(
             f"Missing token while fetching schema from schema registry {missing_token}"
         )
+    except RequestError as request_err:
+        # Log an error message for connection errors, timeouts and an open circuit breaker
+        logger.error(
+            f"Request error while fetching schema from schema registry {request_err}"
+        )
     return None
 
 
 def deserialize_message(
-    avro_value: bytes, schema: avro.schema.Schema, schema_id: str
+    avro_value: bytes,
+    schema: avro.schema.Schema,
+    schema_id: str,
+    fields: Optional[Iterable[str]] = None,
 ) -> Optional[dict]:
     """
     Deserializes an Avro-encoded message into a Python dictionary based on the provided schema.
 
     This function takes an Avro-encoded message, validates it against the given schema,
-    and deserializes it into a dictionary for further processing.
+    and deserializes it into a dictionary for further processing. The schema is compiled into
+    a decoder once per schema ID, and that decoder is reused for later messages.
 
     Args:
         avro_value (bytes): The Avro-encoded message in binary format to be deserialized.
         schema (avro.schema.Schema): The Avro schema used to validate and deserialize the message.
         schema_id (str): The unique identifier for the schema used in validation.
+        fields (Iterable[str], optional): The top-level fields to decode. Other fields are skipped
+        and returned as `LazyField` placeholders. Decodes every field if not given.
 
     Returns:
         Optional[dict]: A dictionary representing the deserialized message if successful,
         or None if deserialization fails or an error occurs.
     """
     try:
-        # Initialize a BinaryDecoder to parse the Avro-encoded binary data.
-        # This is required for decoding serialized Avro messages into structured records.
-        value_reader = avro.io.BinaryDecoder(io.BytesIO(avro_value))
-
-        # Set up a DatumReader that will use the provided schema to interpret the binary data.
-        # This ensures that the deserialized message aligns with the expected Avro structure.
-        reader = avro.io.DatumReader(schema)
+        # Look up the decoder compiled for this schema ID, compiling it on first use.
+        # This avoids re-walking the schema with a generic DatumReader for every message.
+        decoder = decoder_registry.get_decoder(schema_id, schema, fields)
 
-        # Deserialize the Avro binary data into a Python object using the provided schema.
+        # Deserialize the Avro binary data into a Python object using the compiled decoder.
         # This converts the raw Avro bytes into a usable dictionary-like structure.
-        deserialized_value = reader.read(value_reader)
+        deserialized_value = decoder.decode(avro_value)
         return deserialized_value
 
     except avro.errors.AvroTypeException as avro_type_err:
@@ -4,15 +4,22 @@ This script should not be run standalone.
 In order to run the application, pass the app instance to an ASGI server.
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from .message_bus_consumer import MessageBusConsumer, start_message_bus_consumer
+from .counter_store import pm_counter_store
+from .message_bus_consumer import (
+    counter_presence,
+    create_message_bus_consumers,
+    start_message_bus_consumers,
+)
 from .mtls_logging import logger
 from .oauth import oauth, synchronous_oauth
 from .routes import api_router, healthcheck_router
 from .report_generator import ReportGenerator
+from .snapshot import consumer_snapshot
 
 
 @asynccontextmanager
@@ -31,13 +38,28 @@ async def lifespan(fastapi_app: FastAPI):
     synchronous_oauth.setup_client()
     synchronous_client = synchronous_oauth.get_oauth_client()
     asynchronous_client = await oauth.get_oauth_client()
-    message_bus_consumer = MessageBusConsumer(synchronous_client, asynchronous_client)
+    message_bus_consumers = create_message_bus_consumers(
+        synchronous_client, asynchronous_client
+    )
 
-    consumer_task = await start_message_bus_consumer(message_bus_consumer)
+    consumer_tasks = await start_message_bus_consumers(message_bus_consumers)
 
-    report_generator = ReportGenerator(asynchronous_client)
+    counter_shards = [
+        message_bus_consumer.counter_shards
+        for message_bus_consumer in message_bus_consumers
+        if message_bus_consumer.counter_shards is not None
+    ]
+    report_generator = ReportGenerator(
+        asynchronous_client, counter_shards=counter_shards
+    )
     report_generator.start_schedule(trigger="interval", minutes=15)
 
+    snapshot_task = None
+    if consumer_snapshot.enabled and consumer_snapshot.interval > 0:
+        snapshot_task = asyncio.create_task(
+            consumer_snapshot.run(counter_presence, pm_counter_store, counter_shards)
+        )
+
     fastapi_app.state.is_ready = True
     logger.info("Network Data Template App is now ready")
 
@@ -46,7 +68,13 @@ async def lifespan(fastapi_app: FastAPI):
     logger.info("Network Data Template App is shutting down.")
 
     report_generator.stop_schedule()
-    consumer_task.cancel()
+    tasks = consumer_tasks + ([snapshot_task] if snapshot_task is not None else [])
+    for task in tasks:
+        task.cancel()
+    # Let the consumers commit and close, and any snapshot in progress finish, before the final snapshot is taken.
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if consumer_snapshot.enabled:
+        await consumer_snapshot.save(counter_presence, pm_counter_store, counter_shards)
     await oauth.close_client()
     synchronous_oauth.close_client()
 
@@ -0,0 +1,320 @@
+"""
+This module saves the consumer's per-cell state to a local file, so that a restarted consumer can resume without waiting
+on Topology & Inventory.
+
+The snapshot holds the FDN of each interned cell ID, as fetched from Topology & Inventory, the cells PM counters were
+received for in the current report, and the counter store if it is enabled. It is laid out as:
+- an 8 byte magic number, followed by the length of the header as a little-endian 64-bit integer,
+- a JSON header describing the cells, the counter store and where each array starts,
+- the arrays, each aligned to 64 bytes: the counter presence packed at 1 bit per cell, then the counter values and
+  the bitmask of the counters received.
+
+The file is written to a temporary file which then replaces the previous snapshot, so a crash mid-write leaves the
+previous snapshot intact. The counter store is copied a chunk of cells at a time, each chunk written in a separate
+thread before the next is copied, so the event loop is only held for one chunk and at most one chunk is held twice. On start-up the file is memory-mapped copy-on-write, and the counter values are used straight
+from the mapping, so only the pages which are read or written are loaded from disk.
+
+Avro schemas are not part of the snapshot, as the schema cache already keeps them on disk. Offsets are not part of it
+either, as the consumer group resumes from the offsets committed to Kafka.
+"""
+
+import asyncio
+import json
+import mmap
+import os
+import struct
+import time
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+
+from .config import get_config
+from .counter_shards import CounterStatusShards
+from .counter_store import VALUE_DTYPE, PmCounterStore
+from .counter_presence import CounterPresence
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+SNAPSHOT_MAGIC = b"NDTSNAP2"
+SNAPSHOT_FILE_NAME = "consumer-state.snapshot"
+_PREAMBLE = struct.Struct("<8sQ")
+_ALIGNMENT = 64
+# Bytes of the counter store copied on the event loop at a time.
+SNAPSHOT_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file cannot be read."""
+
+
+class _SnapshotState(NamedTuple):
+    """The state saved, with the live arrays of the counter store, which are copied a chunk at a time."""
+
+    cell_fdns: list[str]
+    received: np.ndarray
+    counter_names: list[str]
+    rop_slots: dict[int, int]
+    values: Optional[np.ndarray]
+    reported: Optional[np.ndarray]
+
+    def changed(self, counter_store: PmCounterStore) -> bool:
+        """Whether the counter store was reallocated, took over a ROP slot or added a counter since this was taken."""
+        return (
+            counter_store.values is not self.values
+            or counter_store.reported is not self.reported
+            or counter_store.rop_slots() != self.rop_slots
+            or len(counter_store.counter_names) != len(self.counter_names)
+        )
+
+
+class ConsumerSnapshot:
+    """
+    Periodic snapshots of `counter_presence` and the counter store.
+
+    With no snapshot directory, snapshots are disabled.
+
+    Attributes:
+        snapshot_dir: Directory the snapshot file is written to, or an empty string to disable snapshots.
+        interval: Seconds between snapshots. With zero, a snapshot is only written on shutdown.
+        size: Metric: Bytes written to the latest snapshot
+        write_duration: Metric: Seconds taken to write a snapshot, including capturing the state
+    """
+
+    def __init__(self, snapshot_dir: str, interval: float):
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self.size = metrics_registry.gauges.get("consumer_snapshot_size_bytes")
+        self.write_duration = metrics_registry.histograms.get(
+            "consumer_snapshot_write_duration_seconds"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Whether consumer state is saved and restored."""
+        return bool(self.snapshot_dir)
+
+    @property
+    def path(self) -> str:
+        """The path of the snapshot file."""
+        return os.path.join(self.snapshot_dir, SNAPSHOT_FILE_NAME)
+
+    async def run(
+        self,
+        counter_presence: CounterPresence,
+        counter_store: PmCounterStore,
+        counter_shards: Iterable[CounterStatusShards] = (),
+    ):
+        """Save a snapshot every `interval` seconds until cancelled. The state arguments are those of `save`."""
+        logger.debug(f"Saving consumer snapshots every {self.interval} seconds")
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save(counter_presence, counter_store, counter_shards)
+
+    async def save(
+        self,
+        counter_presence: CounterPresence,
+        counter_store: PmCounterStore,
+        counter_shards: Iterable[CounterStatusShards] = (),
+    ):
+        """
+        Save the consumer state to the snapshot file.
+
+        The presence in the shards of every consumer worker is merged into the presence saved. The counter store is
+        copied on the event loop a chunk of cells at a time, each chunk being written in a separate thread before the
+        next is copied. Consumption carries on in between, so later chunks may hold counters received during the save.
+        If the counter store takes over a ROP slot, adds a counter or is reallocated meanwhile, the chunks would no
+        longer agree, so the save is abandoned and the previous snapshot kept until the next one.
+        """
+        start_time = time.perf_counter()
+        received = counter_presence.peek()
+        for shards in counter_shards:
+            received |= shards.collected()
+        state = _SnapshotState(
+            list(counter_presence.cell_fdns),
+            received,
+            list(counter_store.counter_names),
+            counter_store.rop_slots(),
+            counter_store.values if counter_store.enabled else None,
+            counter_store.reported if counter_store.enabled else None,
+        )
+        try:
+            snapshot_file = await asyncio.to_thread(_SnapshotFile, self.snapshot_dir, self.path, state)
+        except OSError as e:
+            logger.warning(f"Unable to write the consumer snapshot to {self.path}: {e}")
+            return
+        try:
+            if state.values is not None:
+                rows = max(SNAPSHOT_CHUNK_BYTES // max(state.values[0:1].nbytes, 1), 1)
+                for start in range(0, len(state.values), rows):
+                    if state.changed(counter_store):
+                        logger.info(
+                            "The PM counter store changed while the consumer snapshot was saved, keeping the "
+                            "previous snapshot"
+                        )
+                        return
+                    await asyncio.to_thread(
+                        snapshot_file.write_rows,
+                        start,
+                        state.values[start : start + rows].copy(),
+                        state.reported[start : start + rows].copy(),
+                    )
+            size = await asyncio.to_thread(snapshot_file.commit)
+        except OSError as e:
+            logger.warning(f"Unable to write the consumer snapshot to {self.path}: {e}")
+            return
+        finally:
+            snapshot_file.discard()
+        self.size.set(size)
+        self.write_duration.observe(time.perf_counter() - start_time)
+        logger.debug(f"Saved a {size} byte consumer snapshot to {self.path}")
+
+    def restore(
+        self, counter_presence: CounterPresence, counter_store: PmCounterStore
+    ) -> Optional[list[str]]:
+        """
+        Restore `counter_presence` and the counter store from the snapshot file, returning the FDN of each cell ID.
+
+        Returns None, restoring nothing, if there is no snapshot or it cannot be read. The counter store is allocated
+        empty instead if the snapshot has no counter values of the configured size.
+        """
+        if not self.enabled:
+            return None
+        try:
+            header, mapped = self.__map()
+            cell_fdns = header["cell_fdns"]
+            presence = header["arrays"]["presence"]
+            received = np.unpackbits(
+                np.frombuffer(mapped, np.uint8, presence["size"], presence["offset"]),
+                count=len(cell_fdns),
+                bitorder="little",
+            ).astype(bool)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, SnapshotError) as e:
+            logger.warning(f"Ignoring unreadable consumer snapshot {self.path}: {e}")
+            return None
+        counter_presence.restore(cell_fdns, received)
+
+        if counter_store.enabled:
+            try:
+                values = header["arrays"].get("counter_values")
+                reported = header["arrays"].get("counter_reported")
+                if values is None or reported is None:
+                    raise ValueError("the snapshot holds no counter values")
+                counter_store.restore(
+                    cell_fdns,
+                    header["counter_names"],
+                    {int(rop): slot for rop, slot in header["rop_slots"].items()},
+                    _mapped_array(mapped, values, VALUE_DTYPE),
+                    _mapped_array(mapped, reported, np.uint8),
+                )
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Not restoring the PM counter store from the snapshot: {e}")
+                counter_store.allocate(cell_fdns)
+
+        logger.info(
+            f"Restored the consumer state of {len(cell_fdns)} cells from a snapshot taken at "
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(header['written_at']))} (UTC)"
+        )
+        return cell_fdns
+
+    def __map(self) -> tuple[dict, mmap.mmap]:
+        """
+        Memory-map the snapshot file copy-on-write, returning its header and the mapping of its arrays.
+
+        Array offsets in the returned header are relative to the start of the mapping.
+        """
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        if len(mapped) < _PREAMBLE.size:
+            raise SnapshotError("The file is too short")
+        magic, header_length = _PREAMBLE.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC:
+            raise SnapshotError("The file is not a consumer snapshot")
+        header = json.loads(mapped[_PREAMBLE.size : _PREAMBLE.size + header_length])
+        data_start = _aligned(_PREAMBLE.size + header_length)
+        for array in header["arrays"].values():
+            array["offset"] += data_start
+        return header, mapped
+
+
+class _SnapshotFile:
+    """
+    A snapshot being written to a temporary file, which replaces the previous snapshot once it is complete.
+
+    The header and presence are written when it is created, and the counter store is then written a chunk of cells at
+    a time. Every method blocks, so is called in a separate thread.
+    """
+
+    def __init__(self, snapshot_dir: str, path: str, state: _SnapshotState):
+        self.path = path
+        arrays = {"presence": np.packbits(state.received, bitorder="little")}
+        if state.values is not None:
+            arrays["counter_values"] = state.values
+            arrays["counter_reported"] = state.reported
+        self.header = {
+            "written_at": time.time(),
+            "cell_fdns": state.cell_fdns,
+            "counter_names": state.counter_names,
+            "rop_slots": {str(rop): slot for rop, slot in state.rop_slots.items()},
+            "arrays": {},
+        }
+        offset = 0
+        for name, array in arrays.items():
+            self.header["arrays"][name] = {
+                "offset": offset,
+                "size": array.size,
+                "shape": list(array.shape),
+            }
+            offset = _aligned(offset + array.nbytes)
+        encoded_header = json.dumps(self.header).encode("utf-8")
+        self.data_start = _aligned(_PREAMBLE.size + len(encoded_header))
+
+        os.makedirs(snapshot_dir, exist_ok=True)
+        self.file = open(self.path + ".tmp", "wb")  # pylint: disable=consider-using-with
+        self.file.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, len(encoded_header)))
+        self.file.write(encoded_header)
+        self.__write_array("presence", 0, arrays["presence"])
+
+    def write_rows(self, start: int, values: np.ndarray, reported: np.ndarray):
+        """Write the counter values and bitmask of the cells from cell ID `start` on."""
+        self.__write_array("counter_values", start, values)
+        self.__write_array("counter_reported", start, reported)
+
+    def commit(self) -> int:
+        """Replace the previous snapshot with this one, returning its size in bytes."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        size = self.file.tell()
+        self.file.close()
+        os.replace(self.file.name, self.path)
+        return size
+
+    def discard(self):
+        """Remove the temporary file unless it was committed, keeping the previous snapshot."""
+        if self.file.closed:
+            return
+        self.file.close()
+        os.remove(self.file.name)
+
+    def __write_array(self, name: str, start: int, rows: np.ndarray):
+        if len(rows) == 0:
+            return
+        row_bytes = rows.nbytes // len(rows)
+        self.file.seek(self.data_start + self.header["arrays"][name]["offset"] + start * row_bytes)
+        self.file.write(rows.tobytes())
+
+
+def _mapped_array(mapped: mmap.mmap, array: dict, dtype: type) -> np.ndarray:
+    return np.frombuffer(mapped, dtype, int(np.prod(array["shape"])), array["offset"]).reshape(
+        array["shape"]
+    )
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+consumer_snapshot = ConsumerSnapshot(
+    get_config().get("snapshot_dir"), float(get_config().get("snapshot_interval"))
+)
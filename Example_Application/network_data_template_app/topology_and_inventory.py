@@ -9,14 +9,21 @@ Modules:
 - config: Retrieves configuration settings.
 """
 
-import time
+import asyncio
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Awaitable
 
 from authlib.integrations.httpx_client import AsyncOAuth2Client
-from httpx import HTTPStatusError
+from httpx import HTTPStatusError, Response
 
 from .mtls_logging import logger
 from .config import get_config
 from .metrics import metrics_registry
+from .retry_policy import retry_policies
+
+# The `limit` Topology & Inventory applies when none is given. It accepts any `limit` of at least 1.
+DEFAULT_PAGE_SIZE = 500
 
 
 async def get_nr_cell_dus(
@@ -31,44 +38,85 @@ async def get_nr_cell_dus(
     Raises:
         HTTPError: If an error occurs in fetching NRCellDU entities.
     """
-    # Construct Authorization header for the request
+    page = await _get_nr_cell_du_page(client, f"limit={limit}")
+    return page["items"]
+
+
+async def iter_nr_cell_du_pages(
+    client: AsyncOAuth2Client, page_size: int = DEFAULT_PAGE_SIZE, concurrency: int = 4
+) -> AsyncIterator[list[dict[str, object]]]:
+    """
+    Retrieve every NRCellDU entity, yielding them one page at a time, in order.
+
+    The first page gives the total number of entities, and the remaining pages are then fetched by their offset, with
+    up to `concurrency` requests in flight. At most `concurrency` pages are held at once, however large the inventory.
+    If the total is not reported, pages are fetched one after another until a page is not full.
 
+    Args:
+        client (AsyncOAuth2Client): The client for API requests.
+        page_size (int): Number of entities per page, at least 1.
+        concurrency (int): Maximum number of pages requested at once.
+
+    Raises:
+        HTTPError: If an error occurs in fetching a page.
+    """
+    page_size = max(page_size, 1)
+
+    def get_page(offset: int) -> Awaitable[dict[str, object]]:
+        return _get_nr_cell_du_page(client, f"offset={offset}&limit={page_size}")
+
+    first_page = await get_page(0)
+    yield first_page["items"]
+    total_count = first_page.get("totalCount")
+    if total_count is None:
+        offset, items = page_size, first_page["items"]
+        while len(items) == page_size:
+            items = (await get_page(offset))["items"]
+            offset += page_size
+            yield items
+        return
+
+    offsets = iter(range(page_size, total_count, page_size))
+    in_flight = deque(
+        asyncio.create_task(get_page(offset)) for offset in islice(offsets, max(concurrency, 1))
+    )
+    try:
+        while in_flight:
+            page = await in_flight.popleft()
+            for offset in islice(offsets, 1):
+                in_flight.append(asyncio.create_task(get_page(offset)))
+            yield page["items"]
+    finally:
+        for task in in_flight:
+            task.cancel()
+
+
+async def _get_nr_cell_du_page(client: AsyncOAuth2Client, query: str) -> dict[str, object]:
+    """Retrieve a page of NRCellDU entities, retrying failed requests. `query` holds the paging parameters."""
     # Build URL for request
     topology_and_inventory_base_url = (
         get_config()["iam_base_url"] + "/topology-inventory/v1alpha11"
     )
 
-    url = f"{topology_and_inventory_base_url}/domains/RAN/entity-types/NRCellDU/entities?targetFilter=/sourceIds&limit={limit}"
+    url = f"{topology_and_inventory_base_url}/domains/RAN/entity-types/NRCellDU/entities?targetFilter=/sourceIds&{query}"
 
     logger.debug(f"Getting cells from {url}")
 
-    max_retries = int(get_config().get("max_retries"))
-    retry_delay = int(get_config().get("retry_delay"))
-    response = None
-    for attempt in range(max_retries):
+    async def request() -> Response:
+        response = await client.request("GET", url)
         try:
-            response = await client.request("GET", url)
             response.raise_for_status()
-            break
-        except HTTPStatusError as e:
+        except HTTPStatusError:
             metrics_registry.counters.get("topology_failed_requests").inc()
-            if attempt < max_retries - 1:
-                logger.error(
-                    (
-                        f"Could not retrieve topology data."
-                        f" {e} Retrying... ({attempt + 1}/{max_retries})"
-                    )
-                )
-                time.sleep(retry_delay * (2**attempt))
-            else:
-                raise e
+            raise
+        return response
 
+    response = await retry_policies["topology"].call(request)
     metrics_registry.counters.get("topology_successful_requests").inc()
-    logger.debug(
-        f"Retrieved {len(response.json()['items'])} items from Topology & Inventory"
-    )
+    page = response.json()
+    logger.debug(f"Retrieved {len(page['items'])} items from Topology & Inventory")
 
-    return response.json()["items"]
+    return page
 
 
 def get_sourceids_from_cells(cells: list[dict[str, object]]) -> list[str]:
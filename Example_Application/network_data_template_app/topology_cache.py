@@ -0,0 +1,169 @@
+"""
+This module caches the cells fetched from Topology & Inventory, for the `/topology` and `/network-configuration`
+routes and the Message Bus consumer.
+
+- `topology_cache` holds the first 10 NRCellDU entities, as the JSON body served by `/topology` with an ETag, and their
+  source IDs for `/network-configuration`.
+- `cell_cache` holds the source IDs of the cells the consumer monitors: those of every page of the inventory when
+  `TOPOLOGY_PAGE_SIZE` is set, extracted as each page arrives so that only a few pages of entities are held at once,
+  otherwise those of `topology_cache`. No encoded copy of the inventory is kept.
+- A fetched value is used for a TTL. For a further stale TTL, the previous value is still returned at once while it is
+  refreshed in the background. Past that, callers wait for the refresh.
+- Concurrent refreshes share one set of requests to Topology & Inventory, so the load on it does not grow with the
+  request rate.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from typing import Awaitable, Callable, Generic, NamedTuple, Optional, TypeVar
+
+from authlib.integrations.httpx_client import AsyncOAuth2Client
+
+from . import topology_and_inventory
+from .config import get_config
+from .metrics import metrics_registry
+from .mtls_logging import logger
+
+T = TypeVar("T")
+
+
+class Topology(NamedTuple):
+    """
+    The first NRCellDU entities fetched from Topology & Inventory.
+
+    Attributes:
+        body: The NRCellDU entities, as a JSON array encoded in UTF-8.
+        etag: A strong ETag of `body`, including its quotes.
+        source_ids: The source IDs of the cells, in order.
+    """
+
+    body: bytes
+    etag: str
+    source_ids: list[str]
+
+
+async def fetch_topology(client: AsyncOAuth2Client) -> Topology:
+    """
+    Fetch the first 10 cells from Topology & Inventory.
+
+    Raises:
+        HTTPError: If an error occurs in fetching NRCellDU entities.
+    """
+    cells = await topology_and_inventory.get_nr_cell_dus(client)
+    # Encoded as by JSONResponse.
+    body = json.dumps(cells, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+    return Topology(
+        body,
+        f'"{hashlib.sha256(body).hexdigest()}"',
+        topology_and_inventory.get_sourceids_from_cells(cells),
+    )
+
+
+async def fetch_cell_source_ids(client: AsyncOAuth2Client) -> list[str]:
+    """
+    Fetch the source IDs of the cells to monitor from Topology & Inventory.
+
+    With a topology page size, every cell of the inventory is fetched page by page, and the source IDs of each page
+    are extracted as it arrives, so the entities of only a few pages are held at once. Otherwise, the source IDs of
+    the first 10 cells are taken from `topology_cache`.
+
+    Raises:
+        HTTPError: If an error occurs in fetching NRCellDU entities.
+    """
+    config = get_config()
+    page_size = int(config.get("topology_page_size"))
+    if page_size <= 0:
+        return (await topology_cache.get(client)).source_ids
+    source_ids = []
+    async for cells in topology_and_inventory.iter_nr_cell_du_pages(
+        client, page_size, int(config.get("topology_page_concurrency"))
+    ):
+        source_ids += topology_and_inventory.get_sourceids_from_cells(cells)
+    return source_ids
+
+
+class TopologyCache(Generic[T]):
+    """
+    An expiring cache of a value fetched from Topology & Inventory.
+
+    Attributes:
+        fetch: Fetches the value with an OAuth client.
+        ttl: Seconds a fetched value is used before it is refreshed.
+        stale_ttl: Seconds past the TTL during which the previous value is returned while it is refreshed.
+        hits: Metric: Number of lookups answered from the cache, including stale answers
+        misses: Metric: Number of lookups which waited for Topology & Inventory
+        refresh_failures: Metric: Number of refreshes which failed
+    """
+
+    def __init__(
+        self, fetch: Callable[[AsyncOAuth2Client], Awaitable[T]], ttl: float, stale_ttl: float
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = metrics_registry.counters.get("topology_cache_hits")
+        self.misses = metrics_registry.counters.get("topology_cache_misses")
+        self.refresh_failures = metrics_registry.counters.get("topology_cache_refresh_failures")
+        self._value: Optional[T] = None
+        self._fetched_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def get(self, client: AsyncOAuth2Client) -> T:
+        """
+        Return the cached value, refreshing it with `client` once it has expired.
+
+        Raises:
+            HTTPError: If the value has to be fetched, or its stale TTL has passed, and the refresh fails.
+        """
+        age = time.monotonic() - self._fetched_at
+        if self._value is not None and age < self.ttl + self.stale_ttl:
+            self.hits.inc()
+            if age >= self.ttl:
+                self._refresh(client)
+            return self._value
+
+        self.misses.inc()
+        # Shielded so that a cancelled caller does not cancel the refresh for everyone else waiting on it.
+        return await asyncio.shield(self._refresh(client))
+
+    def clear(self):
+        """Forget the cached value, and any refresh in progress, so that the next lookup fetches it again."""
+        self._value = None
+        self._fetched_at = 0.0
+        self._refresh_task = None
+
+    def _refresh(self, client: AsyncOAuth2Client) -> asyncio.Task:
+        """Start refreshing the value, unless a refresh is already in progress, returning the refresh."""
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self.__fetch(client))
+            self._refresh_task.add_done_callback(self.__refreshed)
+        return self._refresh_task
+
+    async def __fetch(self, client: AsyncOAuth2Client) -> T:
+        value = await self.fetch(client)
+        if self._value is not None and value != self._value:
+            logger.info("The cells in Topology & Inventory changed")
+        self._value, self._fetched_at = value, time.monotonic()
+        return value
+
+    def __refreshed(self, task: asyncio.Task):
+        self._refresh_task = None
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_failures.inc()
+            logger.warning(f"Unable to refresh the cells from Topology & Inventory: {task.exception()}")
+
+
+config = get_config()
+
+topology_cache: TopologyCache[Topology] = TopologyCache(
+    fetch_topology,
+    float(config.get("topology_cache_ttl")),
+    float(config.get("topology_cache_stale_ttl")),
+)
+cell_cache: TopologyCache[list[str]] = TopologyCache(
+    fetch_cell_source_ids,
+    float(config.get("topology_cache_ttl")),
+    float(config.get("topology_cache_stale_ttl")),
+)
@@ -5,6 +5,7 @@ import json
 import os
 import pickle
 import re
+import time
 from unittest.mock import AsyncMock, MagicMock, patch
 from urllib.parse import urljoin
 
@@ -13,7 +14,12 @@ import pytest
 import pytest_asyncio
 import respx
 from authlib.integrations.httpx_client import AsyncOAuth2Client, OAuth2Client
-from confluent_kafka import KafkaError, KafkaException
+from confluent_kafka import (
+    KafkaError,
+    KafkaException,
+    TIMESTAMP_CREATE_TIME,
+    TIMESTAMP_NOT_AVAILABLE,
+)
 from fastapi.testclient import TestClient
 from httpx import Response
 
@@ -23,7 +29,9 @@ from network_data_template_app.message_bus_consumer import MessageBusConsumer
 from network_data_template_app.metrics import metrics_registry
 from network_data_template_app.mtls_logging import _MTLSLogger, _ConsoleLogger, Severity
 from network_data_template_app.oauth import oauth, synchronous_oauth
+from network_data_template_app.retry_policy import retry_policies
 from network_data_template_app.server import app as test_app
+from network_data_template_app.topology_cache import cell_cache, topology_cache
 
 
 def pytest_generate_tests():
@@ -35,6 +43,22 @@ def reset_counters():
         counter.reset()
 
 
+@pytest.fixture(autouse=True)
+def reset_retry_policies():
+    """Keep failed requests from opening a circuit breaker or spending a retry budget for later tests."""
+    yield
+    for retry_policy in retry_policies.values():
+        retry_policy.reset()
+
+
+@pytest.fixture(autouse=True)
+def clear_topology_cache():
+    """Keep the cells fetched by one test from being served to later tests."""
+    yield
+    topology_cache.clear()
+    cell_cache.clear()
+
+
 @pytest.fixture(name="mock_apis")
 def fixture_mock_apis(config):
     """Setup mock APIs"""
@@ -454,6 +478,12 @@ def kafka_consumer_with_valid_messages():
         msg5,
         msg6,
     ]
+    for offset, msg in enumerate(consumer.consume.return_value):
+        msg.timestamp.return_value = (TIMESTAMP_NOT_AVAILABLE, 0)
+        msg.topic.return_value = "pm"
+        msg.partition.return_value = 0
+        msg.offset.return_value = offset
+    msg3.timestamp.return_value = (TIMESTAMP_CREATE_TIME, time.time() * 1000 - 1500)
 
     yield consumer
 
@@ -474,6 +504,7 @@ def kafka_consumer_with_err_messages():
     msg1 = MagicMock()
     msg1.value.return_value = b"Message 1"
     msg1.error.return_value = None
+    msg1.timestamp.return_value = (TIMESTAMP_NOT_AVAILABLE, 0)
 
     msg_error = MagicMock()
     msg_error.value.return_value = None
@@ -534,7 +565,7 @@ async def message_bus_consumer_consumes_valid_messages(
 ):
     """Async fixture for MessageBusConsumer that consumes valid messages."""
     with patch(
-        "network_data_template_app.message_bus_consumer.get_nr_cell_dus",
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
         new_callable=AsyncMock,
     ) as mock_get_nr_cell_dus:
         mock_get_nr_cell_dus.return_value = get_topology_get_nr_cell_dus_response
@@ -555,7 +586,7 @@ async def message_bus_consumer_consumes_no_messages(
 ):
     """Async fixture for MessageBusConsumer that consumes no messages."""
     with patch(
-        "network_data_template_app.message_bus_consumer.get_nr_cell_dus",
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
         new_callable=AsyncMock,
     ) as mock_get_nr_cell_dus:
         mock_get_nr_cell_dus.return_value = get_topology_get_nr_cell_dus_response
@@ -0,0 +1,176 @@
+# pylint: disable=W0613
+# W0613: Unused argument
+"""Tests for the compiled Avro decoders in avro_decoder.py"""
+
+import datetime
+import io
+import json
+import pickle
+
+import avro.errors
+import avro.io
+import avro.schema
+import pytest
+
+from network_data_template_app.avro_decoder import (
+    CompiledDecoder,
+    DecoderRegistry,
+    LazyField,
+)
+from network_data_template_app.message_bus_consumer import AVRO_MAGIC_BYTE_COUNT
+
+ALL_TYPES_SCHEMA = avro.schema.parse(
+    json.dumps(
+        {
+            "type": "record",
+            "name": "AllTypes",
+            "fields": [
+                {"name": "null", "type": "null"},
+                {"name": "boolean", "type": "boolean"},
+                {"name": "int", "type": "int"},
+                {"name": "long", "type": "long"},
+                {"name": "float", "type": "float"},
+                {"name": "double", "type": "double"},
+                {"name": "bytes", "type": "bytes"},
+                {"name": "string", "type": "string"},
+                {"name": "fixed", "type": {"type": "fixed", "name": "Id", "size": 4}},
+                {"name": "enum", "type": {"type": "enum", "name": "State", "symbols": ["ENABLED", "DISABLED"]}},
+                {"name": "array", "type": {"type": "array", "items": "long"}},
+                {"name": "map", "type": {"type": "map", "values": ["null", "string"]}},
+                {"name": "date", "type": {"type": "int", "logicalType": "date"}},
+                {
+                    "name": "next",
+                    "type": ["null", "AllTypes"],
+                    "default": None,
+                },
+            ],
+        }
+    )
+)
+
+ALL_TYPES_DATUM = {
+    "null": None,
+    "boolean": True,
+    "int": -42,
+    "long": 2**40,
+    "float": 1.5,
+    "double": -0.125,
+    "bytes": b"\x00\xff",
+    "string": "NRCellDU=NR01gNodeBRadio00087-1",
+    "fixed": b"abcd",
+    "enum": "DISABLED",
+    "array": [1, -1, 300000],
+    "map": {"a": "x", "b": None},
+    "date": datetime.date(2025, 1, 31),
+}
+
+
+def _encode(schema, datum) -> bytes:
+    buffer = io.BytesIO()
+    avro.io.DatumWriter(schema).write(datum, avro.io.BinaryEncoder(buffer))
+    return buffer.getvalue()
+
+
+def _decode_generic(schema, avro_value: bytes):
+    return avro.io.DatumReader(schema).read(avro.io.BinaryDecoder(io.BytesIO(avro_value)))
+
+
+@pytest.fixture(name="pm_schema")
+def fixture_pm_schema():
+    with open("./tests/schema_registry_response.json", "r", encoding="utf-8") as f:
+        return avro.schema.parse(json.load(f)["schema"])
+
+
+@pytest.fixture(name="pm_avro_value")
+def fixture_pm_avro_value():
+    with open("tests/pm_message_value.bin", "rb") as f:
+        return pickle.load(f)[AVRO_MAGIC_BYTE_COUNT:]
+
+
+def test_compiled_decoder_matches_datum_reader_for_pm_message(pm_schema, pm_avro_value):
+    """Test that the compiled decoder produces the same dict as DatumReader for a recorded PM message."""
+    expected = _decode_generic(pm_schema, pm_avro_value)
+    assert CompiledDecoder(pm_schema).decode(pm_avro_value) == expected
+
+
+def test_compiled_decoder_matches_datum_reader_for_all_types():
+    """Test every Avro type, a logical type and a recursive record against DatumReader."""
+    datum = dict(ALL_TYPES_DATUM, next=dict(ALL_TYPES_DATUM, next=None))
+    avro_value = _encode(ALL_TYPES_SCHEMA, datum)
+
+    decoded = CompiledDecoder(ALL_TYPES_SCHEMA).decode(avro_value)
+    assert decoded == _decode_generic(ALL_TYPES_SCHEMA, avro_value)
+    assert decoded["next"]["enum"] == "DISABLED"
+
+
+def test_compiled_decoder_raises_avro_error_on_truncated_value(pm_schema, pm_avro_value):
+    """Test that a truncated value raises an Avro error rather than an IndexError."""
+    with pytest.raises(avro.errors.AvroException):
+        CompiledDecoder(pm_schema).decode(pm_avro_value[:100])
+
+
+def test_projected_decoder_decodes_only_requested_fields(pm_schema, pm_avro_value):
+    """Test that unrequested fields come back as lazy placeholders which decode to the full value."""
+    expected = CompiledDecoder(pm_schema).decode(pm_avro_value)
+    decoded = CompiledDecoder(pm_schema, ("dnPrefix", "moFdn")).decode(pm_avro_value)
+
+    assert decoded["dnPrefix"] == expected["dnPrefix"]
+    assert decoded["moFdn"] == expected["moFdn"]
+    assert isinstance(decoded["pmCounters"], LazyField)
+    assert decoded["pmCounters"].value == expected["pmCounters"]
+    assert decoded["ropBeginTimeInEpoch"].value == expected["ropBeginTimeInEpoch"]
+
+
+def test_projected_decoder_returns_none_for_skipped_null():
+    """Test that a skipped union field holding null is returned as None rather than a placeholder."""
+    avro_value = _encode(ALL_TYPES_SCHEMA, dict(ALL_TYPES_DATUM, next=None))
+    decoded = CompiledDecoder(ALL_TYPES_SCHEMA, ("string",)).decode(avro_value)
+
+    assert decoded["string"] == ALL_TYPES_DATUM["string"]
+    assert decoded["next"] is None
+    assert decoded["map"].value == ALL_TYPES_DATUM["map"]
+
+
+def test_projected_decoder_raises_avro_error_on_truncated_value(pm_schema, pm_avro_value):
+    """Test that a value truncated inside a skipped field raises an Avro error."""
+    with pytest.raises(avro.errors.AvroException):
+        CompiledDecoder(pm_schema, ("dnPrefix",)).decode(pm_avro_value[:-10])
+
+
+@pytest.mark.parametrize(
+    "avro_value",
+    [
+        # The skipped string claims a length of -1.
+        b"\x01",
+        # The skipped array has a block count of -1 and a block size of -1, which would re-read the block count.
+        b"\x00\x01\x01",
+    ],
+)
+def test_projected_decoder_raises_avro_error_on_negative_size(avro_value):
+    """Test that a malformed value with a negative size in a skipped field raises an Avro error."""
+    schema = avro.schema.parse(
+        json.dumps(
+            {
+                "type": "record",
+                "name": "Skipped",
+                "fields": [
+                    {"name": "string", "type": "string"},
+                    {"name": "array", "type": {"type": "array", "items": "long"}},
+                    {"name": "int", "type": "int"},
+                ],
+            }
+        )
+    )
+    with pytest.raises(avro.errors.InvalidAvroBinaryEncoding):
+        CompiledDecoder(schema, ("int",)).decode(avro_value + b"\x02")
+
+
+def test_decoder_registry_compiles_once_per_schema_id(pm_schema):
+    """Test that the registry reuses a decoder for a schema ID and recompiles when the schema changes."""
+    registry = DecoderRegistry()
+    decoder = registry.get_decoder("125", pm_schema)
+    assert registry.get_decoder("125", pm_schema) is decoder
+
+    reparsed_schema = avro.schema.parse(str(pm_schema))
+    assert registry.get_decoder("125", reparsed_schema) is not decoder
+    assert registry.get_decoder("125", reparsed_schema, ("moFdn",)).fields == {"moFdn"}
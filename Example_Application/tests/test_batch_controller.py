@@ -0,0 +1,95 @@
+"""Tests for the adaptive batch size and timeout controller in batch_controller.py"""
+
+import pytest
+
+from network_data_template_app.batch_controller import AdaptiveBatchController
+from network_data_template_app.metrics import metrics_registry
+
+BATCH_COUNTERS = (
+    "complete_batch_of_messages_consumed",
+    "partial_batch_of_messages_consumed",
+    "empty_batch_of_messages_consumed",
+)
+
+
+@pytest.fixture(name="batch_counters")
+def fixture_batch_counters():
+    counters = [metrics_registry.counters.get(name) for name in BATCH_COUNTERS]
+    yield counters
+    for counter in counters:
+        counter.reset()
+
+
+def _controller(target_latency=1.0) -> AdaptiveBatchController:
+    return AdaptiveBatchController(
+        batch_size=1000,
+        timeout=1.0,
+        target_latency=target_latency,
+        batch_size_bounds=(100, 2000),
+        timeout_bounds=(0.1, 4.0),
+    )
+
+
+def _gauge_value(name: str) -> float:
+    return metrics_registry.gauges.get(name).collect()[0].samples[0].value
+
+
+def test_slow_batches_shrink_batch_size_within_bounds(batch_counters):
+    """Test that batches slower than the target shrink the batch size, by at most half and never below the minimum."""
+    complete, _, _ = batch_counters
+    controller = _controller()
+
+    complete.inc()
+    controller.update(processing_seconds=1.25)
+    assert controller.batch_size == 800
+
+    for _ in range(5):
+        complete.inc()
+        controller.update(processing_seconds=10.0)
+    assert controller.batch_size == 100
+    assert _gauge_value("consumer_batch_size") == 100
+
+
+def test_complete_batches_grow_batch_size_and_shorten_timeout(batch_counters):
+    """Test that complete batches within the target grow the batch size and shorten the timeout, up to the bounds."""
+    complete, _, _ = batch_counters
+    controller = _controller()
+
+    complete.inc()
+    controller.update(processing_seconds=0.5)
+    assert controller.batch_size == 1251
+    assert controller.timeout == 0.5
+
+    for _ in range(10):
+        complete.inc()
+        controller.update(processing_seconds=0.5)
+    assert controller.batch_size == 2000
+    assert controller.timeout == 0.1
+    assert _gauge_value("consumer_timeout_seconds") == 0.1
+
+
+def test_empty_batches_lengthen_timeout(batch_counters):
+    """Test that empty batches lengthen the timeout up to the maximum, while partial batches leave it as is."""
+    _, partial, empty = batch_counters
+    controller = _controller()
+
+    partial.inc()
+    controller.update(processing_seconds=0.01)
+    assert (controller.batch_size, controller.timeout) == (1000, 1.0)
+
+    for _ in range(3):
+        empty.inc()
+        controller.update(processing_seconds=0.0)
+    assert controller.timeout == 4.0
+    assert controller.batch_size == 1000
+
+
+def test_disabled_controller_keeps_configured_values(batch_counters):
+    """Test that without a target latency the configured batch size and timeout are used as is."""
+    complete, _, _ = batch_counters
+    controller = AdaptiveBatchController(10, 30.0, 0, (100, 2000), (0.1, 4.0))
+
+    complete.inc()
+    controller.update(processing_seconds=100.0)
+    assert (controller.batch_size, controller.timeout) == (10, 30.0)
+    assert _gauge_value("consumer_batch_size") == 10
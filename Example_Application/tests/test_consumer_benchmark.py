@@ -0,0 +1,66 @@
+"""Tests for the consumer benchmark in benchmarks/consumer_benchmark.py"""
+
+import json
+
+from benchmarks.consumer_benchmark import find_regressions, main, run_scenario, scenario_name
+
+
+def test_run_scenario_processes_every_message():
+    """Test that a scenario processes at least `min_messages` messages, over several ROPs if there are few cells."""
+    results = run_scenario(cell_count=4, batch_size=3, min_messages=10)
+
+    assert results["messages"] == 12
+    assert results["throughput"] > 0
+    assert 0 < results["p50_latency_seconds"] <= results["p99_latency_seconds"]
+    assert results["peak_rss_bytes"] > 0
+
+
+def test_find_regressions_beyond_threshold():
+    """Test that only results worse than the baseline by more than the threshold are reported."""
+    baseline = {
+        "cells=10,batch_size=100": {
+            "throughput": 1000.0,
+            "p50_latency_seconds": 0.01,
+            "p99_latency_seconds": 0.02,
+            "peak_rss_bytes": 100,
+        }
+    }
+    results = {
+        "cells=10,batch_size=100": {
+            "throughput": 700.0,
+            "p50_latency_seconds": 0.005,
+            "p99_latency_seconds": 0.023,
+            "peak_rss_bytes": 130,
+        },
+        "cells=1000,batch_size=100": {
+            "throughput": 1.0,
+            "p50_latency_seconds": 1.0,
+            "p99_latency_seconds": 1.0,
+            "peak_rss_bytes": 1,
+        },
+    }
+
+    regressions = find_regressions(results, baseline, threshold=0.2)
+
+    assert [regression.split(" ", 2)[1] for regression in regressions] == [
+        "throughput",
+        "peak_rss_bytes",
+    ]
+
+
+def test_main_writes_baseline_then_flags_regressions(tmp_path, no_log_certs):
+    """Test that a run writes the baseline, and a later run worse than it fails without replacing it."""
+    path = str(tmp_path / "baseline.json")
+    arguments = ["--baseline", path, "--cell-counts", "2", "--batch-sizes", "2", "--min-messages", "4"]
+
+    assert main(arguments) == 0
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    name = scenario_name(2, 2)
+    baseline["scenarios"][name]["throughput"] *= 1000
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f)
+
+    assert main(arguments) == 1
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f) == baseline
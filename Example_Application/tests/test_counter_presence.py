@@ -0,0 +1,64 @@
+"""Tests for the bitset counter presence in counter_presence.py"""
+
+from network_data_template_app.counter_presence import CounterPresence
+
+
+def _presence(cells: int) -> CounterPresence:
+    return CounterPresence([f"cell-{cell_id}" for cell_id in range(cells)])
+
+
+def test_bitsets_use_two_bits_per_cell():
+    """Test that both bitsets are rounded up to whole 64-bit words."""
+    presence = _presence(130)
+    assert len(presence) == 130
+    assert [len(bitset) for bitset in presence._bitsets] == [24, 24]
+
+
+def test_set_bits_are_read_by_cell_id():
+    """Test that each bit maps to its own cell, including across byte and word boundaries."""
+    presence = _presence(130)
+    for cell_id in (0, 7, 8, 63, 64, 129):
+        presence.set(cell_id)
+
+    received = presence.peek()
+    assert received.shape == (130,)
+    assert [cell_id for cell_id, bit in enumerate(received) if bit] == [0, 7, 8, 63, 64, 129]
+    assert presence.is_set(64) and not presence.is_set(65)
+
+
+def test_flip_returns_the_closed_epoch_and_keeps_later_bits():
+    """Test that a flip reports and clears the closed epoch, while bits set after it go to the next epoch."""
+    presence = _presence(10)
+    presence.set(1)
+    presence.set(2)
+
+    assert presence.flip().nonzero()[0].tolist() == [1, 2]
+    assert presence.epoch == 1
+    presence.set(3)
+    assert presence.flip().nonzero()[0].tolist() == [3]
+    # The first bitset was cleared when its epoch closed, so it starts the third epoch empty.
+    assert not presence.peek().any()
+
+
+def test_update_merges_the_active_epoch_of_another_presence():
+    """Test that merging sets the bits of the other presence's active epoch in this presence's active epoch."""
+    presence = _presence(70)
+    other = _presence(70)
+    presence.set(0)
+    other.set(69)
+    presence.flip()
+
+    presence.update(other)
+
+    assert presence.peek().nonzero()[0].tolist() == [69]
+    assert other.is_set(69)
+
+
+def test_allocate_clears_every_bit():
+    """Test that reallocating sizes the bitsets for the new cells and starts a new, empty epoch."""
+    presence = _presence(10)
+    presence.set(5)
+    presence.allocate(["cell-a", "cell-b"])
+    assert presence.cell_fdns == ["cell-a", "cell-b"]
+    assert presence.epoch == 0
+    assert presence.peek().tolist() == [False, False]
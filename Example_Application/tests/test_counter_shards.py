@@ -0,0 +1,86 @@
+"""Tests for the per-partition counter presence of consumer workers in counter_shards.py"""
+
+from confluent_kafka import TopicPartition
+
+from network_data_template_app.counter_presence import CounterPresence
+from network_data_template_app.counter_shards import (
+    CounterStatusShards,
+    merge_counter_status,
+    reindex_counter_presence,
+)
+from network_data_template_app.fdn_index import diff_cells
+
+FDN_A = "urn:3gpp:dn:ManagedElement=1,GNBDUFunction=1,NRCellDU=1"
+FDN_B = "urn:3gpp:dn:ManagedElement=1,GNBDUFunction=1,NRCellDU=2"
+FDN_C = "urn:3gpp:dn:ManagedElement=2,GNBDUFunction=1,NRCellDU=1"
+
+
+def test_revoked_shards_are_folded_into_counter_presence():
+    """Test that counters collected for a revoked partition are kept, and that other partitions are untouched."""
+    counter_presence = CounterPresence([FDN_A, FDN_B])
+    shards = CounterStatusShards(counter_presence)
+    shards.on_assign(None, [TopicPartition("pm", 0), TopicPartition("pm", 1)])
+    shards.shard(0).set(0)
+    shards.shard(1).set(1)
+
+    shards.on_revoke(None, [TopicPartition("pm", 0)])
+
+    assert shards.partitions == [1]
+    assert counter_presence.peek().tolist() == [True, False]
+
+
+def test_merge_counter_status_matches_single_consumer_report():
+    """Test that merging the shards of several workers gives the status a single consumer would have recorded."""
+    counter_presence = CounterPresence([FDN_C, FDN_B, FDN_A])
+    worker_1 = CounterStatusShards(counter_presence)
+    worker_2 = CounterStatusShards(counter_presence)
+    worker_1.shard(0).set(2)
+    worker_2.shard(1).set(0)
+
+    merged = merge_counter_status(counter_presence, [worker_1, worker_2], clear=True)
+
+    assert merged == {FDN_A: True, FDN_B: False, FDN_C: True}
+    assert list(merged) == sorted(merged)
+    assert not counter_presence.peek().any()
+    assert not worker_1.collected().any() and not worker_2.collected().any()
+
+
+def test_merge_counter_status_without_clear_keeps_counters():
+    """Test that a report which does not clear its data leaves every bit set for the next report."""
+    counter_presence = CounterPresence([FDN_A, FDN_B])
+    shards = CounterStatusShards(counter_presence)
+    counter_presence.set(0)
+    shards.shard(0).set(1)
+
+    assert merge_counter_status(counter_presence, [shards]) == {FDN_A: True, FDN_B: True}
+    assert merge_counter_status(counter_presence, [shards]) == {FDN_A: True, FDN_B: True}
+
+
+def test_reset_resizes_shards_for_reallocated_presence():
+    """Test that resetting replaces each shard with an empty one for the cells counter_presence now holds."""
+    counter_presence = CounterPresence([FDN_A])
+    shards = CounterStatusShards(counter_presence)
+    shards.shard(0).set(0)
+    counter_presence.allocate([FDN_A, FDN_B, FDN_C])
+
+    shards.reset()
+
+    assert shards.partitions == [0]
+    assert shards.collected().tolist() == [False, False, False]
+
+
+def test_reindex_keeps_the_presence_of_remaining_cells():
+    """Test that reindexing for new cells keeps the bits of the cells which remain, in counter_presence and shards."""
+    counter_presence = CounterPresence([FDN_A, FDN_B])
+    shards = CounterStatusShards(counter_presence)
+    counter_presence.set(0)
+    shards.shard(0).set(1)
+    delta = diff_cells(counter_presence.cell_fdns, [FDN_C, FDN_B])
+    assert (delta.added, delta.removed, delta.old_ids.tolist()) == (1, 1, [-1, 1])
+
+    reindex_counter_presence(counter_presence, [shards], delta.cell_ids.fdns, delta.old_ids)
+
+    assert counter_presence.cell_fdns == [FDN_C, FDN_B]
+    assert counter_presence.peek().tolist() == [False, False]
+    assert shards.collected().tolist() == [False, True]
+    assert diff_cells(counter_presence.cell_fdns, [FDN_C, FDN_B]) is None
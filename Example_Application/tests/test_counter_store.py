@@ -0,0 +1,142 @@
+"""Tests for the PM counter store in counter_store.py"""
+
+import numpy as np
+import pytest
+
+from network_data_template_app.counter_store import PmCounterStore
+from network_data_template_app.decode_worker import extract_counter_values
+from network_data_template_app.fdn_index import reindex_rows, reindex_rows_in_place
+from network_data_template_app.metrics import metrics_registry
+
+ROP = 1741031100000
+ROP_LENGTH_MS = 15 * 60 * 1000
+
+
+def _store(retention=2, max_counters=3) -> PmCounterStore:
+    store = PmCounterStore(retention, max_counters)
+    store.allocate(["cell-a", "cell-b", "cell-c"])
+    return store
+
+
+def test_allocate_sizes_the_store_up_front():
+    """Test that the values array is allocated for every cell, ROP and counter before anything is recorded."""
+    store = _store(retention=4, max_counters=300)
+    assert store.values.shape == (3, 4, 300)
+    assert store.reported.shape == (3, 4, 38)
+    assert store.nbytes == 3 * 4 * 300 * 8 + 3 * 4 * 38
+    assert not store.reported.any()
+    assert metrics_registry.gauges.get("pm_counter_store_size_bytes")._value.get() == store.nbytes
+
+
+def test_record_and_read_counter_values():
+    """Test that recorded values are read back exactly per cell, along with which cells reported the counter."""
+    store = _store()
+    assert store.record(0, ROP, {"pmA": 1, "pmB": 2})
+    assert store.record(2, ROP, {"pmA": 2**40 + 1, "pmB": 0})
+
+    assert store.rops() == [ROP]
+    assert store.counter_names == ["pmA", "pmB"]
+    np.testing.assert_array_equal(store.counter_values("pmA"), [1, 0, 2**40 + 1])
+    np.testing.assert_array_equal(store.counter_values("pmB", ROP), [2, 0, 0])
+    np.testing.assert_array_equal(store.counter_reported("pmB", ROP), [True, False, True])
+    np.testing.assert_array_equal(store.cells_reporting(), [True, False, True])
+    assert not store.counter_values("pmUnknown").any()
+    assert not store.counter_reported("pmUnknown").any()
+    assert not store.cells_reporting(ROP + ROP_LENGTH_MS).any()
+
+
+def test_new_rop_replaces_the_oldest_rop():
+    """Test that a new ROP takes over the slot of the oldest ROP held, and a ROP older than every ROP held is dropped."""
+    store = _store(retention=2)
+    store.record(0, ROP, {"pmA": 1})
+    store.record(0, ROP + ROP_LENGTH_MS, {"pmA": 2})
+    store.record(1, ROP + 2 * ROP_LENGTH_MS, {"pmA": 3})
+
+    assert store.rops() == [ROP + ROP_LENGTH_MS, ROP + 2 * ROP_LENGTH_MS]
+    assert store.latest_rop() == ROP + 2 * ROP_LENGTH_MS
+    np.testing.assert_array_equal(store.counter_values("pmA"), [0, 3, 0])
+    np.testing.assert_array_equal(store.counter_reported("pmA"), [False, True, False])
+    np.testing.assert_array_equal(
+        store.counter_reported("pmA", ROP + ROP_LENGTH_MS), [True, False, False]
+    )
+
+    assert not store.record(2, ROP, {"pmA": 4})
+    assert store.rops() == [ROP + ROP_LENGTH_MS, ROP + 2 * ROP_LENGTH_MS]
+
+
+def test_counters_beyond_max_counters_are_dropped():
+    """Test that counters first seen after every column is taken are dropped, while known counters are still stored."""
+    store = _store(max_counters=2)
+    store.record(0, ROP, {"pmA": 1, "pmB": 2, "pmC": 3})
+    store.record(1, ROP, {"pmC": 4, "pmA": 5})
+
+    assert store.counter_names == ["pmA", "pmB"]
+    np.testing.assert_array_equal(store.counter_values("pmA"), [1, 5, 0])
+    assert not store.counter_reported("pmC").any()
+
+
+def test_disabled_store():
+    """Test that a store with no retention is disabled and holds no values."""
+    store = _store(retention=0)
+    assert not store.enabled
+    assert store.values.size == 0
+    assert store.latest_rop() is None
+
+
+def test_extract_counter_values_keeps_present_single_counters():
+    """Test that only present, single-valued counters are extracted from a decoded `pmCounters` record."""
+    pm_counters = {
+        "pmA": {"counterType": "single", "counterValue": 7, "isValuePresent": True},
+        "pmB": {"counterType": "single", "counterValue": 0, "isValuePresent": False},
+        "pmC": {"counterType": "pdf", "counterValue": [1, 2], "isValuePresent": True},
+        "pmD": None,
+    }
+    assert extract_counter_values(pm_counters) == {"pmA": 7}
+
+
+def test_reindex_keeps_the_values_of_remaining_cells():
+    """Test that reindexing for new cells moves the values of remaining cells to their new IDs, with nothing reported for added cells."""
+    store = _store()
+    store.record(0, ROP, {"pmA": 1})
+    store.record(2, ROP, {"pmA": 3})
+
+    store.reindex(["cell-c", "cell-d"], np.array([2, -1]))
+
+    assert store.values.shape == (2, 2, 3)
+    np.testing.assert_array_equal(store.counter_values("pmA"), [3, 0])
+    np.testing.assert_array_equal(store.counter_reported("pmA"), [True, False])
+    assert metrics_registry.gauges.get("pm_counter_store_size_bytes")._value.get() == store.nbytes
+
+
+def test_reindex_moves_rows_within_the_existing_arrays():
+    """Test that reindexing for as many or fewer cells reuses the arrays of the store rather than copying them."""
+    store = _store()
+    store.record(1, ROP, {"pmA": 2})
+    values = store.values
+
+    store.reindex(["cell-b", "cell-d"], np.array([1, -1]))
+
+    assert np.shares_memory(store.values, values)
+    np.testing.assert_array_equal(store.counter_values("pmA"), [2, 0])
+    np.testing.assert_array_equal(store.counter_reported("pmA"), [True, False])
+
+
+@pytest.mark.parametrize(
+    "old_ids",
+    [
+        [0, 1, 2, 3, 4, 5],
+        [1, 2, 4, 5],
+        [-1, 0, -1, 2, 3, 5, -1, -1],
+        [0, 3, -1, 4, 5],
+        [5, 4, 3, 2, 1, 0],
+        [1, 2, 0, -1, 4, 3, 5],
+        [2, -1, 1, 5],
+    ],
+)
+def test_reindex_rows_in_place_matches_reindex_rows(old_ids):
+    """Test that moving rows in place gives the same rows as a reindexed copy, whether cells keep their order or not."""
+    values = np.arange(6 * 2 * 3).reshape(6, 2, 3)
+    old_ids = np.array(old_ids)
+    expected = reindex_rows(values, old_ids, -7)
+
+    np.testing.assert_array_equal(reindex_rows_in_place(values.copy(), old_ids, -7), expected)
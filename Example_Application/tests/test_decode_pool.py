@@ -0,0 +1,80 @@
+# pylint: disable=W0613
+# W0613: Unused argument
+"""Tests for the decode process pool in decode_pool.py"""
+
+import json
+import pickle
+from concurrent.futures.process import BrokenProcessPool
+
+import avro.schema
+import pytest
+
+from network_data_template_app.decode_pool import DecodePool, DecodedPmMessage
+from network_data_template_app.message_bus_consumer import (
+    AVRO_MAGIC_BYTE_COUNT,
+    DECODED_FIELDS,
+)
+from network_data_template_app.metrics import metrics_registry
+
+
+@pytest.fixture(name="decode_pool")
+def fixture_decode_pool():
+    pool = DecodePool(workers=1, chunk_size=2, fields=DECODED_FIELDS)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_decode_pool_returns_compact_fields_in_order(decode_pool):
+    """Test that values are decoded on a worker process and returned in input order, including decode errors."""
+    with open("./tests/schema_registry_response.json", "r", encoding="utf-8") as f:
+        schema = avro.schema.parse(json.load(f)["schema"])
+    with open("tests/pm_message_value.bin", "rb") as f:
+        avro_value = pickle.load(f)[AVRO_MAGIC_BYTE_COUNT:]
+    chunk_latency = metrics_registry.histograms.get("decode_pool_chunk_latency_seconds")
+    chunks_before = chunk_latency.collect()[0].samples[-2].value
+
+    decoded = await decode_pool.decode("125", schema, [avro_value, avro_value[:50], avro_value])
+
+    expected = DecodedPmMessage(
+        "SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087",
+        "ManagedElement=NR01gNodeBRadio00087,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00087-1",
+        True,
+    )
+    assert decoded[0] == decoded[2] == expected
+    assert decoded[1].error is not None
+    assert chunk_latency.collect()[0].samples[-2].value == chunks_before + 2
+    assert metrics_registry.gauges.get("decode_pool_queue_depth")._value.get() == 0
+
+
+class _BrokenExecutor:
+    """Stands in for a process pool whose worker process died."""
+
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("A child process terminated abruptly")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.mark.asyncio
+async def test_broken_pool_is_restarted_and_chunks_decoded_in_process(decode_pool):
+    """Test that chunks in flight when a worker dies are decoded in the consumer, and the pool is recreated once."""
+    with open("./tests/schema_registry_response.json", "r", encoding="utf-8") as f:
+        schema = avro.schema.parse(json.load(f)["schema"])
+    with open("tests/pm_message_value.bin", "rb") as f:
+        avro_value = pickle.load(f)[AVRO_MAGIC_BYTE_COUNT:]
+    restarts = metrics_registry.counters.get("decode_pool_restarts")
+    restarts_before = restarts._value.get()
+    broken_executor = decode_pool._executor = _BrokenExecutor()
+
+    decoded = await decode_pool.decode("125", schema, [avro_value] * 3)
+
+    assert [message.has_pm_counters for message in decoded] == [True] * 3
+    assert restarts._value.get() == restarts_before + 1
+    assert broken_executor.shut_down
+    assert decode_pool._executor is not broken_executor
+    assert await decode_pool.decode("125", schema, [avro_value]) == decoded[:1]
@@ -0,0 +1,59 @@
+"""Tests for the consumer lag collector in lag_collector.py"""
+
+import time
+from unittest.mock import MagicMock
+
+from confluent_kafka import OFFSET_INVALID, TopicPartition
+
+from network_data_template_app.lag_collector import ConsumerLagCollector
+from network_data_template_app.metrics import metrics_registry
+
+
+def _gauge_value(name: str, partition: int):
+    return next(
+        (
+            sample.value
+            for sample in metrics_registry.gauges.get(name).collect()[0].samples
+            if sample.labels == {"topic": "pm", "partition": str(partition)}
+        ),
+        None,
+    )
+
+
+def _consumer(committed_offsets: dict[int, int]) -> MagicMock:
+    consumer = MagicMock()
+    consumer.assignment.return_value = [
+        TopicPartition("pm", partition) for partition in committed_offsets
+    ]
+    consumer.committed.return_value = [
+        TopicPartition("pm", partition, offset)
+        for partition, offset in committed_offsets.items()
+    ]
+    consumer.get_watermark_offsets.return_value = (10, 500)
+    return consumer
+
+
+def test_collect_publishes_lag_rate_and_age_per_partition():
+    """Test that lag, consumption rate and oldest unprocessed message age are published for each partition."""
+    consumer = _consumer({0: 400, 1: OFFSET_INVALID})
+    collector = ConsumerLagCollector(consumer, interval=15.0)
+    collector.record_processed(0, time.time() * 1000 - 60_000)
+
+    collector.collect()
+    assert _gauge_value("consumer_partition_lag", 0) == 100
+    assert _gauge_value("consumer_partition_lag", 1) == 490  # nothing committed, so lag is from the low watermark
+    assert 59 < _gauge_value("consumer_partition_oldest_unprocessed_message_age_seconds", 0) < 70
+    assert _gauge_value("consumer_partition_oldest_unprocessed_message_age_seconds", 1) == 0
+
+    consumer.committed.return_value = [TopicPartition("pm", 0, 500)]
+    consumer.assignment.return_value = [TopicPartition("pm", 0)]
+    collector.collect()
+    assert _gauge_value("consumer_partition_lag", 0) == 0
+    assert _gauge_value("consumer_partition_consumption_rate", 0) > 0
+    assert _gauge_value("consumer_partition_oldest_unprocessed_message_age_seconds", 0) == 0
+    # Partition 1 was revoked, so it is no longer reported.
+    assert _gauge_value("consumer_partition_lag", 1) is None
+
+    consumer.assignment.return_value = []
+    collector.collect()
+    assert _gauge_value("consumer_partition_lag", 0) is None
@@ -1,10 +1,40 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import asyncio
+import io
+import json
+
+import avro.io
+import avro.schema
 import pytest
+from confluent_kafka import TIMESTAMP_NOT_AVAILABLE, TopicPartition
+from httpx import Response
 
+from network_data_template_app.counter_shards import CounterStatusShards
+from network_data_template_app.counter_store import PmCounterStore
+from network_data_template_app.fdn_index import CellIdTable, NodeFdnIndex, split_cell_fdn
+from network_data_template_app.metrics import metrics_registry
 from network_data_template_app.message_bus_consumer import (
     MessageBusConsumer,
-    fdn_to_pm_counter_status,
+    counter_presence,
+    reconcile_prefixed_fdns,
+    start_message_bus_consumers,
     _get_message_bus_connection_details,
+    _is_relevant_node_fdn,
 )
+from network_data_template_app.rop_dedup import RopDeduplicator
+from network_data_template_app.rop_windows import RopWindows
+from network_data_template_app.schema_registry import schema_cache
+from network_data_template_app.snapshot import ConsumerSnapshot
+from network_data_template_app.topology_and_inventory import get_sourceids_from_cells
+
+
+def collected(fdn: str) -> bool:
+    """Whether counters were recorded for a cell in the current epoch of `counter_presence`."""
+    return counter_presence.is_set(counter_presence.cell_fdns.index(fdn))
+
+
+CELL_FDN = "urn:3gpp:dn:SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087,ManagedElement=NR01gNodeBRadio00087,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00087-1"
 
 
 @pytest.mark.asyncio
@@ -18,10 +48,127 @@ async def test_consume_messages_consumes_valid_messages(
     """Test that `consume_messages()` consumes valid messages."""
     await message_bus_consumer_consumes_valid_messages._consume_messages()
     key = "urn:3gpp:dn:SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087,ManagedElement=NR01gNodeBRadio00087,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00087-1"
-    assert key in fdn_to_pm_counter_status
-    assert fdn_to_pm_counter_status[key] is True
+    assert collected(key) is True
 
 
+@pytest.mark.asyncio
+async def test_consume_messages_decodes_on_decode_pool(
+    monkeypatch,
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that `consume_messages()` flags the same cells when decoding on the decode pool."""
+    monkeypatch.setenv("DECODE_WORKERS", "1")
+    with patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_valid_messages
+        )
+        await consumer._fetch_prefixed_fdns()
+    counter_presence.flip()
+
+    await consumer._consume_messages()
+    consumer.decode_pool.shutdown()
+    assert collected(CELL_FDN) is True
+
+
+@pytest.mark.asyncio
+async def test_fetch_prefixed_fdns_pages_through_the_inventory(
+    monkeypatch,
+    authentication_and_authorization,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that with a topology page size, the cells of every page are allocated rather than those of the first."""
+    monkeypatch.setenv("TOPOLOGY_PAGE_SIZE", "4")
+    pages = [
+        get_topology_get_nr_cell_dus_response[offset : offset + 4]
+        for offset in range(0, len(get_topology_get_nr_cell_dus_response), 4)
+    ]
+
+    async def iter_nr_cell_du_pages(client, page_size, concurrency):
+        assert (page_size, concurrency) == (4, 4)
+        for page in pages:
+            yield page
+
+    with patch(
+        "network_data_template_app.topology_and_inventory.iter_nr_cell_du_pages",
+        iter_nr_cell_du_pages,
+    ), patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+    ) as get_nr_cell_dus:
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_valid_messages
+        )
+        await consumer._fetch_prefixed_fdns()
+
+    get_nr_cell_dus.assert_not_awaited()
+    assert counter_presence.cell_fdns == get_sourceids_from_cells(
+        get_topology_get_nr_cell_dus_response
+    )
+
+
+@pytest.mark.asyncio
+async def test_consume_messages_pipelined_processes_fetched_batches(
+    authentication_and_authorization,
+    data_management_url,
+    data_management_with_data_jobs,
+    get_schema_valid_schema,
+    message_bus_consumer_consumes_valid_messages,
+):
+    """Test that the pipelined consumer processes fetched batches and records fetch, wait and processing times."""
+    consumer = message_bus_consumer_consumes_valid_messages
+    counter_presence.flip()
+    processing_duration = metrics_registry.histograms.get(
+        "consumer_batch_processing_duration_seconds"
+    )
+    batches_before = processing_duration.collect()[0].samples[-2].value
+
+    task = asyncio.create_task(consumer._consume_messages_pipelined(pipeline_depth=2))
+    while processing_duration.collect()[0].samples[-2].value < batches_before + 3:
+        await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert collected(CELL_FDN) is True
+    assert consumer.consumer.consume.call_count >= 3
+    assert metrics_registry.gauges.get("consumer_pipeline_queue_depth")._value.get() <= 2
+
+
+@pytest.mark.asyncio
+async def test_consume_messages_pipelined_raises_fetch_errors(
+    authentication_and_authorization,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_no_messages,
+):
+    """Test that the pipelined consumer fails with the error of the fetch task, after processing its batches."""
+    consumer = MessageBusConsumer(
+        sync_oauth_client, async_oauth_client, kafka_consumer_with_no_messages
+    )
+    poll_messages = AsyncMock(side_effect=[[], RuntimeError("poll failed")])
+    process_messages = AsyncMock()
+    with patch.object(consumer, "_poll_messages", poll_messages), patch.object(
+        consumer, "_process_messages", process_messages
+    ):
+        with pytest.raises(RuntimeError, match="poll failed"):
+            await asyncio.wait_for(
+                consumer._consume_messages_pipelined(pipeline_depth=2), timeout=5
+            )
+
+    process_messages.assert_awaited_once_with([])
+
 @pytest.mark.asyncio
 async def test_consume_messages_consumes_no_messages(
     authentication_and_authorization,
@@ -33,8 +180,7 @@ async def test_consume_messages_consumes_no_messages(
     """Test that `consume_messages()` consumes no messages."""
     await message_bus_consumer_consumes_no_messages._consume_messages()
     key = "urn:3gpp:dn:SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087,ManagedElement=NR01gNodeBRadio00087,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00087-1"
-    assert key in fdn_to_pm_counter_status
-    assert fdn_to_pm_counter_status[key] is False
+    assert collected(key) is False
 
 
 @pytest.mark.asyncio
@@ -82,6 +228,7 @@ def test_get_message_bus_conn_details_returns_valid_response(
     assert (message_bus_conn_details["topic"]) == "ctr-processed"
     assert (message_bus_conn_details["hostname"]) == "bootstrap.example.com"
     assert (message_bus_conn_details["port"]) == 443
+    assert (message_bus_conn_details["schema_subject"]) == "4G.4g-pm-event_schema"
 
 
 def test_get_message_bus_conn_details_raises_exception(
@@ -98,3 +245,449 @@ def test_get_message_bus_conn_details_raises_exception(
         consumer._initialize_consumer()
 
     assert exc_info.value.code == 1
+
+
+@pytest.mark.parametrize(
+    "node_fdn, expected",
+    [
+        ("SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087,ManagedElement=NR01gNodeBRadio00087", True),
+        ("urn:3gpp:dn:SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087", True),
+        ("SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00088,ManagedElement=NR01gNodeBRadio00088", False),
+        ("SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio0008", False),
+    ],
+)
+def test_is_relevant_node_fdn_uses_index(node_fdn, expected):
+    """Test that a nodeFDN header matches only when it is a leading run of RDNs of a monitored cell."""
+    parsed_headers = [["moType", "NRCellDU_GNBDU"], ["nodeFDN", node_fdn]]
+    assert _is_relevant_node_fdn(parsed_headers, NodeFdnIndex([CELL_FDN])) is expected
+
+
+def test_node_fdn_index_is_rebuilt_when_prefixed_fdns_change(
+    mock_apis, message_bus_consumer_consumes_valid_messages
+):
+    """Test that assigning `prefixed_fdns` rebuilds the nodeFDN index."""
+    node_fdn = "SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087,ManagedElement=NR01gNodeBRadio00087"
+    consumer = message_bus_consumer_consumes_valid_messages
+    assert node_fdn in consumer.node_fdn_index
+
+    consumer.prefixed_fdns = []
+    assert node_fdn not in consumer.node_fdn_index
+    assert len(consumer.cell_ids) == 0
+
+
+def test_cell_id_table_looks_up_cells_by_dn_prefix_and_mo_fdn():
+    """Test that cells get dense IDs in FDN order, looked up by the dnPrefix and moFdn their PM messages carry."""
+    other_cell_fdn = CELL_FDN.replace("NR01gNodeBRadio00087-1", "NR01gNodeBRadio00087-2")
+    cell_ids = CellIdTable([CELL_FDN, other_cell_fdn, CELL_FDN])
+    dn_prefix = "SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087"
+    mo_fdn = "ManagedElement=NR01gNodeBRadio00087,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00087-1"
+
+    assert cell_ids.fdns == [CELL_FDN, other_cell_fdn]
+    assert cell_ids.lookup(dn_prefix, mo_fdn) == 0
+    assert cell_ids.lookup(dn_prefix, mo_fdn.replace("-1", "-2")) == 1
+    assert cell_ids.lookup(dn_prefix, mo_fdn.replace("-1", "-3")) is None
+    assert cell_ids.lookup("SubNetwork=Europe", mo_fdn) is None
+    assert cell_ids.lookup(None, None) is None
+
+
+def test_cell_id_table_looks_up_cells_split_at_any_rdn():
+    """Test that a cell is found whichever RDN its message splits the FDN at, including with an empty dnPrefix."""
+    cell_ids = CellIdTable([CELL_FDN])
+    fdn = CELL_FDN.removeprefix("urn:3gpp:dn:")
+
+    assert cell_ids.lookup("SubNetwork=Europe", fdn.removeprefix("SubNetwork=Europe,")) == 0
+    assert cell_ids.lookup("", fdn) == 0
+    assert cell_ids.lookup("SubNetwork=Europe", fdn) is None
+
+
+@pytest.mark.asyncio
+async def test_consume_messages_records_counters_in_partition_shard(
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that a consumer worker records counters in the shard of the message's partition, not the shared map."""
+    for message in kafka_consumer_with_valid_messages.consume.return_value:
+        message.partition.return_value = 3
+    counter_shards = CounterStatusShards(counter_presence)
+    with patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client,
+            async_oauth_client,
+            kafka_consumer_with_valid_messages,
+            counter_shards=counter_shards,
+        )
+        await consumer._fetch_prefixed_fdns()
+    counter_presence.flip()
+
+    await consumer._consume_messages()
+    assert collected(CELL_FDN) is False
+    assert counter_shards.collected().tolist() == [
+        fdn == CELL_FDN for fdn in counter_presence.cell_fdns
+    ]
+
+    counter_shards.revoke([3])
+    assert collected(CELL_FDN) is True
+
+
+@pytest.mark.asyncio
+async def test_consume_messages_records_stage_and_message_latencies(
+    authentication_and_authorization,
+    data_management_url,
+    data_management_with_data_jobs,
+    get_schema_valid_schema,
+    message_bus_consumer_consumes_valid_messages,
+):
+    """Test that each processing stage, the whole batch and the Message Bus timestamp latency are all timed."""
+
+    def sample_count(histogram, **labels):
+        return next(
+            sample.value
+            for sample in histogram.collect()[0].samples
+            if sample.name.endswith("_count") and sample.labels == labels
+        )
+
+    stage_duration = metrics_registry.histograms.get("consumer_stage_duration_seconds")
+    end_to_end = metrics_registry.histograms.get(
+        "consumer_batch_end_to_end_duration_seconds"
+    )
+    message_latency = metrics_registry.histograms.get(
+        "consumer_message_latency_seconds"
+    )
+    before = {
+        stage: sample_count(stage_duration, stage=stage)
+        for stage in ("header_parse", "node_fdn_filter", "decode", "status_update")
+    }
+    end_to_end_before = sample_count(end_to_end)
+    latency_sum_before = message_latency.collect()[0].samples[-1].value
+
+    await message_bus_consumer_consumes_valid_messages._consume_messages()
+
+    # 7 messages pass the error check, 3 of them have a relevant moType, and 1 of those is decoded.
+    assert sample_count(stage_duration, stage="header_parse") == before["header_parse"] + 7
+    assert sample_count(stage_duration, stage="node_fdn_filter") == before["node_fdn_filter"] + 3
+    assert sample_count(stage_duration, stage="decode") == before["decode"] + 1
+    assert sample_count(stage_duration, stage="status_update") == before["status_update"] + 1
+    assert sample_count(end_to_end) == end_to_end_before + 1
+    assert message_latency.collect()[0].samples[-1].value - latency_sum_before >= 1.5
+
+
+@pytest.mark.asyncio
+async def test_consume_messages_decodes_each_message_with_its_own_schema(
+    authentication_and_authorization,
+    config,
+    get_schema_valid_schema,
+    message_bus_consumer_consumes_valid_messages,
+):
+    """Test that a batch interleaving two schema IDs resolves each schema once and decodes every message with its own."""
+    consumer = message_bus_consumer_consumes_valid_messages
+    other_cell_fdn = consumer.prefixed_fdns[1]
+    dn_prefix, mo_fdn = other_cell_fdn.removeprefix("urn:3gpp:dn:").split(",ManagedElement=")
+    other_schema = avro.schema.parse(
+        json.dumps(
+            {
+                "type": "record",
+                "name": "ReorderedPmCounters",
+                "fields": [
+                    {"name": "moFdn", "type": "string"},
+                    {"name": "pmCounters", "type": ["null", "string"]},
+                    {"name": "dnPrefix", "type": "string"},
+                ],
+            }
+        )
+    )
+    buffer = io.BytesIO()
+    avro.io.DatumWriter(other_schema).write(
+        {"moFdn": "ManagedElement=" + mo_fdn, "pmCounters": "counters", "dnPrefix": dn_prefix},
+        avro.io.BinaryEncoder(buffer),
+    )
+    other_message = MagicMock()
+    other_message.error.return_value = None
+    other_message.timestamp.return_value = (TIMESTAMP_NOT_AVAILABLE, 0)
+    other_message.value.return_value = b"\x00\x00\x00\x00\x7e" + buffer.getvalue()
+    other_message.headers.return_value = [
+        (b"schemaID", b"126"),
+        (b"moType", b"NRCellDU_GNBDU"),
+        (b"nodeFDN", f"{dn_prefix},ManagedElement={mo_fdn.split(',')[0]}".encode()),
+    ]
+    schema_url = config.get("iam_base_url") + "/schema-registry-sr/view/schemas/ids/"
+    other_schema_route = get_schema_valid_schema.get(schema_url + "126") % Response(
+        status_code=200, json={"schema": str(other_schema)}
+    )
+    pm_message = consumer.consumer.consume.return_value[0]
+    consumer.consumer.consume.return_value = [pm_message, other_message] * 3
+    schema_cache.clear()
+    counter_presence.flip()
+
+    await consumer._consume_messages()
+
+    assert collected(CELL_FDN) is True
+    assert collected(other_cell_fdn) is True
+    assert get_schema_valid_schema.routes[0].call_count == 1
+    assert other_schema_route.call_count == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("decode_workers", ["0", "1"])
+async def test_consume_messages_stores_counter_values(
+    monkeypatch,
+    decode_workers,
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that with the counter store enabled, the counter values of our cells are stored under their ROP."""
+    monkeypatch.setenv("DECODE_WORKERS", decode_workers)
+    store = PmCounterStore(retention=2, max_counters=400)
+    with patch(
+        "network_data_template_app.message_bus_consumer.pm_counter_store", store
+    ), patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_valid_messages
+        )
+        await consumer._fetch_prefixed_fdns()
+        await consumer._consume_messages()
+    if consumer.decode_pool is not None:
+        consumer.decode_pool.shutdown()
+
+    cell_id = consumer.cell_ids.fdns.index(CELL_FDN)
+    assert store.rops() == [1741031100000]
+    assert len(store.counter_names) == 159
+    assert store.cells_reporting().tolist() == [
+        fdn_cell_id == cell_id for fdn_cell_id in range(len(store.cell_fdns))
+    ]
+    assert store.counter_values("pmActiveUeDlMax")[cell_id] == 80
+
+
+@pytest.mark.asyncio
+async def test_consume_messages_closes_rop_window_when_every_cell_reports(
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that with ROP windowing enabled, a message's ROP window closes once every monitored cell has reported."""
+    windows = RopWindows(max_open=2, allowed_lateness=300.0)
+    with patch(
+        "network_data_template_app.message_bus_consumer.rop_windows", windows
+    ), patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_valid_messages
+        )
+        await consumer._fetch_prefixed_fdns()
+        # Only the cell of the valid PM message is expected, so its message completes the window.
+        consumer.prefixed_fdns = [CELL_FDN]
+        windows.allocate(consumer.cell_ids.fdns)
+        await consumer._consume_messages()
+
+    [window] = windows.closed
+    assert (window.rop_begin_time, window.rop_end_time) == (1741031100000, 1741032000000)
+    assert window.complete
+    assert window.counters["pmActiveUeDlMax"] == 80
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("decode_workers", ["0", "1"])
+async def test_consume_messages_suppresses_duplicate_messages(
+    monkeypatch,
+    decode_workers,
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that with duplicate suppression enabled, a PM message delivered again is counted and dropped."""
+    monkeypatch.setenv("DECODE_WORKERS", decode_workers)
+    deduplicator = RopDeduplicator(retention=2)
+    suppressed = metrics_registry.counters.get("duplicate_messages_suppressed")
+    with patch(
+        "network_data_template_app.message_bus_consumer.rop_deduplicator",
+        deduplicator,
+    ), patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_valid_messages
+        )
+        await consumer._fetch_prefixed_fdns()
+        suppressed_before = suppressed._value.get()
+        await consumer._consume_messages()
+        await consumer._consume_messages()
+    if consumer.decode_pool is not None:
+        consumer.decode_pool.shutdown()
+
+    assert "ropBeginTimeInEpoch" in consumer.decoded_fields
+    assert suppressed._value.get() == suppressed_before + 1
+    assert collected(CELL_FDN)
+
+
+@pytest.mark.asyncio
+async def test_collect_counters_commits_processed_offsets_on_shutdown(
+    monkeypatch,
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_valid_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that offsets are only committed once their batch is processed, and synchronously when the consumer closes."""
+    monkeypatch.setenv("CONSUMER_COMMIT_BATCHES", "100")
+    monkeypatch.setenv("CONSUMER_COMMIT_INTERVAL", "0")
+    with patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_valid_messages
+        )
+        await consumer._fetch_prefixed_fdns()
+        await consumer._consume_messages()
+        kafka_consumer_with_valid_messages.commit.assert_not_called()
+
+        kafka_consumer_with_valid_messages.consume.side_effect = asyncio.CancelledError
+        await consumer.collect_counters()
+
+    kafka_consumer_with_valid_messages.commit.assert_called_once()
+    offsets = kafka_consumer_with_valid_messages.commit.call_args.kwargs["offsets"]
+    # The error message at offset 5 is skipped, and msg6 at offset 7 is the last of the batch.
+    assert [(offset.topic, offset.partition, offset.offset) for offset in offsets] == [("pm", 0, 8)]
+    assert kafka_consumer_with_valid_messages.commit.call_args.kwargs["asynchronous"] is False
+    kafka_consumer_with_valid_messages.close.assert_called_once()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("topology_changed", [False, True])
+async def test_start_message_bus_consumers_resumes_from_snapshot(
+    tmp_path,
+    topology_changed,
+    authentication_and_authorization,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_no_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that consumers start with the cells of a snapshot, keeping its state unless Topology & Inventory changed."""
+    snapshot_fdns = get_sourceids_from_cells(get_topology_get_nr_cell_dus_response)
+    if topology_changed:
+        snapshot_fdns = snapshot_fdns[1:]
+    snapshot = ConsumerSnapshot(str(tmp_path), 60.0)
+    counter_presence.allocate(snapshot_fdns)
+    counter_presence.set(snapshot_fdns.index(CELL_FDN))
+    await snapshot.save(counter_presence, PmCounterStore(0, 0))
+    counter_presence.allocate([])
+
+    get_nr_cell_dus = AsyncMock(return_value=get_topology_get_nr_cell_dus_response)
+    with patch(
+        "network_data_template_app.message_bus_consumer.consumer_snapshot", snapshot
+    ), patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        get_nr_cell_dus,
+    ):
+        consumer = MessageBusConsumer(
+            sync_oauth_client, async_oauth_client, kafka_consumer_with_no_messages
+        )
+        *consumer_tasks, revalidation_task = await start_message_bus_consumers(
+            [consumer]
+        )
+        assert consumer.prefixed_fdns == snapshot_fdns
+        assert collected(CELL_FDN)
+
+        await revalidation_task
+        for consumer_task in consumer_tasks:
+            consumer_task.cancel()
+        await asyncio.gather(*consumer_tasks, return_exceptions=True)
+
+    get_nr_cell_dus.assert_awaited_once()
+    assert consumer.cell_ids.fdns == get_sourceids_from_cells(
+        get_topology_get_nr_cell_dus_response
+    )
+    assert collected(CELL_FDN) is not topology_changed
+
+
+@pytest.mark.asyncio
+async def test_reconcile_prefixed_fdns_keeps_state_of_remaining_cells(
+    authentication_and_authorization,
+    sync_oauth_client,
+    async_oauth_client,
+    kafka_consumer_with_no_messages,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that reconciling with Topology & Inventory adds and removes cells, keeping the counters of the others."""
+    fdns = get_sourceids_from_cells(get_topology_get_nr_cell_dus_response)
+    removed_fdn = "urn:3gpp:dn:SubNetwork=Europe,MeContext=NR01gNodeBRadio09999,ManagedElement=NR01gNodeBRadio09999,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio09999-1"
+    consumer = MessageBusConsumer(
+        sync_oauth_client, async_oauth_client, kafka_consumer_with_no_messages
+    )
+    consumer.prefixed_fdns = [removed_fdn] + fdns[1:]
+    counter_presence.allocate(consumer.cell_ids.fdns)
+    counter_presence.set(consumer.cell_ids.fdns.index(CELL_FDN))
+    added = metrics_registry.counters.get("topology_cells_added")._value.get()
+    removed = metrics_registry.counters.get("topology_cells_removed")._value.get()
+
+    with patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        delta = await reconcile_prefixed_fdns([consumer])
+        assert await reconcile_prefixed_fdns([consumer]) is None
+
+    assert (delta.added, delta.removed) == (1, 1)
+    assert consumer.prefixed_fdns == fdns
+    assert consumer.cell_ids.lookup(*split_cell_fdn(fdns[0])) == 0
+    assert consumer.node_fdn_index is delta.node_fdn_index
+    assert counter_presence.cell_fdns == fdns
+    assert collected(CELL_FDN) and not collected(fdns[0])
+    assert metrics_registry.counters.get("topology_cells_added")._value.get() == added + 1
+    assert metrics_registry.counters.get("topology_cells_removed")._value.get() == removed + 1
+
+
+def test_consumer_commits_revoked_offsets_on_rebalance(
+    authentication_and_authorization, sync_oauth_client, async_oauth_client
+):
+    """Test that a single consumer subscribes with rebalance callbacks, and commits revoked offsets synchronously."""
+    with patch("network_data_template_app.message_bus_consumer.Consumer") as consumer_class, patch(
+        "network_data_template_app.message_bus_consumer._get_message_bus_connection_details",
+        return_value={"topic": "pm", "schema_subject": "pm-subject"},
+    ), patch.object(
+        MessageBusConsumer, "_MessageBusConsumer__build_consumer_config", return_value={}
+    ):
+        consumer = MessageBusConsumer(sync_oauth_client, async_oauth_client)
+    kafka_consumer = consumer_class.return_value
+    callbacks = kafka_consumer.subscribe.call_args.kwargs
+    message = MagicMock()
+    message.topic.return_value, message.partition.return_value, message.offset.return_value = "pm", 0, 41
+    consumer.offset_commits.store([message])
+
+    callbacks["on_revoke"](kafka_consumer, [TopicPartition("pm", 0)])
+
+    offsets = kafka_consumer.commit.call_args.kwargs["offsets"]
+    assert [(offset.partition, offset.offset) for offset in offsets] == [(0, 42)]
+    assert kafka_consumer.commit.call_args.kwargs["asynchronous"] is False
+    assert callbacks["on_lost"] == consumer._on_lost
@@ -0,0 +1,104 @@
+"""Tests for the batched offset commits of processed messages in offset_commits.py"""
+
+from unittest.mock import MagicMock
+
+from confluent_kafka import KafkaError, KafkaException, TopicPartition
+
+from network_data_template_app.metrics import metrics_registry
+from network_data_template_app.offset_commits import OffsetCommitManager, on_commit
+
+
+def _message(partition: int, offset: int) -> MagicMock:
+    message = MagicMock()
+    message.topic.return_value = "pm"
+    message.partition.return_value = partition
+    message.offset.return_value = offset
+    return message
+
+
+def _committed(consumer: MagicMock) -> list[tuple[int, int]]:
+    offsets = consumer.commit.call_args.kwargs["offsets"]
+    return sorted((partition.partition, partition.offset) for partition in offsets)
+
+
+def _failures() -> float:
+    return next(
+        sample.value
+        for sample in metrics_registry.counters.get("consumer_offset_commit_failures")
+        .collect()[0]
+        .samples
+        if sample.name.endswith("_total")
+    )
+
+
+def test_offsets_are_committed_every_n_batches():
+    """Test that the next offset of each partition is committed asynchronously once `commit_batches` batches are stored."""
+    consumer = MagicMock()
+    offset_commits = OffsetCommitManager(consumer, commit_batches=2, commit_interval=0)
+
+    offset_commits.store([_message(0, 10), _message(1, 4), _message(0, 11)])
+    consumer.commit.assert_not_called()
+
+    offset_commits.store([_message(1, 5)])
+    consumer.commit.assert_called_once()
+    assert _committed(consumer) == [(0, 12), (1, 6)]
+    assert consumer.commit.call_args.kwargs["asynchronous"] is True
+
+
+def test_offsets_are_committed_after_the_interval():
+    """Test that the stored offsets are committed once `commit_interval` seconds have passed, even after one batch."""
+    consumer = MagicMock()
+    offset_commits = OffsetCommitManager(consumer, commit_batches=100, commit_interval=5.0)
+    offset_commits._last_commit -= 5.0
+
+    offset_commits.store([_message(0, 10)])
+
+    assert _committed(consumer) == [(0, 11)]
+
+
+def test_commit_without_stored_offsets_does_nothing():
+    """Test that nothing is committed when no batch was processed since the last commit."""
+    consumer = MagicMock()
+    offset_commits = OffsetCommitManager(consumer, commit_batches=1, commit_interval=0)
+    offset_commits.store([_message(0, 10)])
+
+    offset_commits.commit(asynchronous=False)
+
+    consumer.commit.assert_called_once()
+
+
+def test_failed_commits_are_counted():
+    """Test that failures of synchronous commits and of asynchronous commit results are counted."""
+    consumer = MagicMock()
+    consumer.commit.side_effect = KafkaException(KafkaError(KafkaError._TIMED_OUT))
+    offset_commits = OffsetCommitManager(consumer, commit_batches=1, commit_interval=0)
+    failures_before = _failures()
+
+    offset_commits.store([_message(0, 10)])
+    on_commit(None, [TopicPartition("pm", 0, 11)])
+    on_commit(KafkaError(KafkaError.REBALANCE_IN_PROGRESS), [TopicPartition("pm", 0, 11)])
+
+    assert _failures() == failures_before + 2
+
+
+def test_revoked_offsets_are_committed_and_lost_offsets_dropped():
+    """Test that a rebalance commits revoked partitions at once, drops lost ones, and stores neither until reassigned."""
+    consumer = MagicMock()
+    offset_commits = OffsetCommitManager(consumer, commit_batches=100, commit_interval=0)
+    offset_commits.store([_message(0, 10), _message(1, 4), _message(2, 7)])
+
+    offset_commits.on_revoke(consumer, [TopicPartition("pm", 0)])
+    consumer.commit.assert_called_once()
+    assert _committed(consumer) == [(0, 11)]
+    assert consumer.commit.call_args.kwargs["asynchronous"] is False
+
+    offset_commits.on_lost(consumer, [TopicPartition("pm", 1)])
+    # Batches fetched before the rebalance may still be processed afterwards.
+    offset_commits.store([_message(0, 11), _message(1, 5), _message(2, 8)])
+    offset_commits.commit()
+    assert _committed(consumer) == [(2, 9)]
+
+    offset_commits.on_assign(consumer, [TopicPartition("pm", 1)])
+    offset_commits.store([_message(1, 20)])
+    offset_commits.commit()
+    assert _committed(consumer) == [(1, 21)]
@@ -0,0 +1,119 @@
+"""Tests for generating synthetic PM messages in pm_generator.py"""
+
+import io
+import struct
+from unittest.mock import AsyncMock, patch
+
+import avro.io
+import pytest
+
+from network_data_template_app.message_bus_consumer import MessageBusConsumer, counter_presence
+from network_data_template_app.pm_generator import (
+    PmMessageGenerator,
+    load_schema,
+    main,
+    synthetic_cell_fdns,
+)
+from network_data_template_app.replay_consumer import ReplayConsumer, read_recording
+from network_data_template_app.topology_and_inventory import get_sourceids_from_cells
+
+SCHEMA_PATH = "tests/schema_registry_response.json"
+ROP_BEGIN_TIME = 1741031100000
+
+
+@pytest.fixture(name="schema", scope="module")
+def fixture_schema():
+    return load_schema(SCHEMA_PATH)
+
+
+def _decode(schema, value: bytes) -> dict:
+    return avro.io.DatumReader(schema).read(avro.io.BinaryDecoder(io.BytesIO(value[5:])))
+
+
+def test_messages_decode_with_every_counter_present(schema):
+    """Test that a generated message is valid Avro, after the magic byte and schema ID, for its cell and ROP."""
+    cell_fdns = synthetic_cell_fdns(4, cells_per_node=2)
+    generator = PmMessageGenerator(schema, "125", cell_fdns, variants=4)
+
+    messages = list(generator.generate_rop(ROP_BEGIN_TIME))
+    record = _decode(schema, messages[3].value())
+
+    assert len(messages) == 4
+    assert messages[3].value()[:5] == b"\x00" + struct.pack(">I", 125)
+    assert record["moFdn"] == (
+        "ManagedElement=NR01gNodeBRadio00002,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00002-2"
+    )
+    assert record["nodeFDN"] == (
+        "SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00002,ManagedElement=NR01gNodeBRadio00002"
+    )
+    assert record["ropBeginTimeInEpoch"] == ROP_BEGIN_TIME
+    assert record["ropEndTime"] == "2025-03-03T20:00:00+00:00"
+    assert len(record["pmCounters"]) == len(schema.fields_dict["pmCounters"].type.fields)
+    assert all(counter["isValuePresent"] for counter in record["pmCounters"].values())
+    assert record["pmCounters"]["pmActiveUeDlMax"]["counterType"] == "single"
+
+
+def test_headers_and_partitions(schema):
+    """Test that messages carry the headers the consumer filters on, and are spread over partitions by cell."""
+    generator = PmMessageGenerator(schema, "125", synthetic_cell_fdns(3), partitions=2, variants=4)
+
+    messages = list(generator.generate(ROP_BEGIN_TIME, rops=2))
+    headers = dict(messages[0].headers())
+
+    assert headers["schemaSubject"] == b"NR.RAN.PM_COUNTERS.NRCellDU_GNBDU_1"
+    assert headers["schemaID"] == b"125"
+    assert headers["moType"] == b"NRCellDU_GNBDU"
+    assert headers["nodeFDN"] == _decode(schema, messages[0].value())["nodeFDN"].encode("utf-8")
+    assert [(message.partition(), message.offset()) for message in messages] == [
+        (0, 0), (1, 0), (0, 1), (0, 2), (1, 1), (0, 3)
+    ]
+    assert _decode(schema, messages[3].value())["ropBeginTimeInEpoch"] == ROP_BEGIN_TIME + 900000
+
+
+def test_messages_are_deterministic_for_a_seed(schema):
+    """Test that the same seed generates the same messages, and another seed different counter values."""
+    cell_fdns = synthetic_cell_fdns(3)
+
+    def values(seed: int) -> list[bytes]:
+        generator = PmMessageGenerator(schema, "125", cell_fdns, seed=seed, variants=4)
+        return [message.value() for message in generator.generate(ROP_BEGIN_TIME, rops=2)]
+
+    assert values(7) == values(7)
+    assert values(7) != values(8)
+
+
+def test_main_writes_a_recording(tmp_path):
+    """Test that the tool writes one message per cell and ROP to a recording."""
+    path = str(tmp_path / "recording.jsonl")
+
+    main(["--schema", SCHEMA_PATH, "--cell-count", "5", "--rops", "2", "--output", path])
+
+    recorded = read_recording(path)
+    assert len(recorded) == 10
+    assert recorded[9].offset() == 9
+
+
+@pytest.mark.asyncio
+async def test_message_bus_consumer_processes_generated_messages(
+    schema,
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that the consumer pipeline accepts generated messages for the cells of Topology & Inventory."""
+    cell_fdns = get_sourceids_from_cells(get_topology_get_nr_cell_dus_response)
+    generator = PmMessageGenerator(schema, "125", cell_fdns, variants=4)
+    replay = ReplayConsumer(list(generator.generate_rop(ROP_BEGIN_TIME)))
+    with patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(sync_oauth_client, async_oauth_client, replay)
+        await consumer._fetch_prefixed_fdns()
+        while not replay.exhausted:
+            await consumer._consume_messages()
+
+    assert all(counter_presence.is_set(cell_id) for cell_id in range(len(counter_presence)))
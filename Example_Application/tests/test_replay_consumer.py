@@ -0,0 +1,141 @@
+"""Tests for replaying recorded messages in replay_consumer.py"""
+
+import json
+import pickle
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from confluent_kafka import OFFSET_INVALID, TIMESTAMP_CREATE_TIME, TopicPartition
+
+from network_data_template_app.message_bus_consumer import (
+    MessageBusConsumer,
+    counter_presence,
+    create_message_bus_consumers,
+)
+from network_data_template_app.replay_consumer import (
+    RecordedMessage,
+    ReplayConsumer,
+    read_recording,
+    write_recording,
+)
+
+CELL_FDN = "urn:3gpp:dn:SubNetwork=Europe,SubNetwork=Ireland,MeContext=NR01gNodeBRadio00087,ManagedElement=NR01gNodeBRadio00087,GNBDUFunction=1,NRCellDU=NR01gNodeBRadio00087-1"
+
+
+def _pm_message(offset: int, partition: int = 0) -> RecordedMessage:
+    with open("tests/kafka_valid_msg_headers.json", "rb") as file:
+        headers = [(key, value.encode("utf-8")) for key, value in json.load(file)]
+    with open("tests/pm_message_value.bin", "rb") as file:
+        value = pickle.load(file)
+    return RecordedMessage("pm", partition, offset, 1741032000000 + offset, headers, value)
+
+
+def _messages(count: int) -> list[RecordedMessage]:
+    return [_pm_message(offset, partition=offset % 2) for offset in range(count)]
+
+
+def test_recording_round_trip(tmp_path):
+    """Test that a written recording reads back as the same messages."""
+    path = str(tmp_path / "recording.jsonl")
+    messages = _messages(3)
+
+    write_recording(path, messages)
+    recorded = read_recording(path)
+
+    assert [message.offset() for message in recorded] == [0, 1, 2]
+    assert recorded[1].partition() == 1
+    assert recorded[2].timestamp() == (TIMESTAMP_CREATE_TIME, 1741032000002)
+    assert recorded[0].headers() == messages[0].headers()
+    assert recorded[0].value() == messages[0].value()
+    assert recorded[0].error() is None
+
+
+def test_consume_replays_in_batches_then_idles():
+    """Test that messages are returned in batches of at most `num_messages`, then none once the replay is over."""
+    replay = ReplayConsumer(_messages(5))
+
+    assert [message.offset() for message in replay.consume(num_messages=3, timeout=1.0)] == [0, 1, 2]
+    assert [message.offset() for message in replay.consume(num_messages=3, timeout=1.0)] == [3, 4]
+    assert replay.exhausted
+    assert replay.consume(num_messages=3, timeout=0) == []
+
+
+def test_later_passes_continue_offsets_and_timestamps():
+    """Test that each pass continues the offsets and moves the timestamps forward by the span of the recording."""
+    replay = ReplayConsumer(_messages(2), passes=2)
+
+    messages = replay.consume(num_messages=10, timeout=0)
+
+    assert [message.offset() for message in messages] == [0, 1, 2, 3]
+    assert [message.timestamp()[1] - 1741032000000 for message in messages] == [0, 1, 2, 3]
+    assert replay.get_watermark_offsets(TopicPartition("pm", 1)) == (0, 4)
+
+
+def test_rate_limits_released_messages():
+    """Test that messages are released at `rate` messages per second."""
+    replay = ReplayConsumer(_messages(1), rate=200, passes=0)
+    start_time = time.monotonic()
+
+    batch = replay.consume(num_messages=10, timeout=5.0)
+
+    assert len(batch) == 10
+    assert 0.04 < time.monotonic() - start_time < 1.0
+    assert len(replay.consume(num_messages=100, timeout=0)) < 100
+
+
+def test_commits_are_reported_and_close_stops_the_replay():
+    """Test that committed offsets are reported per partition, and consuming after closing raises RuntimeError."""
+    replay = ReplayConsumer(_messages(2))
+    replay.commit(offsets=[TopicPartition("pm", 0, 1)], asynchronous=True)
+
+    assert [partition.offset for partition in replay.committed(replay.assignment())] == [1, OFFSET_INVALID]
+
+    replay.close()
+    with pytest.raises(RuntimeError):
+        replay.consume(num_messages=1, timeout=0)
+
+
+@pytest.mark.asyncio
+async def test_message_bus_consumer_processes_replayed_messages(
+    authentication_and_authorization,
+    get_schema_valid_schema,
+    sync_oauth_client,
+    async_oauth_client,
+    get_topology_get_nr_cell_dus_response,
+):
+    """Test that the consumer pipeline runs unchanged on a replay, committing the offsets of the replayed messages."""
+    replay = ReplayConsumer([_pm_message(0), _pm_message(1)])
+    with patch(
+        "network_data_template_app.topology_and_inventory.get_nr_cell_dus",
+        new_callable=AsyncMock,
+        return_value=get_topology_get_nr_cell_dus_response,
+    ):
+        consumer = MessageBusConsumer(sync_oauth_client, async_oauth_client, replay)
+        await consumer._fetch_prefixed_fdns()
+        await consumer._consume_messages()
+    consumer.offset_commits.commit(asynchronous=False)
+
+    assert counter_presence.is_set(counter_presence.cell_fdns.index(CELL_FDN))
+    assert replay.committed([TopicPartition("pm", 0)])[0].offset == 2
+
+
+def test_create_message_bus_consumers_replays_file(
+    monkeypatch,
+    tmp_path,
+    authentication_and_authorization,
+    sync_oauth_client,
+    async_oauth_client,
+):
+    """Test that with a replay file configured, a single consumer replays it instead of using the Message Bus."""
+    path = str(tmp_path / "recording.jsonl")
+    write_recording(path, _messages(3))
+    monkeypatch.setenv("REPLAY_FILE", path)
+    monkeypatch.setenv("REPLAY_RATE", "50.0")
+    monkeypatch.setenv("CONSUMER_WORKERS", "2")
+
+    [consumer] = create_message_bus_consumers(sync_oauth_client, async_oauth_client)
+
+    assert isinstance(consumer.consumer, ReplayConsumer)
+    assert consumer.consumer.total == 3
+    assert consumer.consumer.rate == 50.0
@@ -1,12 +1,24 @@
 import asyncio
 import json
+from unittest.mock import patch
 
 import pytest
 
-from network_data_template_app.message_bus_consumer import fdn_to_pm_counter_status
+from network_data_template_app.counter_store import PmCounterStore
+from network_data_template_app.message_bus_consumer import counter_presence
 from network_data_template_app.report_generator import ReportGenerator
 
 
+def load_counter_status(path: str):
+    """Allocate `counter_presence` for the FDNs of a status map file, setting the cells which collected counters."""
+    with open(path, "r", encoding="utf-8") as f_map:
+        counter_status = json.load(f_map)
+    counter_presence.allocate(list(counter_status))
+    for cell_id, has_counters in enumerate(counter_status.values()):
+        if has_counters:
+            counter_presence.set(cell_id)
+
+
 async def block_until(condition):
     while not condition():
         await asyncio.sleep(0.1)
@@ -17,11 +29,7 @@ async def test_report_scheduler(
     network_configuration_api, no_log_certs, config, async_oauth_client, caplog
 ):
     """Test two intervals of the report scheduler. Each interval provides 10 results, so in the end expect 20."""
-    with open(
-        "tests/fdn_to_pm_counter_status_mock.json", "r", encoding="utf-8"
-    ) as f_map:
-        fdn_to_pm_counter_status.clear()
-        fdn_to_pm_counter_status.update(json.load(f_map))
+    load_counter_status("tests/fdn_to_pm_counter_status_mock.json")
 
     report = ReportGenerator(async_oauth_client, clear_data_upon_usage=False)
     report.start_schedule(trigger="interval", seconds=0.2)
@@ -41,7 +49,7 @@ async def test_report_scheduler(
     assert "8 out of 10" in caplog.text
 
     report.stop_schedule()
-    fdn_to_pm_counter_status.clear()
+    counter_presence.allocate([])
 
 
 @pytest.mark.asyncio
@@ -49,11 +57,7 @@ async def test_report_scheduler_no_counters(
     network_configuration_api, no_log_certs, config, async_oauth_client, caplog
 ):
     """Test the report scheduler with no PM counters collected. Expected log message includes 'No PM counters collected' and a table of NRCellDUs"""
-    with open(
-        "tests/fdn_to_pm_counter_status_false.json", "r", encoding="utf-8"
-    ) as f_map:
-        fdn_to_pm_counter_status.clear()
-        fdn_to_pm_counter_status.update(json.load(f_map))
+    load_counter_status("tests/fdn_to_pm_counter_status_false.json")
 
     report = ReportGenerator(async_oauth_client, clear_data_upon_usage=False)
     report.start_schedule(trigger="interval", seconds=0.2)
@@ -65,7 +69,7 @@ async def test_report_scheduler_no_counters(
     assert caplog.text.count(fdn_prefix) == 10
 
     report.stop_schedule()
-    fdn_to_pm_counter_status.clear()
+    counter_presence.allocate([])
 
 
 @pytest.mark.asyncio
@@ -78,11 +82,7 @@ async def test_report_scheduler_ncmp_error(
     caplog,
 ):
     """Test the report scheduler with no PM counters collected. Expected log message includes 'No PM counters collected' and a table of NRCellDUs"""
-    with open(
-        "tests/fdn_to_pm_counter_status_false.json", "r", encoding="utf-8"
-    ) as f_map:
-        fdn_to_pm_counter_status.clear()
-        fdn_to_pm_counter_status.update(json.load(f_map))
+    load_counter_status("tests/fdn_to_pm_counter_status_false.json")
 
     report = ReportGenerator(async_oauth_client, clear_data_upon_usage=False)
     report.start_schedule(trigger="interval", seconds=0.2)
@@ -92,7 +92,7 @@ async def test_report_scheduler_ncmp_error(
     assert caplog.text.count("operationalState=UNKNOWN") == 10
 
     report.stop_schedule()
-    fdn_to_pm_counter_status.clear()
+    counter_presence.allocate([])
 
 
 @pytest.mark.asyncio
@@ -101,11 +101,7 @@ async def test_report_scheduler_clears_data(
 ):
     """Test two intervals of the report scheduler which clears the data upon usage."""
     # Set up the necessary data for the test
-    with open(
-        "tests/fdn_to_pm_counter_status_mock.json", "r", encoding="utf-8"
-    ) as f_map:
-        fdn_to_pm_counter_status.clear()
-        fdn_to_pm_counter_status.update(json.load(f_map))
+    load_counter_status("tests/fdn_to_pm_counter_status_mock.json")
 
     # Create an instance of the ReportGenerator class with clear_data_upon_usage=True
     report = ReportGenerator(async_oauth_client, clear_data_upon_usage=True)
@@ -123,4 +119,27 @@ async def test_report_scheduler_clears_data(
     assert "0 out of 10" in caplog.text
 
     report.stop_schedule()
-    fdn_to_pm_counter_status.clear()
+    counter_presence.allocate([])
+
+
+@pytest.mark.asyncio
+async def test_report_scheduler_logs_counter_store(
+    network_configuration_api, no_log_certs, config, async_oauth_client, caplog
+):
+    """Test that with the counter store enabled, the report also logs how many cells reported counters in the latest ROP."""
+    load_counter_status("tests/fdn_to_pm_counter_status_mock.json")
+    store = PmCounterStore(retention=2, max_counters=10)
+    store.allocate(counter_presence.cell_fdns)
+    store.record(0, 1741031100000, {"pmA": 1, "pmB": 2})
+    store.record(3, 1741031100000, {"pmA": 3})
+
+    with patch("network_data_template_app.report_generator.pm_counter_store", store):
+        report = ReportGenerator(async_oauth_client, clear_data_upon_usage=False)
+        report.start_schedule(trigger="interval", seconds=0.2)
+        await asyncio.wait_for(
+            block_until(lambda: "Stored values" in caplog.text), timeout=1
+        )
+        report.stop_schedule()
+
+    assert "Stored values of 2 PM counters for 2 out of 10 NRCellDUs in the ROP starting at 19:45 (UTC)" in caplog.text
+    counter_presence.allocate([])
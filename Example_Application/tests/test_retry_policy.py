@@ -0,0 +1,153 @@
+"""Tests for retrying requests to platform services in retry_policy.py"""
+
+import asyncio
+
+import httpx
+import pytest
+from httpx import Response
+
+import network_data_template_app.topology_and_inventory as topology_and_inventory
+from network_data_template_app.metrics import metrics_registry
+from network_data_template_app.retry_policy import (
+    CLOSED,
+    OPEN,
+    CircuitOpenError,
+    DeadlineExceededError,
+    RetryBudget,
+    RetryPolicy,
+)
+
+
+def _status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://www.iam-base-url.com")
+    return httpx.HTTPStatusError(
+        f"{status_code}", request=request, response=Response(status_code, request=request)
+    )
+
+
+def _failing_request(errors: list[Exception], result: str = "ok"):
+    """A request raising each of `errors` in turn, then returning `result`, which records its attempts."""
+    attempts = []
+
+    async def request() -> str:
+        attempts.append(len(attempts))
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+
+    return request, attempts
+
+
+@pytest.fixture(name="retry_settings")
+def fixture_retry_settings(monkeypatch):
+    monkeypatch.setenv("MAX_RETRIES", "3")
+    monkeypatch.setenv("RETRY_DELAY", "0.001")
+    monkeypatch.setenv("CIRCUIT_BREAKER_THRESHOLD", "0")
+
+
+@pytest.mark.asyncio
+async def test_retries_errors_which_may_pass(retry_settings):
+    """Test that 5xx responses and connection errors are retried until the request succeeds."""
+    request, attempts = _failing_request([_status_error(503), httpx.ConnectError("refused")])
+
+    assert await RetryPolicy("topology").call(request) == "ok"
+    assert len(attempts) == 3
+
+
+@pytest.mark.asyncio
+async def test_raises_other_errors_at_once(retry_settings):
+    """Test that a 404 is not retried, and that a request still failing after every attempt raises its error."""
+    request, attempts = _failing_request([_status_error(404)])
+    with pytest.raises(httpx.HTTPStatusError):
+        await RetryPolicy("topology").call(request)
+    assert len(attempts) == 1
+
+    request, attempts = _failing_request([_status_error(500)] * 3)
+    with pytest.raises(httpx.HTTPStatusError):
+        await RetryPolicy("topology").call(request)
+    assert len(attempts) == 3
+
+
+@pytest.mark.asyncio
+async def test_deadline_interrupts_a_slow_request(retry_settings):
+    """Test that a request still in progress at the deadline is cancelled."""
+    started = asyncio.Event()
+
+    async def request():
+        started.set()
+        await asyncio.sleep(10)
+
+    deadline_exceeded = metrics_registry.counters.get("upstream_deadline_exceeded")
+    count = deadline_exceeded._value.get()
+    with pytest.raises(DeadlineExceededError):
+        await RetryPolicy("schema_registry").call(request, deadline=0.05)
+    assert started.is_set()
+    assert deadline_exceeded._value.get() == count + 1
+
+
+@pytest.mark.asyncio
+async def test_retry_budget_limits_retries(retry_settings, monkeypatch):
+    """Test that once the retry budget is spent, failed requests are not retried until calls earn it back."""
+    monkeypatch.setenv("RETRY_BUDGET_RATIO", "0.5")
+    policy = RetryPolicy("network_configuration")
+    policy.budget = RetryBudget(reserve=1.0)
+    policy.budget.balance = 0.0
+
+    request, attempts = _failing_request([_status_error(500)])
+    with pytest.raises(httpx.HTTPStatusError):
+        await policy.call(request)
+    assert len(attempts) == 1
+
+    request, attempts = _failing_request([_status_error(500)])
+    assert await policy.call(request) == "ok"
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_opens_then_closes_after_a_successful_trial(retry_settings, monkeypatch):
+    """Test that consecutive failures open the circuit, and that a request after the reset timeout closes it."""
+    monkeypatch.setenv("MAX_RETRIES", "1")
+    monkeypatch.setenv("CIRCUIT_BREAKER_THRESHOLD", "2")
+    monkeypatch.setenv("CIRCUIT_BREAKER_RESET_TIMEOUT", "0.05")
+    policy = RetryPolicy("data_management")
+    state = metrics_registry.gauges.get("upstream_circuit_state").labels("data_management")
+
+    for _ in range(2):
+        request, _attempts = _failing_request([httpx.ConnectError("refused")])
+        with pytest.raises(httpx.ConnectError):
+            await policy.call(request)
+    request, attempts = _failing_request([])
+    with pytest.raises(CircuitOpenError):
+        await policy.call(request)
+    assert not attempts
+    assert state._value.get() == OPEN
+
+    await asyncio.sleep(0.05)
+    assert await policy.call(request) == "ok"
+    assert state._value.get() == CLOSED
+
+
+def test_call_sync_retries(retry_settings):
+    """Test that blocking requests are retried the same way."""
+    attempts = []
+
+    def request() -> str:
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise _status_error(429)
+        return "ok"
+
+    assert RetryPolicy("data_management").call_sync(request) == "ok"
+    assert len(attempts) == 2
+
+
+@pytest.mark.asyncio
+async def test_topology_request_is_retried(retry_settings, mock_apis, config, async_oauth_client):
+    """Test that Topology & Inventory requests go through the retry policy, and succeed after a 503."""
+    responses = iter([Response(status_code=503), Response(status_code=200, json={"items": []})])
+    mock_apis.get(
+        url__startswith=config.get("iam_base_url") + "/topology-inventory/v1alpha11"
+    ).mock(side_effect=lambda request: next(responses))
+
+    assert await topology_and_inventory.get_nr_cell_dus(async_oauth_client) == []
+    assert metrics_registry.counters.get("topology_failed_requests")._value.get() >= 1
@@ -0,0 +1,74 @@
+"""Tests for the duplicate PM message suppression in rop_dedup.py"""
+
+import numpy as np
+
+from network_data_template_app.metrics import metrics_registry
+from network_data_template_app.rop_dedup import RopDeduplicator
+
+ROP_MS = 15 * 60 * 1000
+ROP = 1741031100000
+
+
+def _deduplicator(retention=2, cells=20) -> RopDeduplicator:
+    deduplicator = RopDeduplicator(retention)
+    deduplicator.allocate(cells)
+    return deduplicator
+
+
+def _suppressed() -> float:
+    return next(
+        sample.value
+        for sample in metrics_registry.counters.get("duplicate_messages_suppressed")
+        .collect()[0]
+        .samples
+        if sample.name.endswith("_total")
+    )
+
+
+def test_repeated_cell_and_rop_is_a_duplicate():
+    """Test that only the second message of a cell for a ROP is a duplicate, and that it is counted."""
+    deduplicator = _deduplicator()
+    suppressed_before = _suppressed()
+
+    assert not deduplicator.is_duplicate(9, ROP)
+    assert not deduplicator.is_duplicate(8, ROP)
+    assert not deduplicator.is_duplicate(9, ROP + ROP_MS)
+    assert deduplicator.is_duplicate(9, ROP)
+    assert _suppressed() == suppressed_before + 1
+
+
+def test_new_rop_replaces_the_oldest():
+    """Test that only `retention` ROPs are remembered, and that a ROP older than all of them is never a duplicate."""
+    deduplicator = _deduplicator()
+    deduplicator.is_duplicate(0, ROP)
+    deduplicator.is_duplicate(0, ROP + ROP_MS)
+    deduplicator.is_duplicate(19, ROP + 2 * ROP_MS)
+
+    assert sorted(deduplicator._seen) == [ROP + ROP_MS, ROP + 2 * ROP_MS]
+    assert not deduplicator.is_duplicate(0, ROP)
+    assert deduplicator.is_duplicate(0, ROP + ROP_MS)
+    # The bitset of the evicted ROP was cleared before being reused.
+    assert not deduplicator.is_duplicate(0, ROP + 2 * ROP_MS)
+
+
+def test_allocate_forgets_cells_seen():
+    """Test that reallocating for new cells starts with no cells seen, with one bit per cell."""
+    deduplicator = _deduplicator()
+    deduplicator.is_duplicate(3, ROP)
+    deduplicator.allocate(17)
+
+    assert not deduplicator.is_duplicate(3, ROP)
+    assert len(deduplicator._seen[ROP]) == 3
+
+
+def test_reindex_remembers_cells_which_remain():
+    """Test that reindexing for new cells keeps the cells seen under their new IDs, and none for added cells."""
+    deduplicator = _deduplicator()
+    deduplicator.is_duplicate(3, ROP)
+    deduplicator.is_duplicate(19, ROP)
+
+    deduplicator.reindex(np.array([19, -1, 3]))
+
+    assert deduplicator.cell_count == 3
+    assert deduplicator.is_duplicate(0, ROP) and deduplicator.is_duplicate(2, ROP)
+    assert not deduplicator.is_duplicate(1, ROP)
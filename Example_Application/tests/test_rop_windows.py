@@ -0,0 +1,133 @@
+"""Tests for the event-time ROP windows in rop_windows.py"""
+
+import numpy as np
+
+from network_data_template_app.metrics import metrics_registry
+from network_data_template_app.rop_windows import (
+    CLOSED_ON_COMPLETE,
+    CLOSED_ON_EVICTION,
+    CLOSED_ON_WATERMARK,
+    RopWindows,
+)
+
+ROP_MS = 15 * 60 * 1000
+ROP = 1741031100000
+
+
+def _windows(max_open=4, allowed_lateness=300.0) -> RopWindows:
+    windows = RopWindows(max_open, allowed_lateness)
+    windows.allocate(["cell-a", "cell-b", "cell-c"])
+    return windows
+
+
+def _counter_value(name):
+    return next(
+        sample.value
+        for sample in metrics_registry.counters.get(name).collect()[0].samples
+        if sample.name.endswith("_total")
+    )
+
+
+def test_window_closes_as_soon_as_every_cell_reports():
+    """Test that a window closes on the message completing it, with the counters summed over the cells."""
+    windows = _windows()
+    windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1, "pmB": 2})
+    windows.observe(1, ROP, ROP + ROP_MS, {"pmA": 3})
+    assert not windows.closed
+
+    windows.observe(2, ROP, ROP + ROP_MS, {"pmA": 5})
+
+    [window] = windows.closed
+    assert (window.rop_begin_time, window.rop_end_time) == (ROP, ROP + ROP_MS)
+    assert window.closed_by == CLOSED_ON_COMPLETE
+    assert window.complete and window.cells_reported == 3
+    assert window.counters == {"pmA": 9, "pmB": 2}
+
+
+def test_repeated_cell_is_counted_once():
+    """Test that a cell reporting twice for the same ROP does not add its counters twice."""
+    windows = _windows()
+    windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    windows.observe(1, ROP, ROP + ROP_MS, None)
+    windows.observe(1, ROP, ROP + ROP_MS, {"pmA": 2})
+    windows.observe(2, ROP, ROP + ROP_MS, {"pmA": 4})
+
+    assert windows.closed[0].counters == {"pmA": 7}
+
+
+def test_watermark_closes_incomplete_window_and_drops_late_messages():
+    """Test that a window closes incomplete once the watermark passes its end, and later messages for it are late."""
+    windows = _windows(allowed_lateness=1200.0)
+    late_before = _counter_value("rop_window_late_messages")
+    windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    # The next ROP ends less than 1200 seconds after this ROP, so this ROP stays open.
+    windows.observe(0, ROP + ROP_MS, ROP + 2 * ROP_MS, {"pmA": 1})
+    assert not windows.closed
+
+    windows.observe(0, ROP + 2 * ROP_MS, ROP + 3 * ROP_MS, {"pmA": 1})
+
+    [window] = windows.closed
+    assert window.rop_begin_time == ROP
+    assert window.closed_by == CLOSED_ON_WATERMARK
+    assert window.reported.tolist() == [True, False, False]
+    assert not windows.observe(1, ROP, ROP + ROP_MS, {"pmA": 1})
+    assert _counter_value("rop_window_late_messages") == late_before + 1
+
+
+def test_no_allowed_lateness_closes_windows_on_the_next_rop():
+    """Test that with no allowed lateness, messages for the latest ROP are accepted, and a later ROP closes its window."""
+    windows = _windows(allowed_lateness=0)
+    late_before = _counter_value("rop_window_late_messages")
+    assert windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    assert windows.observe(1, ROP, ROP + ROP_MS, {"pmA": 2})
+    assert not windows.closed
+
+    assert windows.observe(0, ROP + ROP_MS, ROP + 2 * ROP_MS, {"pmA": 4})
+    assert not windows.observe(2, ROP, ROP + ROP_MS, {"pmA": 8})
+
+    [window] = windows.closed
+    assert window.closed_by == CLOSED_ON_WATERMARK
+    assert window.cells_reported == 2 and window.counters == {"pmA": 3}
+    assert _counter_value("rop_window_late_messages") == late_before + 1
+
+def test_messages_for_a_completed_window_are_late():
+    """Test that a message for a ROP whose window closed complete is dropped, even before the watermark passes it."""
+    windows = _windows()
+    for cell_id in range(3):
+        windows.observe(cell_id, ROP, ROP + ROP_MS, {"pmA": 1})
+
+    assert not windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    assert len(windows.closed) == 1
+
+
+def test_opening_too_many_windows_evicts_the_oldest():
+    """Test that at most `max_open` windows are open, and a ROP older than all of them is late."""
+    windows = _windows(max_open=2, allowed_lateness=86400.0)
+    incomplete_before = _counter_value("rop_windows_closed_incomplete")
+    windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    windows.observe(0, ROP + ROP_MS, ROP + 2 * ROP_MS, {"pmA": 1})
+    windows.observe(0, ROP + 2 * ROP_MS, ROP + 3 * ROP_MS, {"pmA": 1})
+
+    assert [window.rop_begin_time for window in windows.closed] == [ROP]
+    assert windows.closed[0].closed_by == CLOSED_ON_EVICTION
+    assert _counter_value("rop_windows_closed_incomplete") == incomplete_before + 1
+    assert not windows.observe(1, ROP - ROP_MS, ROP, {"pmA": 1})
+    assert metrics_registry.gauges.get("rop_window_open_windows")._value.get() == 2
+
+
+def test_reindex_closes_windows_complete_for_the_remaining_cells():
+    """Test that a window closes once every remaining cell has reported, naming the cells it expected when it closed."""
+    windows = _windows(allowed_lateness=1200.0)
+    windows.observe(0, ROP, ROP + ROP_MS, {"pmA": 1})
+    windows.observe(1, ROP + ROP_MS, ROP + 2 * ROP_MS, {"pmA": 2})
+
+    windows.reindex(["cell-a", "cell-d"], np.array([0, -1]))
+    assert not windows.closed
+    windows.reindex(["cell-a"], np.array([0]))
+
+    [window] = windows.closed
+    assert window.rop_begin_time == ROP
+    assert window.closed_by == CLOSED_ON_COMPLETE
+    assert window.cell_fdns == ["cell-a"]
+    assert window.counters == {"pmA": 1}
@@ -0,0 +1,128 @@
+"""Tests for the schema cache in schema_cache.py and the schema prefetch in schema_registry.py"""
+
+import asyncio
+import json
+import os
+
+import avro.schema
+import pytest
+import respx
+from httpx import Response
+
+from network_data_template_app.schema_cache import SchemaCache
+from network_data_template_app.schema_registry import prefetch_schema, schema_cache
+
+
+@pytest.fixture(name="pm_schema")
+def fixture_pm_schema():
+    with open("./tests/schema_registry_response.json", "r", encoding="utf-8") as f:
+        return avro.schema.parse(json.load(f)["schema"])
+
+
+def _fetcher(result):
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        await asyncio.sleep(0)
+        return result
+
+    return fetch, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_lookup(pm_schema):
+    """Test that concurrent lookups of the same schema ID make one request, and later lookups are cache hits."""
+    cache = SchemaCache(max_size=8, ttl=60, negative_ttl=1)
+    fetch, calls = _fetcher(pm_schema)
+
+    results = await asyncio.gather(*(cache.get("125", fetch) for _ in range(5)))
+    assert results == [pm_schema] * 5
+    assert await cache.get("125", fetch) is pm_schema
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_lookups_are_retried_after_negative_ttl(pm_schema):
+    """Test that a failed lookup is remembered only for the negative TTL, and expired schemas are fetched again."""
+    cache = SchemaCache(max_size=8, ttl=0, negative_ttl=0.05)
+    failing_fetch, failing_calls = _fetcher(None)
+
+    assert await cache.get("125", failing_fetch) is None
+    assert await cache.get("125", failing_fetch) is None
+    assert len(failing_calls) == 1
+
+    await asyncio.sleep(0.06)
+    fetch, calls = _fetcher(pm_schema)
+    assert await cache.get("125", fetch) is pm_schema
+    assert await cache.get("125", fetch) is pm_schema  # a TTL of zero expires straight away
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_least_recently_used_schema_is_evicted(pm_schema):
+    """Test that the cache holds at most `max_size` schema IDs, evicting the least recently used."""
+    cache = SchemaCache(max_size=2, ttl=60, negative_ttl=1)
+    fetch, calls = _fetcher(pm_schema)
+    for schema_id in ("1", "2", "1", "3"):
+        await cache.get(schema_id, fetch)
+    assert len(cache) == 2
+    assert len(calls) == 3
+
+    await cache.get("1", fetch)
+    assert len(calls) == 3
+    await cache.get("2", fetch)
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_is_reused_after_restart(tmp_path, pm_schema):
+    """Test that schemas written to disk are loaded by a new cache, and used when the registry is unavailable."""
+    cache_dir = str(tmp_path / "schemas")
+    fetch, _ = _fetcher(pm_schema)
+    await SchemaCache(8, 60, 1, cache_dir).get("125", fetch)
+    await SchemaCache(8, 60, 1, cache_dir).get("../125", fetch)
+    assert os.listdir(cache_dir) == ["125.avsc"]
+
+    restarted_cache = SchemaCache(8, 60, 1, cache_dir)
+    assert await restarted_cache.load_from_disk() == 1
+    no_fetch, no_fetch_calls = _fetcher(None)
+    assert await restarted_cache.get("125", no_fetch) == pm_schema
+    assert not no_fetch_calls
+
+    unavailable_registry_cache = SchemaCache(8, 60, 1, cache_dir)
+    assert await unavailable_registry_cache.get("125", no_fetch) == pm_schema
+    assert len(no_fetch_calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetch_schema_caches_latest_schema_of_subject(
+    authentication_and_authorization, config, async_oauth_client
+):
+    """Test that prefetching a data job's `dataDeliverySchemaId` caches its latest schema under its schema ID."""
+    with open("./tests/schema_registry_response.json", "r", encoding="utf-8") as f:
+        schema_json = json.load(f)["schema"]
+    subject_url = (
+        config.get("iam_base_url")
+        + "/schema-registry-sr/view/subjects/NR.RAN.PM_COUNTERS.NRCellDU_GNBDU_1/versions/latest"
+    )
+    with respx.mock(assert_all_called=True) as respx_mock:
+        respx_mock.get(subject_url) % Response(
+            status_code=200,
+            json={
+                "subject": "NR.RAN.PM_COUNTERS.NRCellDU_GNBDU_1",
+                "version": 1,
+                "id": 9125,
+                "schema": schema_json,
+            },
+        )
+        schema_id = await prefetch_schema(
+            config.get("iam_base_url"),
+            async_oauth_client,
+            "NR.RAN.PM_COUNTERS.NRCellDU_GNBDU_1",
+        )
+
+    assert schema_id == "9125"
+    no_fetch, no_fetch_calls = _fetcher(None)
+    assert await schema_cache.get("9125", no_fetch) == avro.schema.parse(schema_json)
+    assert not no_fetch_calls
@@ -6,7 +6,9 @@ from httpx import TimeoutException, RequestError
 from unittest.mock import patch
 import json
 
+from network_data_template_app.counter_store import PmCounterStore
 from network_data_template_app.mtls_logging import logger
+from network_data_template_app.rop_windows import RopWindows
 from network_data_template_app.metrics import SERVICE_PREFIX
 
 def test_get_root_returns_bad_response(client):
@@ -38,6 +40,24 @@ def test_get_topology_returns_topology(topology_api, client):
         ]
 
 
+def test_topology_is_served_from_the_cache_with_an_etag(topology_api, mock_apis, client):
+    """
+    GET to "/topology" twice, the second time with the ETag of the first
+    304 Not Modified, without querying Topology & Inventory again
+    """
+    response = client.get("/network-data-template-app/topology")
+    etag = response.headers["ETag"]
+    calls = mock_apis.calls.call_count
+
+    not_modified = client.get(
+        "/network-data-template-app/topology", headers={"If-None-Match": f"W/{etag}"}
+    )
+
+    assert [not_modified.status_code, not_modified.content] == [304, b""]
+    assert not_modified.headers["ETag"] == etag
+    assert mock_apis.calls.call_count == calls
+
+
 def test_topology_timeout_error(client):
     """
     GET to "/topology"
@@ -431,3 +451,91 @@ def test_get_health_returns_health_check(client):
     assert [response.json(), response.status_code] == [expected_response, 200]
     response = client.get("/network-data-template-app/health/readiness")
     assert [response.json(), response.status_code] == [expected_response, 200]
+
+
+def test_get_pm_counter_values_returns_latest_rop(client):
+    """
+    GET to "/pm-counters/{counter}"
+    200 OK
+    Body with the counter's value for each cell which reported it in the latest ROP
+    """
+    store = PmCounterStore(retention=2, max_counters=2)
+    store.allocate(["cell-a", "cell-b", "cell-c"])
+    store.record(0, 1741031100000, {"pmA": 1})
+    store.record(0, 1741032000000, {"pmA": 2})
+    store.record(2, 1741032000000, {"pmA": 2**53 + 1, "pmB": 4})
+    with patch("network_data_template_app.routes.pm_counter_store", store):
+        summary = client.get("/network-data-template-app/pm-counters")
+        latest = client.get("/network-data-template-app/pm-counters/pmA")
+        previous = client.get(
+            "/network-data-template-app/pm-counters/pmA", params={"rop": 1741031100000}
+        )
+        unknown = client.get("/network-data-template-app/pm-counters/pmC")
+
+    assert summary.json() == {
+        "ropBeginTimesInEpoch": [1741031100000, 1741032000000],
+        "counters": ["pmA", "pmB"],
+        "cells": 3,
+    }
+    assert [latest.status_code, latest.json()] == [
+        200,
+        {"counter": "pmA", "ropBeginTimeInEpoch": 1741032000000, "values": {"cell-a": 2, "cell-c": 2**53 + 1}},
+    ]
+    assert previous.json()["values"] == {"cell-a": 1}
+    assert unknown.status_code == 404
+
+
+def test_get_pm_counter_values_when_store_is_disabled(client):
+    """
+    GET to "/pm-counters/{counter}"
+    404 Not Found
+    Body containing error message
+    """
+    with patch(
+        "network_data_template_app.routes.pm_counter_store", PmCounterStore(0, 300)
+    ):
+        response = client.get("/network-data-template-app/pm-counters/pmA")
+    assert [response.json(), response.status_code] == [
+        {"Error": "The PM counter store is disabled."},
+        404,
+    ]
+
+
+def test_get_rop_windows_returns_closed_windows(client):
+    """
+    GET to "/rop-windows"
+    200 OK
+    Body with each closed ROP window, its missing cells and its summed counters
+    """
+    windows = RopWindows(max_open=2, allowed_lateness=300.0)
+    windows.allocate(["cell-a", "cell-b"])
+    windows.observe(0, 1741031100000, 1741032000000, {"pmA": 1})
+    windows.observe(1, 1741031100000, 1741032000000, {"pmA": 2})
+    windows.observe(0, 1741032000000, 1741032900000, {"pmA": 3})
+    windows.observe(0, 1741032900000, 1741033800000, {"pmA": 4})
+    with patch("network_data_template_app.routes.rop_windows", windows):
+        response = client.get("/network-data-template-app/rop-windows")
+
+    assert [response.status_code, response.json()] == [
+        200,
+        [
+            {
+                "ropBeginTimeInEpoch": 1741031100000,
+                "ropEndTimeInEpoch": 1741032000000,
+                "closedBy": "complete",
+                "cellsReported": 2,
+                "cells": 2,
+                "missingCells": [],
+                "counters": {"pmA": 3},
+            },
+            {
+                "ropBeginTimeInEpoch": 1741032000000,
+                "ropEndTimeInEpoch": 1741032900000,
+                "closedBy": "watermark",
+                "cellsReported": 1,
+                "cells": 2,
+                "missingCells": ["cell-b"],
+                "counters": {"pmA": 3},
+            },
+        ],
+    ]
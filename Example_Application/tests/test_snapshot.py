@@ -0,0 +1,127 @@
+"""Tests for the consumer state snapshots in snapshot.py"""
+
+import pytest
+
+from network_data_template_app.counter_presence import CounterPresence
+from network_data_template_app.counter_shards import CounterStatusShards
+from network_data_template_app.counter_store import PmCounterStore
+from network_data_template_app.snapshot import ConsumerSnapshot, _SnapshotFile
+
+CELL_FDNS = [f"urn:3gpp:dn:ManagedElement=1,GNBDUFunction=1,NRCellDU={cell}" for cell in range(70)]
+ROP = 1741031100000
+
+
+def _state(retention=2, max_counters=4) -> tuple[CounterPresence, PmCounterStore]:
+    counter_presence = CounterPresence(CELL_FDNS)
+    counter_store = PmCounterStore(retention, max_counters)
+    counter_store.allocate(CELL_FDNS)
+    return counter_presence, counter_store
+
+
+@pytest.mark.asyncio
+async def test_snapshot_restores_presence_and_counter_store(tmp_path):
+    """Test that a restored snapshot holds the cells, the presence merged with every shard, and the counter values."""
+    counter_presence, counter_store = _state()
+    counter_shards = CounterStatusShards(counter_presence)
+    counter_presence.set(0)
+    counter_shards.shard(2).set(69)
+    counter_store.record(69, ROP, {"pmA": 5, "pmB": 7})
+    snapshot = ConsumerSnapshot(str(tmp_path), 60.0)
+
+    await snapshot.save(counter_presence, counter_store, [counter_shards])
+    restored_presence, restored_store = CounterPresence(), PmCounterStore(2, 4)
+    cell_fdns = snapshot.restore(restored_presence, restored_store)
+
+    assert cell_fdns == CELL_FDNS
+    assert restored_presence.peek().nonzero()[0].tolist() == [0, 69]
+    assert restored_store.rops() == [ROP]
+    assert restored_store.counter_names == ["pmA", "pmB"]
+    assert restored_store.counter_values("pmB")[69] == 7
+    assert not restored_store.counter_reported("pmA")[0]
+    # The values are mapped copy-on-write, so recording more leaves the file as it was.
+    restored_store.record(0, ROP, {"pmA": 1})
+    restored_again = PmCounterStore(2, 4)
+    snapshot.restore(CounterPresence(), restored_again)
+    assert not restored_again.counter_reported("pmA")[0]
+
+
+def test_restore_without_snapshot_returns_none(tmp_path):
+    """Test that nothing is restored when snapshots are disabled or no snapshot was written yet."""
+    counter_presence, counter_store = _state()
+    assert ConsumerSnapshot("", 60.0).restore(counter_presence, counter_store) is None
+    assert ConsumerSnapshot(str(tmp_path), 60.0).restore(counter_presence, counter_store) is None
+
+
+def test_unreadable_snapshot_is_ignored(tmp_path):
+    """Test that a file which is not a snapshot is ignored, leaving the state untouched."""
+    snapshot = ConsumerSnapshot(str(tmp_path), 60.0)
+    with open(snapshot.path, "wb") as f:
+        f.write(b"not a snapshot at all")
+    counter_presence, counter_store = _state()
+
+    assert snapshot.restore(counter_presence, counter_store) is None
+    assert counter_presence.cell_fdns == CELL_FDNS
+
+
+@pytest.mark.asyncio
+async def test_counter_store_of_another_size_is_allocated_empty(tmp_path):
+    """Test that counter values saved with another retention are not restored, while the presence still is."""
+    counter_presence, counter_store = _state(retention=2)
+    counter_presence.set(3)
+    counter_store.record(3, ROP, {"pmA": 5})
+    snapshot = ConsumerSnapshot(str(tmp_path), 60.0)
+    await snapshot.save(counter_presence, counter_store)
+
+    restored_presence, restored_store = CounterPresence(), PmCounterStore(3, 4)
+    assert snapshot.restore(restored_presence, restored_store) == CELL_FDNS
+
+    assert restored_presence.is_set(3)
+    assert restored_store.values.shape == (70, 3, 4)
+    assert restored_store.rops() == []
+
+
+@pytest.mark.asyncio
+async def test_counter_store_is_saved_a_chunk_at_a_time(tmp_path, monkeypatch):
+    """Test that a counter store copied in several chunks is restored whole."""
+    monkeypatch.setattr("network_data_template_app.snapshot.SNAPSHOT_CHUNK_BYTES", 100)
+    counter_presence, counter_store = _state()
+    for cell_id in range(70):
+        counter_store.record(cell_id, ROP, {"pmA": cell_id, "pmB": 2**40 + cell_id})
+    snapshot = ConsumerSnapshot(str(tmp_path), 60.0)
+
+    await snapshot.save(counter_presence, counter_store)
+    restored_store = PmCounterStore(2, 4)
+    snapshot.restore(CounterPresence(), restored_store)
+
+    assert restored_store.counter_values("pmA").tolist() == list(range(70))
+    assert restored_store.counter_values("pmB").tolist() == [2**40 + cell_id for cell_id in range(70)]
+    assert restored_store.counter_reported("pmB").all()
+
+
+@pytest.mark.asyncio
+async def test_save_is_abandoned_if_a_rop_is_replaced_meanwhile(tmp_path, monkeypatch):
+    """Test that the previous snapshot is kept if the counter store takes over a ROP slot while it is being saved."""
+    monkeypatch.setattr("network_data_template_app.snapshot.SNAPSHOT_CHUNK_BYTES", 100)
+    counter_presence, counter_store = _state(retention=1)
+    counter_store.record(0, ROP, {"pmA": 1})
+    snapshot = ConsumerSnapshot(str(tmp_path), 60.0)
+    await snapshot.save(counter_presence, counter_store)
+
+    counter_store.record(1, ROP, {"pmA": 2})
+    written_from = []
+
+    def record_next_rop(snapshot_file, *args):
+        written_from.append(args[0])
+        counter_store.record(0, ROP + 15 * 60 * 1000, {"pmA": 3})
+        original_write_rows(snapshot_file, *args)
+
+    original_write_rows = _SnapshotFile.write_rows
+    monkeypatch.setattr(_SnapshotFile, "write_rows", record_next_rop)
+    await snapshot.save(counter_presence, counter_store)
+
+    assert written_from == [0]
+    restored_store = PmCounterStore(1, 4)
+    snapshot.restore(CounterPresence(), restored_store)
+    assert restored_store.rops() == [ROP]
+    assert restored_store.counter_reported("pmA").nonzero()[0].tolist() == [0]
+    assert not (tmp_path / "consumer-state.snapshot.tmp").exists()
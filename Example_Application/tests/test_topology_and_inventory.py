@@ -5,6 +5,7 @@
 
 import json
 import pytest
+from httpx import Response
 import network_data_template_app.topology_and_inventory as topology_and_inventory
 
 
@@ -43,3 +44,71 @@ def test_get_sourceids_from_cells():
         assert (
             topology_and_inventory.get_sourceids_from_cells(cells) == expected_response
         )
+
+
+def _paged_topology_api(mock_apis, config, cells, total_count=True):
+    """Mock Topology & Inventory serving `cells` a page at a time, returning the offset of each request."""
+    requested_offsets = []
+
+    def respond(request):
+        offset = int(request.url.params["offset"])
+        limit = int(request.url.params["limit"])
+        requested_offsets.append(offset)
+        page = {"items": cells[offset : offset + limit]}
+        if total_count:
+            page["totalCount"] = len(cells)
+        return Response(status_code=200, json=page)
+
+    mock_apis.get(
+        url__startswith=config.get("iam_base_url")
+        + "/topology-inventory/v1alpha11/domains/RAN/entity-types/NRCellDU/entities"
+    ).mock(side_effect=respond)
+    return requested_offsets
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("total_count", [True, False])
+async def test_iter_nr_cell_du_pages_yields_every_page_in_order(
+    mock_apis, config, async_oauth_client, get_topology_get_nr_cell_dus_response, total_count
+):
+    """
+    Scenario: Call iter_nr_cell_du_pages() for an inventory spanning several pages, with and without a total count.
+    Expected Outcome: Every page is fetched once by its offset, and the pages are yielded in order.
+    Assertion: The source IDs of the pages are those of the whole inventory, in order.
+    """
+    cells = get_topology_get_nr_cell_dus_response
+    requested_offsets = _paged_topology_api(mock_apis, config, cells, total_count)
+
+    pages = topology_and_inventory.iter_nr_cell_du_pages(
+        async_oauth_client, page_size=3, concurrency=2
+    )
+    source_ids = [
+        source_id
+        async for page in pages
+        for source_id in topology_and_inventory.get_sourceids_from_cells(page)
+    ]
+
+    assert source_ids == topology_and_inventory.get_sourceids_from_cells(cells)
+    assert sorted(requested_offsets) == [0, 3, 6, 9]
+
+
+@pytest.mark.asyncio
+async def test_iter_nr_cell_du_pages_keeps_large_page_size(
+    mock_apis, config, async_oauth_client, get_topology_get_nr_cell_dus_response
+):
+    """
+    Scenario: Call iter_nr_cell_du_pages() with a page size above the 500 Topology & Inventory defaults to.
+    Expected Outcome: Pages of the requested size are requested, rather than the default.
+    Assertion: The only page requested has a limit of 10000.
+    """
+    _paged_topology_api(mock_apis, config, get_topology_get_nr_cell_dus_response)
+
+    pages = [
+        page
+        async for page in topology_and_inventory.iter_nr_cell_du_pages(
+            async_oauth_client, page_size=10000
+        )
+    ]
+
+    assert len(pages) == 1
+    assert mock_apis.calls.last.request.url.params["limit"] == "10000"
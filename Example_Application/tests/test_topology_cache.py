@@ -0,0 +1,87 @@
+"""Tests for caching the cells of Topology & Inventory in topology_cache.py"""
+
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from httpx import RequestError
+
+from network_data_template_app.metrics import metrics_registry
+from network_data_template_app.topology_and_inventory import get_sourceids_from_cells
+from network_data_template_app.topology_cache import TopologyCache, fetch_cell_source_ids, fetch_topology
+
+GET_NR_CELL_DUS = "network_data_template_app.topology_and_inventory.get_nr_cell_dus"
+ITER_NR_CELL_DU_PAGES = "network_data_template_app.topology_and_inventory.iter_nr_cell_du_pages"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_fetch_until_the_ttl(get_topology_get_nr_cell_dus_response):
+    """Test that lookups within the TTL, and concurrent lookups on a miss, query Topology & Inventory once."""
+    cells = get_topology_get_nr_cell_dus_response
+    cache = TopologyCache(fetch_topology, 60.0, 0.0)
+    with patch(GET_NR_CELL_DUS, new_callable=AsyncMock, return_value=cells) as get_nr_cell_dus:
+        topologies = await asyncio.gather(*(cache.get(None) for _ in range(5)))
+        assert await cache.get(None) is topologies[0]
+
+    get_nr_cell_dus.assert_awaited_once()
+    assert all(topology is topologies[0] for topology in topologies)
+    assert json.loads(topologies[0].body) == cells
+    assert topologies[0].source_ids == get_sourceids_from_cells(cells)
+
+
+@pytest.mark.asyncio
+async def test_stale_topology_is_returned_while_it_is_refreshed(get_topology_get_nr_cell_dus_response):
+    """Test that past the TTL the previous topology is returned at once, and replaced once the refresh completes."""
+    cells = get_topology_get_nr_cell_dus_response
+    cache = TopologyCache(fetch_topology, 0.05, 60.0)
+    with patch(GET_NR_CELL_DUS, new_callable=AsyncMock, side_effect=[cells, cells[1:]]):
+        first = await cache.get(None)
+        await asyncio.sleep(0.05)
+        assert await cache.get(None) is first
+        await asyncio.sleep(0.01)
+        second = await cache.get(None)
+
+    assert second.source_ids == get_sourceids_from_cells(cells[1:])
+    assert second.etag != first.etag
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_the_stale_topology(get_topology_get_nr_cell_dus_response):
+    """Test that a failed background refresh is counted, and the previous topology is kept."""
+    failures = metrics_registry.counters.get("topology_cache_refresh_failures")
+    failure_count = failures._value.get()
+    cache = TopologyCache(fetch_topology, 0.05, 60.0)
+    with patch(
+        GET_NR_CELL_DUS,
+        new_callable=AsyncMock,
+        side_effect=[get_topology_get_nr_cell_dus_response, RequestError("Request failed")],
+    ):
+        first = await cache.get(None)
+        await asyncio.sleep(0.05)
+        await cache.get(None)
+        await asyncio.sleep(0.01)
+
+    assert cache._value is first
+    assert failures._value.get() == failure_count + 1
+
+
+@pytest.mark.asyncio
+async def test_cell_source_ids_are_fetched_page_by_page(
+    monkeypatch, get_topology_get_nr_cell_dus_response
+):
+    """Test that with a page size, the consumer's cells are the source IDs of every page, and /topology's are not."""
+    monkeypatch.setenv("TOPOLOGY_PAGE_SIZE", "3")
+    cells = get_topology_get_nr_cell_dus_response
+
+    async def pages(*_args):
+        for start in range(0, len(cells), 3):
+            yield cells[start : start + 3]
+
+    with patch(ITER_NR_CELL_DU_PAGES, pages), patch(
+        GET_NR_CELL_DUS, new_callable=AsyncMock
+    ) as get_nr_cell_dus:
+        source_ids = await TopologyCache(fetch_cell_source_ids, 60.0, 0.0).get(None)
+
+    assert source_ids == get_sourceids_from_cells(cells)
+    get_nr_cell_dus.assert_not_awaited()